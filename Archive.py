@@ -0,0 +1,293 @@
+'''
+Non-dominated archive of the (SRM, MMD) objectives, both minimized.
+
+On a two-objective front sorted by the first objective, the second one is
+strictly decreasing, so the dominance checks of a new point only look at its
+neighbours in the sorted order, found by bisection:
+
+    - it is dominated iff its left neighbour (the last point with a first
+      objective <= its own) has a second objective <= its own;
+    - the points it dominates are a contiguous run starting at its insertion
+      position.
+
+The archive can be bounded, the member with the smallest crowding distance
+(never one of the two extremes) is dropped when it is full. The Beta
+matrices and label vectors of the members are kept in preallocated arrays,
+whose slots are reused, so a long run does not keep every position it saw.
+
+    front = Archive.ParetoArchive(capacity=50)
+    front.insert(srm, mmd, beta=Beta, label=Yt_pseu)
+    vote_label, _ = Helpers.vote(front.labels())
+
+SolutionArchive keeps every archived position of a run the same way: its
+metrics in a record array, its labels as int8/int16, and its Beta matrix
+only if asked, in float32 or spilled to a memory-mapped file.
+'''
+import bisect
+
+import numpy as np
+
+
+def non_dominated(f1, f2):
+    '''
+    Non-dominated points of a set, from one sort and a running minimum,
+    instead of comparing the pairs. Of several identical points the first
+    one is kept.
+    :param f1: first objective of each point
+    :param f2: second objective of each point
+    :return: sorted indices of the non-dominated points
+    '''
+    f1 = np.asarray(f1, dtype=float)
+    f2 = np.asarray(f2, dtype=float)
+    if len(f1) == 0:
+        return []
+    # stable: by f1, then f2, then index
+    order = np.lexsort((f2, f1))
+    sorted_f2 = f2[order]
+    previous_min = np.empty(len(order))
+    previous_min[0] = np.inf
+    np.minimum.accumulate(sorted_f2[:-1], out=previous_min[1:])
+    return np.sort(order[sorted_f2 < previous_min]).tolist()
+
+
+class ParetoArchive:
+    def __init__(self, capacity=None):
+        '''
+        :param capacity: maximum number of members, unbounded if None (at least 2,
+        so that the extremes are kept)
+        '''
+        if capacity is not None and capacity < 2:
+            raise ValueError('The capacity of the archive must be at least 2, not %d' % capacity)
+        self.capacity = capacity
+        # members, sorted by f1 (so by decreasing f2)
+        self.f1 = []
+        self.f2 = []
+        self.slots = []
+        self.info = []
+        # storage of the Beta matrices and labels, allocated at the first insertion
+        self.betas = None
+        self.label_array = None
+        self.allocated = 0
+        self.free = []
+        self.inserted = 0
+        self.rejected = 0
+        self.pruned = 0
+
+    def __len__(self):
+        return len(self.f1)
+
+    def dominates(self, f1, f2):
+        '''
+        :return: whether a member is at least as good as (f1, f2) on both objectives
+        '''
+        position = bisect.bisect_right(self.f1, f1)
+        return position > 0 and self.f2[position - 1] <= f2
+
+    def insert(self, f1, f2, beta=None, label=None, info=None):
+        '''
+        Add a point if no member dominates it, the members it dominates are removed
+        :param beta: Beta matrix of the point, stored in the archive
+        :param label: label vector of the point, stored in the archive
+        :param info: anything to keep with the point, e.g. its index in the run
+        :return: whether the point was added (it can still be pruned later)
+        '''
+        if self.dominates(f1, f2):
+            self.rejected += 1
+            return False
+        start = bisect.bisect_left(self.f1, f1)
+        stop = start
+        while stop < len(self.f2) and self.f2[stop] >= f2:
+            stop += 1
+        self.free.extend(self.slots[start:stop])
+        del self.f1[start:stop], self.f2[start:stop], self.slots[start:stop], self.info[start:stop]
+
+        self.f1.insert(start, f1)
+        self.f2.insert(start, f2)
+        self.slots.insert(start, self.store(beta, label))
+        self.info.insert(start, info)
+        self.inserted += 1
+        if self.capacity is not None and len(self) > self.capacity:
+            self.remove(int(np.argmin(self.crowding())))
+            self.pruned += 1
+        return True
+
+    def store(self, beta, label):
+        '''
+        :return: slot of the storage arrays holding beta and label
+        '''
+        if not self.free:
+            size = self.allocated
+            self.allocated = self.capacity + 1 if self.capacity is not None else max(2 * size, 8)
+            self.betas = self.grow(self.betas, beta, self.allocated)
+            self.label_array = self.grow(self.label_array, label, self.allocated)
+            self.free.extend(range(self.allocated - 1, size - 1, -1))
+        slot = self.free.pop()
+        if beta is not None:
+            self.betas[slot] = beta
+        if label is not None:
+            self.label_array[slot] = label
+        return slot
+
+    @staticmethod
+    def grow(storage, value, size):
+        if value is None and storage is None:
+            return None
+        if storage is None:
+            value = np.asarray(value)
+            return np.empty((size,) + value.shape, dtype=value.dtype)
+        grown = np.empty((size,) + storage.shape[1:], dtype=storage.dtype)
+        grown[:len(storage)] = storage
+        return grown
+
+    def remove(self, position):
+        self.free.append(self.slots[position])
+        del self.f1[position], self.f2[position], self.slots[position], self.info[position]
+
+    def crowding(self):
+        '''
+        :return: crowding distance of each member, infinite for the two extremes
+        '''
+        f1 = np.array(self.f1)
+        f2 = np.array(self.f2)
+        distance = np.full(len(f1), np.inf)
+        if len(f1) > 2:
+            range1 = max(f1[-1] - f1[0], np.finfo(float).tiny)
+            range2 = max(f2[0] - f2[-1], np.finfo(float).tiny)
+            distance[1:-1] = (f1[2:] - f1[:-2]) / range1 + (f2[:-2] - f2[2:]) / range2
+        return distance
+
+    def objectives(self):
+        '''
+        :return: k * 2 array of the objectives of the members, sorted by the first one
+        '''
+        return np.column_stack((self.f1, self.f2)) if self.f1 else np.empty((0, 2))
+
+    def beta_matrices(self):
+        '''
+        :return: k * n * C array of the Beta matrices of the members
+        '''
+        return self.betas[self.slots]
+
+    def labels(self):
+        '''
+        :return: k * nt array of the labels of the members
+        '''
+        return self.label_array[self.slots]
+
+
+# metrics of an archived position
+RECORD = np.dtype([('fitness', np.float64), ('srm', np.float64), ('mmd', np.float64),
+                   ('src_acc', np.float64), ('tar_acc', np.float64)])
+
+
+def label_dtype(C):
+    '''
+    :return: smallest integer dtype holding the labels 1..C
+    '''
+    if C < 2 ** 7:
+        return np.int8
+    if C < 2 ** 15:
+        return np.int16
+    return np.int32
+
+
+class SolutionArchive:
+    def __init__(self, nt, C, beta_shape=None, beta_dtype=np.float32, beta_file=None, capacity=64):
+        '''
+        Every archived position, as one row of preallocated arrays that double
+        when full: a record array of the metrics, the target labels in the
+        smallest integer type, and optionally the Beta matrices.
+        :param nt: number of target instances
+        :param C: number of classes
+        :param beta_shape: shape of a Beta matrix, None to keep only the metrics and labels
+        :param beta_dtype: dtype of the stored Beta matrices, float32 halves their size
+        :param beta_file: if given, the Beta matrices are written to this (raw) memory-mapped file
+        :param capacity: initial number of rows
+        '''
+        self.size = 0
+        self.capacity = capacity
+        self.records = np.zeros(capacity, dtype=RECORD)
+        self.label_array = np.zeros((capacity, nt), dtype=label_dtype(C))
+        self.beta_shape = None if beta_shape is None else tuple(beta_shape)
+        self.beta_dtype = np.dtype(beta_dtype)
+        self.beta_file = beta_file
+        self.beta_array = None
+        if self.beta_shape is not None:
+            self.beta_array = self.allocate_betas(capacity)
+
+    def __len__(self):
+        return self.size
+
+    def allocate_betas(self, capacity):
+        if self.beta_file is None:
+            beta_array = np.empty((capacity,) + self.beta_shape, dtype=self.beta_dtype)
+            if self.beta_array is not None:
+                beta_array[:self.size] = self.beta_array[:self.size]
+            return beta_array
+        if self.beta_array is not None:
+            self.beta_array.flush()
+            self.beta_array = None
+        # the rows already written stay in place, the file is only extended
+        with open(self.beta_file, 'r+b' if self.size else 'w+b') as f:
+            f.truncate(capacity * int(np.prod(self.beta_shape)) * self.beta_dtype.itemsize)
+        return np.memmap(self.beta_file, dtype=self.beta_dtype, mode='r+', shape=(capacity,) + self.beta_shape)
+
+    def append(self, label, fitness, srm, mmd, src_acc, tar_acc, beta=None):
+        '''
+        :param label: target labels of the position, computed when it was evaluated
+        :param beta: Beta matrix of the position, ignored if the archive keeps no Beta
+        :return: index of the position in the archive
+        '''
+        if self.size == self.capacity:
+            self.capacity *= 2
+            records = np.zeros(self.capacity, dtype=RECORD)
+            records[:self.size] = self.records
+            self.records = records
+            label_array = np.zeros((self.capacity, self.label_array.shape[1]), dtype=self.label_array.dtype)
+            label_array[:self.size] = self.label_array
+            self.label_array = label_array
+            if self.beta_array is not None:
+                self.beta_array = self.allocate_betas(self.capacity)
+        index = self.size
+        self.records[index] = (fitness, srm, mmd, src_acc, tar_acc)
+        self.label_array[index] = label
+        if self.beta_array is not None and beta is not None:
+            self.beta_array[index] = beta
+        self.size += 1
+        return index
+
+    def metrics(self):
+        '''
+        :return: record array of the metrics, with the fields of RECORD
+        '''
+        return self.records[:self.size]
+
+    def labels(self):
+        '''
+        :return: len * nt array of the target labels
+        '''
+        return self.label_array[:self.size]
+
+    def betas(self):
+        '''
+        :return: len * n * C array of the Beta matrices (memory-mapped if spilled), None if not kept
+        '''
+        return None if self.beta_array is None else self.beta_array[:self.size]
+
+    def close(self):
+        if isinstance(self.beta_array, np.memmap):
+            self.beta_array.flush()
+
+    def __getstate__(self):
+        # a spilled archive is pickled without its Beta matrices, they stay in the file
+        state = self.__dict__.copy()
+        if self.beta_file is not None and self.beta_array is not None:
+            self.beta_array.flush()
+            state['beta_array'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.beta_file is not None and self.beta_shape is not None:
+            self.beta_array = np.memmap(self.beta_file, dtype=self.beta_dtype, mode='r+',
+                                        shape=(self.capacity,) + self.beta_shape)
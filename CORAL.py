@@ -10,6 +10,7 @@ import scipy.linalg
 import sklearn.metrics
 import sklearn.neighbors
 from sklearn.svm import LinearSVC as LSVM
+import Dataset
 import Helpers as Pre
 
 
@@ -71,24 +72,7 @@ if __name__ == '__main__':
         for dataset in datasets:
             dir = '/home/nguyenhoai2/Grid/data/TransferLearning/UnPairs/'+dataset+'/'
 
-            source = np.genfromtxt(dir+'Source', delimiter=',')
-            m = source.shape[1] - 1
-            Xs = source[:, 0:m]
-            Ys = np.ravel(source[:, m:m + 1])
-            Ys = np.array([int(label) for label in Ys])
-
-            target = np.genfromtxt(dir+'Target', delimiter=',')
-            Xt = target[:, 0:m]
-            Yt = np.ravel(target[:, m:m + 1])
-            Yt = np.array([int(label) for label in Yt])
-
-            if index == 1:
-                Xs, Xt = Pre.normalize_data(Xs, Xt)
-
-            C = len(np.unique(Ys))
-            if C > np.max(Ys):
-                Ys = Ys + 1
-                Yt = Yt + 1
+            Xs, Ys, Xt, Yt, C = Dataset.load(dir, normalize=index == 1)
 
             coral = CORAL()
             acc, ypre = coral.fit_predict(Xs, Ys, Xt, Yt)
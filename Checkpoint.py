@@ -0,0 +1,92 @@
+'''
+Checkpoints of long evolutionary runs.
+
+The state of a run (population, archive, hall of fame, generation counter,
+...) and the states of the random and np.random generators are pickled in
+one binary file, written to a temporary file and renamed, so a run killed
+while saving keeps its previous checkpoint. A restarted run given the same
+file resumes exactly where the checkpoint was taken:
+
+    state = Checkpoint.resume('1.ckpt')
+    if state is None:
+        ...initialize, first_gen = 0
+    else:
+        pop, first_gen = state['pop'], state['gen']
+    for g in range(first_gen, N_GEN):
+        ...
+        Checkpoint.save('1.ckpt', gen=g + 1, pop=pop)
+    ...write the results
+    Checkpoint.remove('1.ckpt')
+
+A finished run removes its checkpoint, otherwise running it again would
+resume after its last generation.
+
+The domain pair precomputation is not saved: GFK is the expensive part of
+it, and is cached on disk when GFKCache is enabled (GFK.enable_cache or
+GFK_CACHE_DIR).
+'''
+import os
+import pickle
+import random
+
+import numpy as np
+
+
+def random_state():
+    '''
+    :return: states of the random and np.random generators
+    '''
+    return {'random': random.getstate(), 'numpy': np.random.get_state()}
+
+
+def set_random_state(state):
+    random.setstate(state['random'])
+    np.random.set_state(state['numpy'])
+
+
+def save(path, **state):
+    '''
+    Write the state and the random states in path, atomically
+    '''
+    state['random_state'] = random_state()
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+def load(path):
+    '''
+    :return: the saved state, None if there is no checkpoint
+    '''
+    if path is None or not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def resume(path):
+    '''
+    Load the checkpoint and restore the random states it holds
+    :return: the saved state, None if there is no checkpoint
+    '''
+    state = load(path)
+    if state is not None:
+        set_random_state(state.pop('random_state'))
+    return state
+
+
+def remove(path):
+    '''
+    Remove the checkpoint of a finished run, if there is one
+    '''
+    if path is not None and os.path.exists(path):
+        os.remove(path)
+
+
+def due(generation, every):
+    '''
+    :param generation: number of generations done
+    :param every: checkpoint period, in generations
+    '''
+    return every > 0 and generation % every == 0
@@ -2,6 +2,7 @@ import numpy as np
 from sklearn.neighbors import KNeighborsClassifier
 from sklearn.svm import SVC, LinearSVC
 from sklearn.ensemble import RandomForestClassifier
+import Dataset
 import Helpers as Pre
 
 # datasets = np.array(['GasSensor1-4', 'GasSensor1-2', 'GasSensor1-3',
@@ -25,19 +26,7 @@ if __name__ == '__main__':
 
     names = list(["1NN", "RF", "SVM", "LSVM"])
 
-    source = np.genfromtxt("Source", delimiter=",")
-    m = source.shape[1] - 1
-    Xs = source[:, 0:m]
-    Ys = np.ravel(source[:, m:m + 1])
-    Ys = np.array([int(label) for label in Ys])
-
-    target = np.genfromtxt("Target", delimiter=",")
-    Xt = target[:, 0:m]
-    Yt = np.ravel(target[:, m:m + 1])
-    Yt = np.array([int(label) for label in Yt])
-
-    if normalize:
-        Xs, Xt = Pre.normalize_data(Xs, Xt)
+    Xs, Ys, Xt, Yt, _ = Dataset.load(normalize=normalize)
 
     clf = classifiers[cf_index]
     clf.fit(Xs, Ys)
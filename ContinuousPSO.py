@@ -8,6 +8,7 @@ import random
 from deap import base
 from deap import creator
 from deap import tools
+import Checkpoint
 import Core
 import FitnessFunction
 import time
@@ -36,6 +37,8 @@ ustks = ustks_low
 
 TEST = False
 WRITE_OUT = False
+# generations between two checkpoints, when a checkpoint file is given
+CHECKPOINT_EVERY = 10
 
 creator.create("FitnessMin", base.Fitness, weights=(-1.0,))
 creator.create("Particle", list, fitness=creator.FitnessMin, stk=list, best=None)
@@ -176,6 +179,7 @@ def opposite_weight():
 # args[1]: diff_ST: 1-domain classification, 2-MMD
 # args[2]: tarErr: 1-Gecco, 2-pseudo with classification, 3-pseudo with silhouette,
 #                   4-pseudo with MMDs,  5-pseudo with classification cycle
+# args[3]: optional, file name of the checkpoint, the run resumes from it if it exists
 def main(args):
     global i_stick, i_pbest, i_gbest, ustks
 
@@ -204,19 +208,29 @@ def main(args):
     # print("End setting")
     # opposite_weight()
 
-    # Initialize population and the gbest
-    pop = toolbox.population(n=NPART)
-    best = None
-
-    to_write = ("Core classifier: %s\nSource weight: %f\nDiff source and target weight: %f\n"
-                "Target weight: %g\nMarginal version: %d\nTarget version: %d\n"
-                % (str(Core.classifier), FitnessFunction.srcWeight,
-                   FitnessFunction.margWeight, FitnessFunction.tarWeight,
-                   FitnessFunction.margVersion, FitnessFunction.tarVersion))
-
-    archive = []
+    checkpoint = args[3] if len(args) > 3 else None
+    state = Checkpoint.resume(checkpoint)
+    if state is None:
+        # Initialize population and the gbest
+        pop = toolbox.population(n=NPART)
+        best = None
+
+        to_write = ("Core classifier: %s\nSource weight: %f\nDiff source and target weight: %f\n"
+                    "Target weight: %g\nMarginal version: %d\nTarget version: %d\n"
+                    % (str(Core.classifier), FitnessFunction.srcWeight,
+                       FitnessFunction.margWeight, FitnessFunction.tarWeight,
+                       FitnessFunction.margVersion, FitnessFunction.tarVersion))
+
+        archive = []
+        first_gen = 0
+    else:
+        # the log is only written at the end, the text of the done generations is in the checkpoint
+        pop, best, archive, to_write = state['pop'], state['best'], state['archive'], state['to_write']
+        i_stick, i_pbest, i_gbest, ustks = state['params']
+        time_start -= state['elapsed']
+        first_gen = state['gen']
 
-    for g in range(NGEN):
+    for g in range(first_gen, NGEN):
         print(g)
         to_write += ("=====Gen %d=====\n" % g)
 
@@ -274,6 +288,10 @@ def main(args):
         i_pbest = pg_rate * i_gbest
         ustks = ustks_low + (ustks_up - ustks_low) * (g + 1) / NGEN
 
+        if checkpoint is not None and Checkpoint.due(g + 1, CHECKPOINT_EVERY):
+            Checkpoint.save(checkpoint, gen=g + 1, pop=pop, best=best, archive=archive, to_write=to_write,
+                            params=(i_stick, i_pbest, i_gbest, ustks), elapsed=time.clock() - time_start)
+
     time_elapsed = (time.clock() - time_start)
     to_write += "----Final -----\n"
     indices = [index for index, entry in enumerate(best) if entry == 1.0]
@@ -340,6 +358,8 @@ def main(args):
 
     output_file.write(to_write)
     output_file.close()
+    # the run is complete, running it again starts a new one
+    Checkpoint.remove(checkpoint)
 
 
 if __name__ == "__main__":
@@ -3,30 +3,31 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
 
+import ResultStore
+
 datasets = ['SURFa-c', 'Office31amazon-dslr', 'AMZbooks-dvd']
 leg_names = ['A->C', 'A->D(31)', 'B->D']
 runs = 1
 iterations = 10
 dicts = {'Dataset':[], 'Iteration':[], 'Distance':[]}
 
-for index, dataset in enumerate(datasets):
-    dir = '/home/nguyenhoai2/Grid/results/MEDA-Extend/'+dataset+'/GA-MEDA-Final/'
-    leg_name = leg_names[index]
-    dis = [0.0]*iterations
+dir = '/home/nguyenhoai2/Grid/results/MEDA-Extend/'
+method = 'GA-MEDA-Final'
+store = ResultStore.ResultStore(dir + 'results.sqlite')
+for dataset in datasets:
     for run in range(1, runs+1):
-        dir_data_run = dir + str(run) + '.txt'
-        f = open(dir_data_run, 'r')
-        fl = f.readlines()
-        count = 0
-        for l in fl:
-            if 'Average distance' in l:
-                dis[count] += float(l.split(': ')[1])
-                count += 1
-    dis = np.array(dis)
-    dis = dis/runs
+        if not store.has_run(dataset, method, run):
+            store.import_log(dataset, method, run, dir + dataset + '/' + method + '/' + str(run) + '.txt',
+                             acc='evolved_acc')
+
+# the average distance of each iteration, over the runs
+curves = store.convergence(datasets, method, 'diversity', runs=range(1, runs+1))
+store.close()
+for index, dataset in enumerate(datasets):
+    gens, dis = curves[dataset]
     for iter in range(iterations):
-        dicts['Dataset'].append(leg_name)
-        dicts['Iteration'].append(iter+1)
+        dicts['Dataset'].append(leg_names[index])
+        dicts['Iteration'].append(gens[iter])
         dicts['Distance'].append(dis[iter])
 
 data = pd.DataFrame.from_dict(dicts)
@@ -0,0 +1,88 @@
+'''
+Loader of the Source/Target data files.
+
+Each file is a comma separated text file, one instance per row with the label
+in the last column. Parsing it with np.genfromtxt is slow for the large
+datasets, so the first load converts it to binary .npy files next to it
+(<file>.X.npy and <file>.Y.npy), which later loads read memory-mapped.
+The binary files are rebuilt when the text file is newer.
+'''
+import collections
+import os
+
+import numpy as np
+
+import Helpers
+
+DomainPair = collections.namedtuple('DomainPair', ['Xs', 'Ys', 'Xt', 'Yt', 'C'])
+
+
+def convert(path):
+    '''
+    Parse the text file and write its binary copy
+    :param path: text data file
+    :return: features, labels
+    '''
+    data = np.loadtxt(path, delimiter=',', ndmin=2)
+    X = np.ascontiguousarray(data[:, :-1])
+    labels = data[:, -1]
+    Y = labels.astype(np.int32)
+    if not np.array_equal(Y, labels):
+        raise ValueError('%s: labels in the last column must be integers' % path)
+    for suffix, array in (('.X.npy', X), ('.Y.npy', Y)):
+        # write then rename, so a concurrent run never reads a partial file
+        tmp = '%s%s.%d.tmp' % (path, suffix, os.getpid())
+        with open(tmp, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp, path + suffix)
+    return X, Y
+
+
+def read_domain(path, cache=True, mmap=True):
+    '''
+    Read one data file, through its binary copy when possible
+    :param path: text data file, e.g. dir/Source
+    :param cache: use (and create) the binary copy
+    :param mmap: memory-map the features of the binary copy (read-only)
+    :return: n * n_feature features, n labels
+    '''
+    if not cache:
+        data = np.genfromtxt(path, delimiter=',')
+        return data[:, :-1], data[:, -1].astype(int)
+    x_path, y_path = path + '.X.npy', path + '.Y.npy'
+    fresh = os.path.exists(x_path) and os.path.exists(y_path) \
+        and os.path.getmtime(x_path) >= os.path.getmtime(path) \
+        and os.path.getmtime(y_path) >= os.path.getmtime(path)
+    if not fresh:
+        return convert(path)
+    return np.load(x_path, mmap_mode='r' if mmap else None), np.load(y_path)
+
+
+def load(directory='', normalize=False, cache=True, mmap=True, source='Source', target='Target'):
+    '''
+    Load a source/target pair
+    :param directory: directory containing the source and target files
+    :param normalize: normalize the features with Helpers.normalize_data
+    :param cache: convert the text files to binary files once and reuse them
+    :param mmap: memory-map the binary features (read-only) when they are not normalized
+    :return: DomainPair(Xs, Ys, Xt, Yt, C), labels from 1 to C
+    '''
+    Xs, Ys = read_domain(os.path.join(directory, source), cache=cache, mmap=mmap)
+    Xt, Yt = read_domain(os.path.join(directory, target), cache=cache, mmap=mmap)
+    if Xs.shape[1] != Xt.shape[1]:
+        raise ValueError('Source has %d features but target has %d' % (Xs.shape[1], Xt.shape[1]))
+
+    # make sure the class indices start from 1
+    C = len(np.unique(Ys))
+    if C > np.max(Ys):
+        Ys = Ys + 1
+        Yt = Yt + 1
+    if np.min(Ys) < 1 or np.max(Ys) > C:
+        raise ValueError('Source labels must be from 1 to %d, got %d to %d' % (C, np.min(Ys), np.max(Ys)))
+    if len(Yt) and (np.min(Yt) < 1 or np.max(Yt) > C):
+        raise ValueError('Target labels must be from 1 to %d, got %d to %d' % (C, np.min(Yt), np.max(Yt)))
+
+    if normalize:
+        # normalize_data works in place, so the memory-mapped arrays are copied
+        Xs, Xt = Helpers.normalize_data(np.array(Xs, dtype=float), np.array(Xt, dtype=float))
+    return DomainPair(Xs, np.asarray(Ys, dtype=int), Xt, np.asarray(Yt, dtype=int), C)
@@ -0,0 +1,83 @@
+'''
+Diversity of a population of label vectors (one individual per row).
+
+Every measure is computed from the value counts of each position, in one
+pass over the N * nt population array, instead of comparing the N^2 pairs:
+at a position where the value v is taken by n_v individuals, the number of
+pairs that differ is (N^2 - sum_v n_v^2) / 2.
+For very long individuals, a random sample of the positions can be used.
+'''
+import numpy as np
+
+
+def as_array(pop, sample=None, random_state=None):
+    '''
+    :param pop: list of individuals or N * nt array
+    :param sample: if given, keep only this number of positions, drawn at random
+    :return: N * nt (or N * sample) array
+    '''
+    pop = np.asarray(pop)
+    if pop.ndim == 1:
+        pop = pop[None, :]
+    if sample is not None and sample < pop.shape[1]:
+        rng = np.random.RandomState(random_state)
+        pop = pop[:, rng.choice(pop.shape[1], sample, replace=False)]
+    return pop
+
+
+def position_counts(pop):
+    '''
+    :param pop: N * nt array
+    :return: nt * V counts of the V distinct values at each position
+    '''
+    values, codes = np.unique(pop, return_inverse=True)
+    V = len(values)
+    codes = codes.reshape(pop.shape) + V * np.arange(pop.shape[1])
+    return np.bincount(codes.ravel(), minlength=V * pop.shape[1]).reshape(pop.shape[1], V)
+
+
+def hamming(pop, sample=None, random_state=None):
+    '''
+    Average normalized Hamming distance between the pairs of individuals,
+    the same value as the double loop over the pairs
+    :param sample: number of positions to use, all of them by default
+    :return: value in [0, 1]
+    '''
+    pop = as_array(pop, sample, random_state)
+    N, nt = pop.shape
+    if N < 2:
+        return 0.0
+    counts = position_counts(pop).astype(float)
+    different = (nt * N * N - np.sum(counts ** 2)) / 2.0
+    return different / (nt * N * (N - 1) / 2.0)
+
+
+def entropy(pop, sample=None, random_state=None, average=True):
+    '''
+    Shannon entropy (in nats) of the values at each position
+    :param average: return the mean over the positions instead of the nt values
+    '''
+    pop = as_array(pop, sample, random_state)
+    prob = position_counts(pop) / float(pop.shape[0])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terms = np.where(prob > 0, -prob * np.log(prob), 0.0)
+    values = np.sum(terms, axis=1)
+    return np.mean(values) if average else values
+
+
+def unique_count(pop):
+    '''
+    :return: number of distinct individuals
+    '''
+    return len(np.unique(as_array(pop), axis=0))
+
+
+def euclidean(pop):
+    '''
+    Average euclidean distance over the ordered pairs of individuals (the pairs
+    (i, i) included), from the Gram matrix of the population
+    '''
+    pop = as_array(pop).astype(float)
+    sq = np.sum(pop ** 2, axis=1)
+    D = sq[:, None] + sq[None, :] - 2 * np.dot(pop, pop.T)
+    return np.mean(np.sqrt(np.maximum(D, 0)))
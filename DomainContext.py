@@ -0,0 +1,132 @@
+'''
+Shared precomputation for a source/target domain pair.
+
+The GFK projection, the normalized data, the kernel, the Laplacian, the
+fixed MEDA matrices (A, YY) and the factorization of the fixed part of
+the MEDA system only depend on the domain pair and a few parameters, so
+they are built lazily once and reused by every algorithm (MEDA, GA-MEDA,
+R-MEDA, ...) that is given the same context.
+'''
+import numpy as np
+import scipy.sparse
+
+import GFK
+import Helpers
+import Kernel
+import Labels
+import Solver
+
+
+class DomainPairContext:
+    def __init__(self, Xs, Ys, Xt, Yt=None, dim=20):
+        '''
+        :param Xs: ns * n_feature, source feature
+        :param Ys: ns source labels, from 1 to C
+        :param Xt: nt * n_feature, target feature
+        :param Yt: nt target labels, only used for reporting accuracy
+        :param dim: dimension of the GFK projection
+        '''
+        self.Xs_raw = Xs
+        self.Xt_raw = Xt
+        self.Ys = np.asarray(Ys).ravel()
+        self.Yt = None if Yt is None else np.asarray(Yt).ravel()
+        self.dim = dim
+
+        self.ns, self.nt = Xs.shape[0], Xt.shape[0]
+        self.n = self.ns + self.nt
+        self.C = len(np.unique(self.Ys))
+
+        self._cache = {}
+
+    def _cached(self, key, build):
+        if key not in self._cache:
+            self._cache[key] = build()
+        return self._cache[key]
+
+    def gfk(self):
+        '''
+        :return: G, Xs_new, Xt_new of the GFK projection
+        '''
+        return self._cached('gfk', lambda: GFK.GFK(dim=self.dim).fit(self.Xs_raw, self.Xt_raw))
+
+    @property
+    def X(self):
+        '''
+        d * n projected data, each instance (column) normalized to unit length
+        '''
+        def build():
+            _, Xs_new, Xt_new = self.gfk()
+            X = np.hstack((Xs_new.T, Xt_new.T))
+            X /= np.linalg.norm(X, axis=0)
+            return X
+        return self._cached('X', build)
+
+    @property
+    def Xs(self):
+        '''
+        ns * d projected source data
+        '''
+        return self.X[:, :self.ns].T
+
+    @property
+    def Xt(self):
+        '''
+        nt * d projected target data
+        '''
+        return self.X[:, self.ns:].T
+
+    def kernel(self, kernel_type='rbf', gamma=0.5, dtype=np.float64):
+        '''
+        n * n kernel matrix of the projected data
+        :param dtype: np.float32 halves the memory of the kernel
+        '''
+        return self._cached(('K', kernel_type, gamma, np.dtype(dtype).str),
+                            lambda: Kernel.kernel(kernel_type, self.X, None, gamma, dtype=dtype))
+
+    def kernel_factor(self, kernel_type='rbf', gamma=0.5, rank=1000, approximation='nystroem', random_state=1617):
+        '''
+        n * r low-rank factor Z of the kernel matrix, K ~= Z * Z', see Kernel.factor
+        '''
+        return self._cached(('Z', kernel_type, gamma, rank, approximation, random_state),
+                            lambda: Kernel.factor(kernel_type, self.X, gamma, rank, approximation=approximation,
+                                                  random_state=random_state))
+
+    def laplacian(self, p=10, sparse=False):
+        '''
+        Normalized Laplacian of the p nearest neighbors graph of the projected data
+        '''
+        L = self._cached(('L', p), lambda: Helpers.laplacian_matrix(self.X.T, p, sparse=True))
+        if sparse:
+            return L
+        return self._cached(('L_dense', p), L.toarray)
+
+    def meda_solver(self, kernel_type='rbf', gamma=0.5, p=10, rho=1.0, eta=0.1, lamb=10):
+        '''
+        Solver.WoodburySolver of the MEDA system: the part that does not depend on the
+        pseudo labels, (A + rho * L) * K + eta * I, is factorized once
+        '''
+        return self._cached(('meda_solver', kernel_type, gamma, p, rho, eta, lamb),
+                            lambda: Solver.WoodburySolver(self.A + rho * self.laplacian(p, sparse=True),
+                                                          self.kernel(kernel_type, gamma),
+                                                          self.a[:, None] * self.YY, eta, lamb=lamb))
+
+    @property
+    def a(self):
+        '''
+        Diagonal of A: 1 for source instances, 0 for target instances
+        '''
+        return self._cached('a', lambda: np.hstack((np.ones(self.ns), np.zeros(self.nt))))
+
+    @property
+    def A(self):
+        '''
+        n * n diagonal matrix A, sparse; A * YY is a[:, None] * YY
+        '''
+        return self._cached('A', lambda: scipy.sparse.diags(self.a, format='csr'))
+
+    @property
+    def YY(self):
+        '''
+        n * C one-hot coding of the source labels, zero rows for the target instances
+        '''
+        return self._cached('YY', lambda: Labels.one_hot(self.Ys, self.C, n=self.n))
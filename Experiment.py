@@ -0,0 +1,284 @@
+'''
+Run a grid of experiments (datasets x methods x runs) in one process pool.
+
+Each job writes <out>/<dataset>/<method>/<run>.json with its accuracy, time
+and parameters; jobs whose result file already exists are skipped, so an
+interrupted grid can simply be started again. The jobs are ordered by
+dataset and the workers take them in order, so a worker mostly runs the jobs
+of one dataset: it loads the dataset (and its DomainContext) once for them,
+and drops it when it moves to the next dataset. The evolutionary methods checkpoint their runs next to the
+result files, so a job killed in the middle of a run resumes from its last
+checkpoint.
+
+    python Experiment.py --data /path/to/UnPairs --out results \
+        --datasets SURFa-c,SURFa-d --methods MEDA,GA-MEDA,TCA --runs 30 --workers 32
+'''
+import argparse
+import contextlib
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import Checkpoint
+import Dataset
+
+METHODS = ['MEDA', 'GA-MEDA', 'R-MEDA', 'NSGAII-MEDA', 'TCA', 'JDA', 'CORAL', 'GFK']
+
+# loaded dataset and contexts of a worker, keyed by (path, normalize[, dim]), all of the same
+# dataset: a context holds n*n matrices, they are dropped when the worker moves to another dataset
+loaded = {}
+
+
+def switch(path):
+    if any(key[0] != path for key in loaded):
+        loaded.clear()
+
+
+def load(path, normalize):
+    switch(path)
+    key = (path, normalize)
+    if key not in loaded:
+        loaded[key] = Dataset.load(path, normalize=normalize)
+    return loaded[key]
+
+
+def context(path, normalize, dim):
+    # imported here, the baselines without GFK do not need its dependencies
+    import DomainContext
+    switch(path)
+    key = (path, normalize, dim)
+    if key not in loaded:
+        Xs, Ys, Xt, Yt, _ = load(path, normalize)
+        loaded[key] = DomainContext.DomainPairContext(Xs, Ys, Xt, Yt, dim=dim)
+    return loaded[key]
+
+
+@contextlib.contextmanager
+def working_directory(path):
+    '''
+    Some methods write their log to the working directory
+    '''
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def checkpoint_path(job):
+    return os.path.join(job['dir'], '%d.ckpt' % job['run'])
+
+
+# each method takes the job and returns a dict with at least the accuracy
+def run_meda(job):
+    import MEDA
+    Xs, Ys, Xt, Yt, _ = load(job['path'], job['normalize'])
+    meda = MEDA.MEDA(kernel_type='rbf', dim=job['dim'], lamb=10, rho=1.0, eta=job['eta'], p=10, gamma=0.5,
+                     T=10, out=None)
+    acc, _, list_acc = meda.fit_predict(Xs, Ys, Xt, Yt,
+                                        context=context(job['path'], job['normalize'], job['dim']))
+    return {'acc': acc, 'list_acc': list(list_acc)}
+
+
+def run_ga_meda(job):
+    import GA_MEDA
+    Xs, Ys, Xt, Yt, _ = load(job['path'], job['normalize'])
+    acc, _ = GA_MEDA.evolve(Xs, Ys, Xt, Yt, None, job['mutation_rate'], job['full_init'],
+                            dim_p=job['dim'], eta_p=job['eta'],
+                            context=context(job['path'], job['normalize'], job['dim']),
+                            checkpoint=checkpoint_path(job))
+    return {'acc': acc}
+
+
+def run_r_meda(job):
+    import Random_MEDA
+    Xs, Ys, Xt, Yt, _ = load(job['path'], job['normalize'])
+    r_meda = Random_MEDA.Random_MEDA(kernel_type='rbf', dim=job['dim'], lamb=10, rho=1.0, eta=job['eta'], p=10,
+                                     gamma=0.5, T=10, init_op=2, re_init_op=3, run=job['run'], archive_size=10)
+    with working_directory(job['dir']):
+        _, acc = r_meda.evolve(Xs, Ys, Xt, Yt, context=context(job['path'], job['normalize'], job['dim']),
+                               checkpoint=checkpoint_path(job))
+    return {'acc': acc}
+
+
+def run_nsgaii_meda(job):
+    import Helpers
+    import MultiTransfer
+    import Paras
+    from jmetal.operator.crossover import IntegerSBXCrossover
+    from jmetal.operator.mutation import IntegerPolynomialMutation
+    from jmetal.util.ranking import FastNonDominatedRanking
+    from jmetal.util.termination_criterion import StoppingByEvaluations
+    from NSGAII_MEDA import NSGAII_MEDA
+
+    problem = MultiTransfer.MultiTransferProblem(normalize=job['normalize'], gfk_dim=job['dim'],
+                                                 context=context(job['path'], job['normalize'], job['dim']),
+                                                 data=load(job['path'], job['normalize']))
+    no_evaluations = Paras.N_GEN * Paras.N_IND
+    algorithm = NSGAII_MEDA(
+        problem=problem,
+        population_size=Paras.N_IND,
+        offspring_population_size=Paras.N_IND,
+        mutation=IntegerPolynomialMutation(probability=1.0 / problem.number_of_variables, distribution_index=20),
+        crossover=IntegerSBXCrossover(probability=0.8, distribution_index=20),
+        termination_criterion=StoppingByEvaluations(max_evaluations=no_evaluations),
+        population_evaluator=MultiTransfer.PopulationEvaluator(),
+        checkpoint=checkpoint_path(job)
+    )
+    algorithm.run()
+    ranking = FastNonDominatedRanking(algorithm.dominance_comparator)
+    ranking.compute_ranking(algorithm.get_result())
+    labels = [sol.variables for sol in ranking.get_nondominated()]
+    return {'acc': np.mean(np.array(Helpers.voting(labels)) == problem.Yt), 'front_size': len(labels)}
+
+
+def run_tca(job):
+    import TCA
+    Xs, Ys, Xt, Yt, _ = load(job['path'], job['normalize'])
+    acc, _ = TCA.TCA(kernel_type='rbf', dim=job['dim'], lamb=1.0, gamma=0.5).fit_predict(Xs, Ys, Xt, Yt)
+    return {'acc': acc}
+
+
+def run_jda(job):
+    import JDA
+    Xs, Ys, Xt, Yt, _ = load(job['path'], job['normalize'])
+    acc, _, list_acc = JDA.JDA(kernel_type='rbf', dim=job['dim'], lamb=1.0, gamma=0.5, T=10).fit_predict(
+        Xs, Ys, Xt, Yt)
+    return {'acc': acc, 'list_acc': list(list_acc)}
+
+
+def run_coral(job):
+    import CORAL
+    Xs, Ys, Xt, Yt, _ = load(job['path'], job['normalize'])
+    acc, _ = CORAL.CORAL().fit_predict(Xs, Ys, Xt, Yt)
+    return {'acc': acc}
+
+
+def run_gfk(job):
+    import GFK
+    Xs, Ys, Xt, Yt, _ = load(job['path'], job['normalize'])
+    acc, _, _ = GFK.GFK(dim=job['dim']).fit_predict(Xs, Ys, Xt, Yt)
+    return {'acc': acc}
+
+
+RUNNERS = {'MEDA': run_meda, 'GA-MEDA': run_ga_meda, 'R-MEDA': run_r_meda, 'NSGAII-MEDA': run_nsgaii_meda,
+           'TCA': run_tca, 'JDA': run_jda, 'CORAL': run_coral, 'GFK': run_gfk}
+
+
+def result_path(out, dataset, method, run):
+    return os.path.join(out, dataset, method, '%d.json' % run)
+
+
+def make_jobs(data_dir, out, datasets, methods, runs, **params):
+    '''
+    :param runs: list of run indices, run r uses the seed 1617 * r
+    :param params: dim, eta, normalize, mutation_rate, full_init
+    :return: the jobs without a result yet, ordered by dataset (then method and run)
+    '''
+    for method in methods:
+        if method not in RUNNERS:
+            raise ValueError('Unknown method %s, expected one of %s' % (method, ', '.join(METHODS)))
+    jobs = []
+    for dataset in datasets:
+        for method in methods:
+            for run in runs:
+                path = result_path(out, dataset, method, run)
+                if os.path.exists(path):
+                    continue
+                job = dict(params, dataset=dataset, method=method, run=run, seed=1617 * run,
+                           path=os.path.join(data_dir, dataset), dir=os.path.dirname(path), result=path)
+                jobs.append(job)
+    return jobs
+
+
+def run_job(job):
+    '''
+    Run one job in the current process and write its result file
+    :return: the result
+    '''
+    np.random.seed(job['seed'])
+    random.seed(job['seed'])
+    if not os.path.isdir(job['dir']):
+        os.makedirs(job['dir'])
+    start = time.time()
+    values = RUNNERS[job['method']](job)
+    result = dict((key, value) for key, value in job.items() if key not in ('dir', 'result'))
+    result.update(values)
+    result['time'] = time.time() - start
+    write_json(job['result'], result)
+    Checkpoint.remove(checkpoint_path(job))
+    return result
+
+
+def write_json(path, record):
+    # write then rename, so an interrupted job never leaves a partial result behind
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp, 'w') as f:
+        json.dump(record, f, indent=1, default=float)
+    os.replace(tmp, path)
+
+
+def run(jobs, workers=None):
+    '''
+    Run the jobs in a process pool, a failing job is reported and does not stop the others
+    :return: list of results, list of (job, error)
+    '''
+    results, errors = [], []
+    if workers == 1:
+        for job in jobs:
+            try:
+                results.append(run_job(job))
+            except Exception as error:
+                errors.append((job, repr(error)))
+        return results, errors
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = dict((executor.submit(run_job, job), job) for job in jobs)
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as error:
+                errors.append((futures[future], repr(error)))
+    return results, errors
+
+
+def collect(out):
+    '''
+    :return: list of all the results written under out
+    '''
+    records = []
+    for root, _, files in os.walk(out):
+        for name in sorted(files):
+            if name.endswith('.json'):
+                with open(os.path.join(root, name)) as f:
+                    records.append(json.load(f))
+    return records
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a grid of domain adaptation experiments')
+    parser.add_argument('--data', required=True, help='directory containing one directory per dataset')
+    parser.add_argument('--out', default='results')
+    parser.add_argument('--datasets', required=True, help='comma separated dataset names')
+    parser.add_argument('--methods', default=','.join(METHODS), help='comma separated, among ' + ', '.join(METHODS))
+    parser.add_argument('--runs', type=int, default=30)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--dim', type=int, default=20)
+    parser.add_argument('--eta', type=float, default=0.1)
+    parser.add_argument('--normalize', action='store_true')
+    parser.add_argument('--mutation-rate', type=float, default=0.2)
+    parser.add_argument('--full-init', action='store_true')
+    args = parser.parse_args()
+
+    jobs = make_jobs(args.data, args.out, args.datasets.split(','), args.methods.split(','),
+                     range(1, args.runs + 1), dim=args.dim, eta=args.eta, normalize=args.normalize,
+                     mutation_rate=args.mutation_rate, full_init=args.full_init)
+    print('%d jobs to run' % len(jobs))
+    results, errors = run(jobs, workers=args.workers)
+    for job, error in errors:
+        print('Failed %s %s run %d: %s' % (job['dataset'], job['method'], job['run'], error))
+    print('%d jobs done, %d failed' % (len(results), len(errors)))
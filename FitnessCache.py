@@ -0,0 +1,137 @@
+'''
+Memoization of the evaluation of label vectors.
+
+GAs re-evaluate identical label vectors: crossover of near-identical parents,
+re-sampling of the archive, the final evaluation of the population. The
+cache keys each vector by a hash of its packed bytes, so a repeated
+individual costs a dictionary lookup instead of a MEDA solve, and keeps the
+max_size most recently used entries.
+
+    cache = FitnessCache.FitnessCache(max_size=10000)
+    fitnesses = cache.map(fitness_evaluation, pop, toolbox.map)
+'''
+import collections
+import hashlib
+
+import numpy as np
+
+
+def label_key(labels):
+    '''
+    Hash of a label vector, the same for a list, a DEAP individual or an array
+    of the same values
+    '''
+    labels = np.asarray(labels)
+    if labels.dtype.kind in 'iub':
+        # labels are small integers, pack them in the smallest integer type
+        labels = labels.astype(np.int16 if labels.size == 0 or labels.max() >= 256 or labels.min() < 0
+                               else np.uint8)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str((labels.shape, labels.dtype.str)).encode())
+    h.update(np.ascontiguousarray(labels).tobytes())
+    return h.digest()
+
+
+def duplicate_indices(pop):
+    '''
+    :param pop: list of label vectors
+    :return: indices of the vectors equal to an earlier one
+    '''
+    seen = set()
+    indices = []
+    for index, ind in enumerate(pop):
+        key = label_key(ind)
+        if key in seen:
+            indices.append(index)
+        else:
+            seen.add(key)
+    return indices
+
+
+class FitnessCache:
+    def __init__(self, max_size=10000):
+        '''
+        :param max_size: number of entries kept, the least recently used ones are evicted
+        '''
+        self.max_size = max_size
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, labels):
+        return label_key(labels) in self.entries
+
+    def get(self, labels, default=None):
+        key = label_key(labels)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        return default
+
+    def put(self, labels, value):
+        key = label_key(labels)
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def evaluate(self, func, labels):
+        '''
+        :return: func(labels), computed only if labels is not in the cache
+        '''
+        key = label_key(labels)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        value = func(labels)
+        self.put(labels, value)
+        return value
+
+    def map(self, func, items, mapper=map):
+        '''
+        Like mapper(func, items), only the items missing from the cache are
+        given to mapper (e.g. a process pool map), and each distinct missing
+        vector only once
+        :return: list of the values, in the order of items
+        '''
+        items = list(items)
+        keys = [label_key(item) for item in items]
+        values = [None] * len(items)
+        missing = collections.OrderedDict()
+        for index, key in enumerate(keys):
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                values[index] = self.entries[key]
+            elif key in missing:
+                # a duplicate of a missing item, computed once
+                self.hits += 1
+                missing[key].append(index)
+            else:
+                self.misses += 1
+                missing[key] = [index]
+        if missing:
+            computed = mapper(func, [items[indices[0]] for indices in missing.values()])
+            for (key, indices), value in zip(missing.items(), computed):
+                for index in indices:
+                    values[index] = value
+                self.entries[key] = value
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return values
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return float(self.hits) / total if total else 0.0
@@ -1,5 +1,8 @@
 import numpy as np
 import Core
+import Labels
+import MMDMatrix
+import Solver
 
 
 def fitness_function_test(Beta, Yt_pseu):
@@ -9,33 +12,14 @@ def fitness_function_test(Beta, Yt_pseu):
     :return:
     '''
     # estimate the new label
-    Ytest = np.copy(Core.YY)
-    for c in range(1, Core.C + 1):
-        yy = Yt_pseu == c
-        inds = np.where(yy == True)
-        inds = [item + Core.ns for item in inds]
-        Ytest[inds, c - 1] = 1
+    Ytest = Labels.one_hot(np.concatenate((Core.Ys, Yt_pseu)), Core.C)
 
     # now build M
-    N = 0
-    for c in range(1, Core.C + 1):
-        e = np.zeros((Core.n, 1))
-        tt = Core.Ys == c
-        e[np.where(tt == True)] = 1.0 / len(Core.Ys[np.where(Core.Ys == c)])
-        yy = Yt_pseu == c
-        ind = np.where(yy == True)
-        inds = [item + Core.ns for item in ind]
-        if len(Yt_pseu[np.where(Yt_pseu == c)]) != 0:
-            e[tuple(inds)] = -1.0 / len(Yt_pseu[np.where(Yt_pseu == c)])
-        else:
-            e[np.isinf(e)] = 0
-        N = N + np.dot(e, e.T)
-    M = 0.5 * Core.M0 + 0.5 * N
-    M = M / np.linalg.norm(M, 'fro')
-
-    SRM = np.linalg.norm(np.dot(Ytest.T - np.dot(Beta.T, Core.K), Core.A)) \
+    M = MMDMatrix.MMDOperator(Core.Ys, Yt_pseu, Core.C, mu=0.5)
+
+    SRM = np.linalg.norm((Ytest.T - np.dot(Beta.T, Core.K)) * Core.a) \
           + Core.eta * np.linalg.multi_dot([Beta.T, Core.K, Beta]).trace()
-    MMD = Core.lamb * np.linalg.multi_dot([Beta.T, np.linalg.multi_dot([Core.K, M, Core.K]), Beta]).trace()
+    MMD = Core.lamb * M.quad_trace(np.dot(Core.K, Beta))
 
     return SRM + MMD
 
@@ -47,33 +31,38 @@ def fitness_function(Beta):
     :return:
     '''
     # estimate the new label
-    Ytest = np.copy(Core.YY)
-    for c in range(1, Core.C + 1):
-        yy = Core.Yt_pseu == c
-        inds = np.where(yy == True)
-        inds = [item + Core.ns for item in inds]
-        Ytest[inds, c - 1] = 1
+    Ytest = Labels.one_hot(np.concatenate((Core.Ys, Core.Yt_pseu)), Core.C)
 
     # now build M
-    N = 0
-    for c in range(1, Core.C + 1):
-        e = np.zeros((Core.n, 1))
-        tt = Core.Ys == c
-        e[np.where(tt == True)] = 1.0 / len(Core.Ys[np.where(Core.Ys == c)])
-        yy = Core.Yt_pseu == c
-        ind = np.where(yy == True)
-        inds = [item + Core.ns for item in ind]
-        if len(Core.Yt_pseu[np.where(Core.Yt_pseu == c)]) != 0:
-            e[tuple(inds)] = -1.0 / len(Core.Yt_pseu[np.where(Core.Yt_pseu == c)])
-        else:
-            e[np.isinf(e)] = 0
-        N = N + np.dot(e, e.T)
-    M = 0.5 * Core.M0 + 0.5 * N
-    M = M / np.linalg.norm(M, 'fro')
-
-    SRM = np.linalg.norm(np.dot(Ytest.T - np.dot(Beta.T, Core.K), Core.A)) \
+    M = MMDMatrix.MMDOperator(Core.Ys, Core.Yt_pseu, Core.C, mu=0.5)
+
+    SRM = np.linalg.norm((Ytest.T - np.dot(Beta.T, Core.K)) * Core.a) \
           + Core.eta * np.linalg.multi_dot([Beta.T, Core.K, Beta]).trace()
-    MMD = Core.lamb * np.linalg.multi_dot([Beta.T, np.linalg.multi_dot([Core.K, M, Core.K]), Beta]).trace()
+    MMD = Core.lamb * M.quad_trace(np.dot(Core.K, Beta))
+
+    return SRM + MMD
+
+
+def swarm_fitness(Betas):
+    '''
+    fitness_function of several Beta matrices at once: the labels and M are
+    built once, and K * Beta of all the matrices is one matrix product
+    :param Betas: p * n * C array of Beta matrices
+    :return: p fitness values
+    '''
+    Betas = np.asarray(Betas)
+    p, n, C = Betas.shape
+    Ytest = Labels.one_hot(np.concatenate((Core.Ys, Core.Yt_pseu)), Core.C)
+    M = MMDMatrix.MMDOperator(Core.Ys, Core.Yt_pseu, Core.C, mu=0.5)
+
+    # K * Beta of each matrix (K is symmetric, so Beta' * K is its transpose), as one n * (p*C) product
+    KB = np.dot(Core.K, np.transpose(Betas, (1, 0, 2)).reshape(n, p * C))
+    KB = np.transpose(KB.reshape(n, p, C), (1, 0, 2))
+
+    a = Core.a[:, None]
+    SRM = np.sqrt(np.sum(((Ytest - KB) * a) ** 2, axis=(1, 2))) \
+          + Core.eta * np.sum(Betas * KB, axis=(1, 2))
+    MMD = Core.lamb * M.quad_traces(KB)
 
     return SRM + MMD
 
@@ -85,24 +74,9 @@ def refine(beta):
     Cls = Cls[Core.ns:]
 
     # now build M
-    N = 0
-    for c in range(1, Core.C + 1):
-        e = np.zeros((Core.n, 1))
-        tt = Core.Ys == c
-        e[np.where(tt == True)] = 1.0 / len(Core.Ys[np.where(Core.Ys == c)])
-        yy = Cls == c
-        ind = np.where(yy == True)
-        inds = [item + Core.ns for item in ind]
-        if len(Cls[np.where(Cls == c)]) != 0:
-            e[tuple(inds)] = -1.0 / len(Cls[np.where(Cls == c)])
-        else:
-            e[np.isinf(e)] = 0
-        N = N + np.dot(e, e.T)
-    M = 0.5 * Core.M0 + 0.5 * N
-    M = M / np.linalg.norm(M, 'fro')
-
-    left = np.dot(Core.A + Core.lamb * M, Core.K) + Core.eta * np.eye(Core.n, Core.n)
-    new_beta = np.dot(np.linalg.inv(left), np.dot(Core.A, Core.YY))
+    M = MMDMatrix.MMDOperator(Core.Ys, Cls, Core.C, mu=0.5)
+
+    new_beta = Solver.meda_beta(Core.A, Core.K, Core.a[:, None] * Core.YY, Core.eta, mmd=M, lamb=Core.lamb)
 
     return new_beta
 
@@ -1,5 +1,6 @@
 import random
 
+import Dataset
 import Helpers as Pre
 import numpy as np
 from deap import base, creator, tools
@@ -14,13 +15,22 @@ from sklearn.ensemble import RandomForestClassifier, AdaBoostClassifier
 from sklearn.naive_bayes import GaussianNB
 from sklearn.discriminant_analysis import QuadraticDiscriminantAnalysis
 
+import Checkpoint
+import Diversity
+import FitnessCache
 import Helpers
-import GFK
+import LabelFitness
+import DomainContext
+import MMDMatrix
+import Parallel
+import RunLogger
+import Solver
 import MEDA
 import KMM
 import TCA
 import sys, time
 import CORAL
+from Kernel import kernel
 #from shutil import copyfile
 #import Directory as Dir
 
@@ -28,33 +38,6 @@ import CORAL
 # from scoop import futures
 # toolbox.register("map", futures.map)
 # for parallel
-def kernel(ker, X, X2, gamma):
-    if not ker or ker == 'primal':
-        return X
-    elif ker == 'linear':
-        if not X2:
-            K = np.dot(X.T, X)
-        else:
-            K = np.dot(X.T, X2)
-    elif ker == 'rbf':
-        n1sq = np.sum(X ** 2, axis=0)
-        n1 = X.shape[1]
-        if not X2:
-            D = (np.ones((n1, 1)) * n1sq).T + np.ones((n1, 1)) * n1sq - 2 * np.dot(X.T, X)
-        else:
-            n2sq = np.sum(X2 ** 2, axis=0)
-            n2 = X2.shape[1]
-            D = (np.ones((n2, 1)) * n1sq).T + np.ones((n1, 1)) * n2sq - 2 * np.dot(X.T, X)
-        K = np.exp(-gamma * D)
-    elif ker == 'sam':
-        if not X2:
-            D = np.dot(X.T, X)
-        else:
-            D = np.dot(X.T, X2)
-        K = np.exp(-gamma * np.arccos(D) ** 2)
-    return K
-
-
 def proxy_a_distance(source_X, target_X):
     """
     Compute the Proxy-A-Distance of a source/target representation
@@ -95,6 +78,11 @@ M0 = 0
 K = 0
 A = 0
 e = 0
+manifold = None
+solver = None
+# fitness and label_evolve results of the label vectors already seen in the run
+fitness_cache = None
+evolve_cache = None
 
 toolbox = base.Toolbox()
 
@@ -122,37 +110,55 @@ def estimate_mu(_X1, _Y1, _X2, _Y2):
 def fitness_evaluation(Yt_pseu):
     '''
     Calculate the fitness of Yt_pseu, it is expensive to calculate beta
-    so from Yt_pseu, set beta as the one-hot code
-    :param Yt_pseu: size nt*c
+    so from Yt_pseu, set beta as the one-hot code F and use trace(F' * L * F).
+    When Yt_pseu carries the labels and the fitness of its parent (ind.parent),
+    only the labels that have changed are evaluated.
+    :param Yt_pseu: nt target pseudo labels
     :return: fitness of Yt_pseu
     '''
-    Yt_pseu = np.array(Yt_pseu)
-    Y = np.concatenate((Ys, Yt_pseu))
-    F = np.zeros((ns+nt, C))
-    for index, l in enumerate(Y):
-        F[index][l-1] = 1
-    # mu = estimate_mu(Xs, Ys, Xt, Yt_pseu)
-    # have to update the matrix M
-    # N = 0
-    # for c in range(1, C + 1):
-    #     e = np.zeros((ns + nt, 1))
-    #     tt = Ys == c
-    #     e[np.where(tt == True)] = 1.0 / len(Ys[np.where(Ys == c)])
-    #     yy = Yt_pseu == c
-    #     ind = np.where(yy == True)
-    #     inds = [item + ns for item in ind]
-    #     if len(Yt_pseu[np.where(Yt_pseu == c)]) == 0:
-    #         e[tuple(inds)] = 0.0
-    #     else:
-    #         e[tuple(inds)] = -1.0 / len(Yt_pseu[np.where(Yt_pseu == c)])
-    #     e[np.isinf(e)] = 0
-    #     N += np.dot(e, e.T)
-    # M = (1 - mu) * M0 + mu * N
-    # test1 = np.linalg.multi_dot([F.T, M0, F]).trace()
-    fitness = np.linalg.multi_dot([F.T, L, F]).trace()
-    # fitness = np.linalg.multi_dot([F.T, lamb * M + rho * L, F]).trace()
-
-    return fitness
+    parent = getattr(Yt_pseu, 'parent', None)
+    if parent is not None:
+        return manifold.update(parent[0], parent[1], Yt_pseu)
+    return manifold.evaluate(Yt_pseu)
+
+def population_fitness(pop):
+    '''
+    Calculate the fitness of a list of individuals. The ones that know their
+    parent are updated from their changed labels, the others are evaluated
+    together in one batch, and the ones already seen are read from fitness_cache
+    :param pop: list of individuals
+    :return: list of fitness values, in the order of pop
+    '''
+    fitnesses = [None] * len(pop)
+    batch = []
+    for index, ind in enumerate(pop):
+        if fitness_cache is not None:
+            fitnesses[index] = fitness_cache.get(ind)
+        if fitnesses[index] is not None:
+            continue
+        if getattr(ind, 'parent', None) is not None:
+            fitnesses[index] = fitness_evaluation(ind)
+        else:
+            batch.append(index)
+    if batch:
+        values = manifold.evaluate_population([pop[index] for index in batch])
+        for index, value in zip(batch, values):
+            fitnesses[index] = value
+    if fitness_cache is not None:
+        for ind, value in zip(pop, fitnesses):
+            fitness_cache.put(ind, value)
+    return fitnesses
+
+
+def meda_solver():
+    '''
+    The Solver.WoodburySolver of the run, built on first use in a worker that did not inherit it
+    '''
+    global solver
+    if solver is None:
+        solver = Solver.WoodburySolver(A, K, A.dot(YY), eta, lamb=lamb)
+    return solver
+
 
 def label_evolve(ind):
     '''
@@ -163,27 +169,10 @@ def label_evolve(ind):
     '''
     Yt_pseu = np.array([ind[index] for index in range(len(ind))])
     mu = estimate_mu(Xs, Ys, Xt, Yt_pseu)
-    N = 0
-    # have to update the matrix M
-    for c in range(1, C + 1):
-        e = np.zeros((ns + nt, 1))
-        tt = Ys == c
-        e[np.where(tt == True)] = 1.0 / len(Ys[np.where(Ys == c)])
-        yy = Yt_pseu == c
-        ind = np.where(yy == True)
-        inds = [item + ns for item in ind]
-        if len(Yt_pseu[np.where(Yt_pseu == c)]) == 0:
-            e[tuple(inds)] = 0.0
-        else:
-            e[tuple(inds)] = -1.0 / len(Yt_pseu[np.where(Yt_pseu == c)])
-        e[np.isinf(e)] = 0
-        N += np.dot(e, e.T)
-    M = (1 - mu) * M0 + mu * N
-
-    M /= np.linalg.norm(M, 'fro')
-    left = np.dot(A + lamb * M, K) \
-           + eta * np.eye(ns + nt, ns + nt)
-    beta = np.dot(np.linalg.inv(left), np.dot(A, YY))
+    M = MMDMatrix.MMDOperator(Ys, Yt_pseu, C, mu=mu)
+    # only M depends on the labels, the fixed part is factorized once; the solve is exact, so
+    # Beta does not depend on the process or on what it solved before (it is memoized by evolve_cache)
+    beta = meda_solver().solve(M)
 
     F = np.dot(K, beta)
     Y_pseu = np.argmax(F, axis=1) + 1
@@ -208,14 +197,19 @@ def opposite_local(pop):
     pop.extend(to_add)
 
 
-def evolve(Xsource, Ysource, Xtarget, Ytarget, file, mutation_rate, full_init, dim_p=20, eta_p=0.1):
+def evolve(Xsource, Ysource, Xtarget, Ytarget, file, mutation_rate, full_init, dim_p=20, eta_p=0.1,
+           context=None, processes=1, records=None, checkpoint=None, checkpoint_every=1):
     """
     Running GA algorithms, where each individual is a set of target pseudo labels.
+    :param file: open file the log is written to as the run goes, or None
+    :param records: file name of the per-generation records (JSON lines), not written if None
+    :param checkpoint: file name of the checkpoint, the run resumes from it if it exists
+    :param checkpoint_every: number of generations between two checkpoints
     :return: the best solution of GAs.
     """
     exe_time = 0
     start = time.time()
-    global ns, nt, C, Xs, Ys, Xt, Yt, YY, K, A, e, M0, L, dim, eta
+    global ns, nt, C, Xs, Ys, Xt, Yt, YY, K, A, e, M0, L, dim, eta, manifold, solver, fitness_cache, evolve_cache
     dim = dim_p
     eta = eta_p
     archive = []
@@ -226,14 +220,11 @@ def evolve(Xsource, Ysource, Xtarget, Ytarget, file, mutation_rate, full_init, d
     ns, nt = Xs.shape[0], Xt.shape[0]
     C = len(np.unique(Ys))
 
-    # Transform data using gfk
-    gfk = GFK.GFK(dim=dim)
-    _, Xs_new, Xt_new = gfk.fit(Xs, Xt)
-    Xs_new, Xt_new = Xs_new.T, Xt_new.T
-    X = np.hstack((Xs_new, Xt_new))
-    X /= np.linalg.norm(X, axis=0)
-    Xs = X[:, :ns].T
-    Xt = X[:, ns:].T
+    # Transform data using gfk, shared through the context
+    if context is None:
+        context = DomainContext.DomainPairContext(Xs, Ys, Xt, Yt, dim=dim)
+    Xs = context.Xs
+    Xt = context.Xt
 
     # perform instance selection
     # kmm = KMM.KMM(kernel_type='rbf', gamma=0.5)
@@ -272,20 +263,20 @@ def evolve(Xsource, Ysource, Xtarget, Ytarget, file, mutation_rate, full_init, d
     # Xt = X[:, ns:].T
 
     # build some matrices that are not changed
-    K = kernel(kernel_type, X, X2=None, gamma=gamma)
-    A = np.diagflat(np.vstack((np.ones((ns, 1)), np.zeros((nt, 1)))))
-    e = np.vstack((1.0 / ns * np.ones((ns, 1)), -1.0 / nt * np.ones((nt, 1))))
-    M0 = e * e.T * C
+    K = context.kernel(kernel_type, gamma)
+    A = context.A
     exe_time += time.time()-start
 
-    L = Helpers.laplacian_matrix(X.T, p)
+    L = context.laplacian(p)
+    manifold = LabelFitness.ManifoldTrace(context.laplacian(p, sparse=True), Ys)
+    fitness_cache = FitnessCache.FitnessCache()
+    evolve_cache = FitnessCache.FitnessCache(max_size=1000)
 
     start = time.time()
-    YY = np.zeros((ns, C))
-    for c in range(1, C + 1):
-        ind = np.where(Ys == c)
-        YY[ind, c - 1] = 1
-    YY = np.vstack((YY, np.zeros((nt, C))))
+    YY = context.YY
+    # built before the pool is created, so that forked workers share it
+    solver = None
+    meda_solver()
 
     pos_min = 1
     pos_max = C
@@ -311,49 +302,65 @@ def evolve(Xsource, Ysource, Xtarget, Ytarget, file, mutation_rate, full_init, d
     toolbox.register("crossover", tools.cxUniform, indpb=0.5)
     toolbox.register("mutate", tools.mutUniformInt, low=pos_min, up=pos_max,
                      indpb=MUTATION_RATE)
-    # pool = multiprocessing.Pool(4)
-    # toolbox.register("map", pool.map)
-    # initialize some individuals by predefined classifiers
-    pop = toolbox.pop(n=N_IND)
-
-    classifiers = list([])
-    classifiers.append(KNeighborsClassifier(1))
-    # classifiers.append(SVC(kernel="linear", C=0.025, random_state=np.random.randint(2 ** 10)))
-    # classifiers.append(GaussianProcessClassifier(1.0 * RBF(1.0), random_state=np.random.randint(2 ** 10)))
-    # classifiers.append(KNeighborsClassifier(3))
-    # classifiers.append(SVC(kernel="rbf", C=1, gamma=2, random_state=np.random.randint(2 ** 10)))
-    # classifiers.append(DecisionTreeClassifier(max_depth=5, random_state=np.random.randint(2 ** 10)))
-    # classifiers.append(KNeighborsClassifier(5))
-    # classifiers.append(GaussianNB())
-    # classifiers.append(RandomForestClassifier(max_depth=5, n_estimators=10, random_state=np.random.randint(2 ** 10)))
-    # classifiers.append(AdaBoostClassifier(random_state=np.random.randint(2 ** 10)))
-
-    step = N_IND/len(classifiers)
-    for ind_index, classifier in enumerate(classifiers):
-        classifier.fit(Xs, Ys)
-        Yt_pseu = classifier.predict(Xt)
-        for bit_idex, value in enumerate(Yt_pseu):
-            pop[ind_index*step][bit_idex] = value
-
-    if full_init:
-        Helpers.opposite_init(pop, pos_min, pos_max)
-
-    # evaluate the initialized populations
-    fitnesses = toolbox.map(toolbox.evaluate, pop)
-    for ind, fit in zip(pop, fitnesses):
-        ind.fitness.values = fit,
-
-    hof = tools.HallOfFame(maxsize=1)
-    hof.update(pop)
+    # evaluate in a process pool, the globals read by the workers go through shared memory
+    pool = Parallel.register(toolbox, sys.modules[__name__],
+                             ['ns', 'C', 'Xs', 'Ys', 'Xt', 'A', 'K', 'YY', 'eta', 'manifold'], processes)
+    # the individuals can only be unpickled once their classes are created
+    state = Checkpoint.resume(checkpoint)
+    if state is None:
+        # initialize some individuals by predefined classifiers
+        pop = toolbox.pop(n=N_IND)
+
+        classifiers = list([])
+        classifiers.append(KNeighborsClassifier(1))
+        # classifiers.append(SVC(kernel="linear", C=0.025, random_state=np.random.randint(2 ** 10)))
+        # classifiers.append(GaussianProcessClassifier(1.0 * RBF(1.0), random_state=np.random.randint(2 ** 10)))
+        # classifiers.append(KNeighborsClassifier(3))
+        # classifiers.append(SVC(kernel="rbf", C=1, gamma=2, random_state=np.random.randint(2 ** 10)))
+        # classifiers.append(DecisionTreeClassifier(max_depth=5, random_state=np.random.randint(2 ** 10)))
+        # classifiers.append(KNeighborsClassifier(5))
+        # classifiers.append(GaussianNB())
+        # classifiers.append(RandomForestClassifier(max_depth=5, n_estimators=10, random_state=np.random.randint(2 ** 10)))
+        # classifiers.append(AdaBoostClassifier(random_state=np.random.randint(2 ** 10)))
+
+        step = N_IND // len(classifiers)
+        for ind_index, classifier in enumerate(classifiers):
+            classifier.fit(Xs, Ys)
+            Yt_pseu = classifier.predict(Xt)
+            for bit_idex, value in enumerate(Yt_pseu):
+                pop[ind_index*step][bit_idex] = value
+
+        if full_init:
+            Helpers.opposite_init(pop, pos_min, pos_max)
+
+        # evaluate the initialized populations
+        fitnesses = population_fitness(pop)
+        for ind, fit in zip(pop, fitnesses):
+            ind.fitness.values = fit,
+
+        hof = tools.HallOfFame(maxsize=1)
+        hof.update(pop)
+        first_gen = 0
+    else:
+        pop, hof, archive = state['pop'], state['hof'], state['archive']
+        fitness_cache, evolve_cache = state['fitness_cache'], state['evolve_cache']
+        first_gen = state['gen']
+        exe_time = state['exe_time']
+        start = time.time()
     exe_time = exe_time + time.time()-start
 
-    to_write = ''
-    for g in range(N_GEN):
-        to_write += "*****Iteration %d*****\n" % (g+1)
+    log = RunLogger.RunLogger(file, records=records, mode='w' if state is None else 'a')
+    if state is not None:
+        log.rewind(state['log'])
+    for g in range(first_gen, N_GEN):
+        log.write("*****Iteration %d*****\n" % (g+1))
         start = time.time()
         # selection
         offspring = toolbox.select(pop, len(pop))
-        offspring = map(toolbox.clone, offspring)
+        offspring = list(map(toolbox.clone, offspring))
+        # remember the parent of each offspring, so that the fitness is updated from the changed labels only
+        for ind in offspring:
+            ind.parent = (np.array(ind), ind.fitness.values[0])
 
         # applying crossover
         for c1, c2 in zip(offspring[::2], offspring[1::2]):
@@ -369,20 +376,22 @@ def evolve(Xsource, Ysource, Xtarget, Ytarget, file, mutation_rate, full_init, d
                 del mutant.fitness.values
 
         invalid_ind = [ind for ind in offspring if not ind.fitness.valid]
-        fitnesses = toolbox.map(toolbox.evaluate, invalid_ind)
+        fitnesses = population_fitness(invalid_ind)
         for ind, fitness in zip(invalid_ind, fitnesses):
                 ind.fitness.values = fitness,
+        # the parent labels are only needed for this evaluation, do not clone, pickle or checkpoint them
+        for ind in offspring:
+            del ind.parent
 
         # now select the best individual from offspring
         # pass it to the single step meda to refine the label
-        best_inds = tools.selBest(offspring, N_IND/10)
+        best_inds = tools.selBest(offspring, N_IND // 10)
 
-        for best_ind in best_inds:
-            Yt_pseu = label_evolve(best_ind)
+        for Yt_pseu in evolve_cache.map(label_evolve, best_inds, toolbox.map):
             new_ind = toolbox.ind()
             for index, label in enumerate(Yt_pseu):
                 new_ind[index] = label
-            new_ind.fitness.values = fitness_evaluation(new_ind),
+            new_ind.fitness.values = fitness_cache.evaluate(fitness_evaluation, new_ind),
             offspring.append(new_ind)
             archive.append(new_ind)
 
@@ -390,53 +399,63 @@ def evolve(Xsource, Ysource, Xtarget, Ytarget, file, mutation_rate, full_init, d
         exe_time = exe_time + time.time() - start
         pop[:] = tools.selBest(offspring + list(hof), len(pop))
         hof.update(pop)
-        to_write += ('Average distance: %f\n' %(Helpers.pop_distance(pop)))
-        to_write += ('Best fitness: %f\n' %(hof[0].fitness.values[0]))
+        diversity = Diversity.hamming(pop)
+        log.write('Average distance: %f\n' %(diversity))
+        log.write('Best fitness: %f\n' %(hof[0].fitness.values[0]))
 
         best_ind = tools.selBest(pop, 1)[0]
-        acc = np.mean(best_ind == Yt)
-        to_write += ("Accuracy of the best individual: %f\n" % acc)
+        best_acc = np.mean(best_ind == Yt)
+        log.write("Accuracy of the best individual: %f\n" % best_acc)
 
         no_10p = int(0.1*N_IND)
         top10 = tools.selBest(pop, no_10p)
         vote_label = Helpers.voting(top10)
-        acc = np.mean(vote_label == Yt)
-        to_write += ("Accuracy of the 10%% population: %f\n" % acc)
+        top10_acc = np.mean(vote_label == Yt)
+        log.write("Accuracy of the 10%% population: %f\n" % top10_acc)
 
         # Use the whole population
         vote_label = Helpers.voting(pop)
         acc = np.mean(vote_label == Yt)
-        to_write += ("Accuracy of the population: %f\n" % acc)
-
-    to_write += ("*****Final result*****\n")
+        log.write("Accuracy of the population: %f\n" % acc)
+        log.record(event='generation', gen=g + 1, fitness=hof[0].fitness.values[0], diversity=diversity,
+                   best_acc=best_acc, top10_acc=top10_acc, pop_acc=acc, time=exe_time)
+        if checkpoint is not None and Checkpoint.due(g + 1, checkpoint_every):
+            Checkpoint.save(checkpoint, gen=g + 1, pop=pop, hof=hof, archive=archive, exe_time=exe_time,
+                            fitness_cache=fitness_cache, evolve_cache=evolve_cache, log=log.mark())
+
+    if pool is not None:
+        pool.close()
+
+    log.write("*****Final result*****\n")
+    log.write("Fitness cache: %d hits, %d misses\n" % (fitness_cache.hits, fitness_cache.misses))
     best_ind = tools.selBest(pop, 1)[0]
     acc = np.mean(best_ind == Yt)
-    to_write += ("Accuracy of the best individual: %f\n" % acc)
+    log.write("Accuracy of the best individual: %f\n" % acc)
 
-    best_evolve = label_evolve(best_ind)
+    best_evolve = evolve_cache.evaluate(label_evolve, best_ind)
     acc = np.mean(best_evolve == Yt)
     return_acc = acc
-    to_write += ("Accuracy of the evovled best individual: %f\n" % acc)
+    log.write("Accuracy of the evovled best individual: %f\n" % acc)
 
     top10 = tools.selBest(pop, 10)
     vote_label = Helpers.voting(top10)
     acc = np.mean(vote_label == Yt)
-    to_write += ("Accuracy of the 10%% population: %f\n" % acc)
+    log.write("Accuracy of the 10%% population: %f\n" % acc)
 
     # Use the whole population
     vote_label = Helpers.voting(pop)
     acc = np.mean(vote_label == Yt)
-    to_write += ("Accuracy of the population: %f\n" % acc)
+    log.write("Accuracy of the population: %f\n" % acc)
 
     # Use the archive
     vote_label = Helpers.voting(archive)
     acc = np.mean(vote_label == Yt)
-    to_write += ("Accuracy of the archive: %f\n" % acc)
-
-    to_write += ('GA-MEDA time: %f' % (exe_time)+'\n')
+    log.write("Accuracy of the archive: %f\n" % acc)
 
-    if file is not None:
-        file.write(to_write)
+    log.write('GA-MEDA time: %f' % (exe_time)+'\n')
+    log.record(event='final', evolved_acc=return_acc, archive_acc=acc, time=exe_time,
+               cache_hits=fitness_cache.hits, cache_misses=fitness_cache.misses)
+    log.close()
     return return_acc, best_evolve
 
 
@@ -495,49 +514,43 @@ if __name__ == '__main__':
     full_init = int(sys.argv[4]) == 1
     dim = int(sys.argv[5])
     eta = float(sys.argv[6])/100.0
+    processes = int(sys.argv[7]) if len(sys.argv) > 7 else 1
+
+    Xs, Ys, Xt, Yt, C = Dataset.load(normalize=normalize)
+
+    # a restarted run resumes from its checkpoint, after the log written before it
+    checkpoint = str(run)+".ckpt"
+    resume = os.path.exists(checkpoint)
+    file = open(str(run)+".txt", "r+" if resume else "w")
+
+    # the GFK projection and the fixed matrices are shared by MEDA and GA-MEDA
+    context = DomainContext.DomainPairContext(Xs, Ys, Xt, Yt, dim=dim)
+    if not resume:
+        file.write('----------------Setting------------------\n')
+        file.write('Pop size: '+str(N_IND)+'\n')
+        file.write('Max iterations: '+str(N_GEN)+'\n')
+        file.write('Normalize: '+ str(normalize)+'\n')
+        file.write('Mutation rate: '+str(mutation_rate)+'\n')
+        file.write('Fully opposite initialize: '+str(full_init)+'\n')
+        file.write('GFK dim: '+str(dim)+'\n')
+        file.write('Eta: '+str(eta)+'\n')
+        file.write('----------------End setting------------------'+'\n')
+
+        knn = KNeighborsClassifier(n_neighbors=1)
+        knn.fit(Xs, Ys)
+        file.write('1NN accuracy: %f' %(np.mean(knn.predict(Xt)==Yt))+'\n')
 
-    source = np.genfromtxt("Source", delimiter=",")
-    m = source.shape[1] - 1
-    Xs = source[:, 0:m]
-    Ys = np.ravel(source[:, m:m + 1])
-    Ys = np.array([int(label) for label in Ys])
-
-    target = np.genfromtxt("Target", delimiter=",")
-    Xt = target[:, 0:m]
-    Yt = np.ravel(target[:, m:m + 1])
-    Yt = np.array([int(label) for label in Yt])
-
-    if normalize:
-        Xs, Xt = Pre.normalize_data(Xs, Xt)
-
-    C = len(np.unique(Ys))
-    if C > np.max(Ys):
-        Ys = Ys + 1
-        Yt = Yt + 1
-
-    file = open(str(run)+".txt", "w")
-
-    file.write('----------------Setting------------------\n')
-    file.write('Pop size: '+str(N_IND)+'\n')
-    file.write('Max iterations: '+str(N_GEN)+'\n')
-    file.write('Normalize: '+ str(normalize)+'\n')
-    file.write('Mutation rate: '+str(mutation_rate)+'\n')
-    file.write('Fully opposite initialize: '+str(full_init)+'\n')
-    file.write('GFK dim: '+str(dim)+'\n')
-    file.write('Eta: '+str(eta)+'\n')
-    file.write('----------------End setting------------------'+'\n')
-
-    knn = KNeighborsClassifier(n_neighbors=1)
-    knn.fit(Xs, Ys)
-    file.write('1NN accuracy: %f' %(np.mean(knn.predict(Xt)==Yt))+'\n')
-
-    start = time.time()
-    meda = MEDA.MEDA(kernel_type='rbf', dim=dim, lamb=10, rho=1.0, eta=eta, p=10, gamma=0.5, T=10, out=None)
-    acc, ypre, list_acc = meda.fit_predict(Xs, Ys, Xt, Yt)
-    end = time.time()
-    exe_time = end - start
-    file.write('MEDA accuracy: %f' % (acc)+'\n')
-    file.write('MEDA time: %f' % (exe_time)+'\n')
-
-    file.write('---------------GA-MEDA-----------------'+'\n')
-    evolve(Xs, Ys, Xt, Yt, file, mutation_rate, full_init, dim_p=dim, eta_p=eta)
\ No newline at end of file
+        start = time.time()
+        meda = MEDA.MEDA(kernel_type='rbf', dim=dim, lamb=10, rho=1.0, eta=eta, p=10, gamma=0.5, T=10, out=None)
+        acc, ypre, list_acc = meda.fit_predict(Xs, Ys, Xt, Yt, context=context)
+        end = time.time()
+        exe_time = end - start
+        file.write('MEDA accuracy: %f' % (acc)+'\n')
+        file.write('MEDA time: %f' % (exe_time)+'\n')
+
+        file.write('---------------GA-MEDA-----------------'+'\n')
+    evolve(Xs, Ys, Xt, Yt, file, mutation_rate, full_init, dim_p=dim, eta_p=eta, context=context,
+           processes=processes, records=str(run)+".jsonl", checkpoint=checkpoint)
+    file.close()
+    # the run is complete, running it again starts a new one
+    Checkpoint.remove(checkpoint)
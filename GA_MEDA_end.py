@@ -1,5 +1,6 @@
 import random
 
+import Dataset
 import Helpers as Pre
 import numpy as np
 from deap import base, creator, tools
@@ -14,12 +15,17 @@ from sklearn.ensemble import RandomForestClassifier, AdaBoostClassifier
 from sklearn.naive_bayes import GaussianNB
 from sklearn.discriminant_analysis import QuadraticDiscriminantAnalysis
 
+import Diversity
 import Helpers
-import GFK
+import DomainContext
+import MMDMatrix
+import Parallel
+import Solver
 import MEDA
 import TCA
 import sys, time
 import CORAL
+from Kernel import kernel
 #from shutil import copyfile
 #import Directory as Dir
 
@@ -27,33 +33,6 @@ import CORAL
 # from scoop import futures
 # toolbox.register("map", futures.map)
 # for parallel
-def kernel(ker, X, X2, gamma):
-    if not ker or ker == 'primal':
-        return X
-    elif ker == 'linear':
-        if not X2:
-            K = np.dot(X.T, X)
-        else:
-            K = np.dot(X.T, X2)
-    elif ker == 'rbf':
-        n1sq = np.sum(X ** 2, axis=0)
-        n1 = X.shape[1]
-        if not X2:
-            D = (np.ones((n1, 1)) * n1sq).T + np.ones((n1, 1)) * n1sq - 2 * np.dot(X.T, X)
-        else:
-            n2sq = np.sum(X2 ** 2, axis=0)
-            n2 = X2.shape[1]
-            D = (np.ones((n2, 1)) * n1sq).T + np.ones((n1, 1)) * n2sq - 2 * np.dot(X.T, X)
-        K = np.exp(-gamma * D)
-    elif ker == 'sam':
-        if not X2:
-            D = np.dot(X.T, X)
-        else:
-            D = np.dot(X.T, X2)
-        K = np.exp(-gamma * np.arccos(D) ** 2)
-    return K
-
-
 def proxy_a_distance(source_X, target_X):
     """
     Compute the Proxy-A-Distance of a source/target representation
@@ -132,24 +111,9 @@ def fitness_evaluation(Yt_pseu):
         F[index][l-1] = 1
     mu = estimate_mu(Xs, Ys, Xt, Yt_pseu)
     # have to update the matrix M
-    N = 0
-    for c in range(1, C + 1):
-        e = np.zeros((ns + nt, 1))
-        tt = Ys == c
-        e[np.where(tt == True)] = 1.0 / len(Ys[np.where(Ys == c)])
-        yy = Yt_pseu == c
-        ind = np.where(yy == True)
-        inds = [item + ns for item in ind]
-        if len(Yt_pseu[np.where(Yt_pseu == c)]) == 0:
-            e[tuple(inds)] = 0.0
-        else:
-            e[tuple(inds)] = -1.0 / len(Yt_pseu[np.where(Yt_pseu == c)])
-        e[np.isinf(e)] = 0
-        N += np.dot(e, e.T)
-    M = (1 - mu) * M0 + mu * N
-    # test1 = np.linalg.multi_dot([F.T, M0, F]).trace()
+    M = MMDMatrix.MMDOperator(Ys, Yt_pseu, C, mu=mu, normalize=False)
     # test2 = np.linalg.multi_dot([F.T, L, F]).trace()
-    fitness = np.linalg.multi_dot([F.T, lamb * M + rho * L, F]).trace()
+    fitness = lamb * M.quad_trace(F) + rho * np.linalg.multi_dot([F.T, L, F]).trace()
 
     return fitness
 
@@ -162,27 +126,8 @@ def label_evolve(ind):
     '''
     Yt_pseu = np.array([ind[index] for index in range(len(ind))])
     mu = estimate_mu(Xs, Ys, Xt, Yt_pseu)
-    N = 0
-    # have to update the matrix M
-    for c in range(1, C + 1):
-        e = np.zeros((ns + nt, 1))
-        tt = Ys == c
-        e[np.where(tt == True)] = 1.0 / len(Ys[np.where(Ys == c)])
-        yy = Yt_pseu == c
-        ind = np.where(yy == True)
-        inds = [item + ns for item in ind]
-        if len(Yt_pseu[np.where(Yt_pseu == c)]) == 0:
-            e[tuple(inds)] = 0.0
-        else:
-            e[tuple(inds)] = -1.0 / len(Yt_pseu[np.where(Yt_pseu == c)])
-        e[np.isinf(e)] = 0
-        N += np.dot(e, e.T)
-    M = (1 - mu) * M0 + mu * N
-
-    M /= np.linalg.norm(M, 'fro')
-    left = np.dot(A + lamb * M, K) \
-           + eta * np.eye(ns + nt, ns + nt)
-    beta = np.dot(np.linalg.inv(left), np.dot(A, YY))
+    M = MMDMatrix.MMDOperator(Ys, Yt_pseu, C, mu=mu)
+    beta = Solver.meda_beta(A, K, A.dot(YY), eta, mmd=M, lamb=lamb)
 
     F = np.dot(K, beta)
     Y_pseu = np.argmax(F, axis=1) + 1
@@ -207,7 +152,8 @@ def opposite_local(pop):
     pop.extend(to_add)
 
 
-def evolve(Xsource, Ysource, Xtarget, Ytarget, file, mutation_rate, full_init, dim_p=20, eta_p=0.1):
+def evolve(Xsource, Ysource, Xtarget, Ytarget, file, mutation_rate, full_init, dim_p=20, eta_p=0.1,
+           context=None, processes=1):
     """
     Running GA algorithms, where each individual is a set of target pseudo labels.
     :return: the best solution of GAs.
@@ -225,14 +171,11 @@ def evolve(Xsource, Ysource, Xtarget, Ytarget, file, mutation_rate, full_init, d
     ns, nt = Xs.shape[0], Xt.shape[0]
     C = len(np.unique(Ys))
 
-    # Transform data using gfk
-    gfk = GFK.GFK(dim=dim)
-    _, Xs_new, Xt_new = gfk.fit(Xs, Xt)
-    Xs_new, Xt_new = Xs_new.T, Xt_new.T
-    X = np.hstack((Xs_new, Xt_new))
-    X /= np.linalg.norm(X, axis=0)
-    Xs = X[:, :ns].T
-    Xt = X[:, ns:].T
+    # Transform data using gfk, shared through the context
+    if context is None:
+        context = DomainContext.DomainPairContext(Xs, Ys, Xt, Yt, dim=dim)
+    Xs = context.Xs
+    Xt = context.Xt
 
     # do not using any feature transformation
     # X = np.hstack((Xs.T, Xt.T))
@@ -255,17 +198,11 @@ def evolve(Xsource, Ysource, Xtarget, Ytarget, file, mutation_rate, full_init, d
     # Xt = X[:, ns:].T
 
     # build some matrices that are not changed
-    K = kernel(kernel_type, X, X2=None, gamma=gamma)
-    A = np.diagflat(np.vstack((np.ones((ns, 1)), np.zeros((nt, 1)))))
-    e = np.vstack((1.0 / ns * np.ones((ns, 1)), -1.0 / nt * np.ones((nt, 1))))
-    M0 = e * e.T * C
-    L = Helpers.laplacian_matrix(X.T, p)
-
-    YY = np.zeros((ns, C))
-    for c in range(1, C + 1):
-        ind = np.where(Ys == c)
-        YY[ind, c - 1] = 1
-    YY = np.vstack((YY, np.zeros((nt, C))))
+    K = context.kernel(kernel_type, gamma)
+    A = context.A
+    L = context.laplacian(p)
+
+    YY = context.YY
 
     pos_min = 1
     pos_max = C
@@ -291,8 +228,9 @@ def evolve(Xsource, Ysource, Xtarget, Ytarget, file, mutation_rate, full_init, d
     toolbox.register("crossover", tools.cxUniform, indpb=0.5)
     toolbox.register("mutate", tools.mutUniformInt, low=pos_min, up=pos_max,
                      indpb=MUTATION_RATE)
-    # pool = multiprocessing.Pool(4)
-    # toolbox.register("map", pool.map)
+    # evaluate in a process pool, the globals read by the workers go through shared memory
+    pool = Parallel.register(toolbox, sys.modules[__name__],
+                             ['ns', 'nt', 'C', 'Xs', 'Ys', 'Xt', 'A', 'K', 'YY', 'L', 'eta'], processes)
     # initialize some individuals by predefined classifiers
     pop = toolbox.pop(n=N_IND)
 
@@ -308,7 +246,7 @@ def evolve(Xsource, Ysource, Xtarget, Ytarget, file, mutation_rate, full_init, d
     # classifiers.append(RandomForestClassifier(max_depth=5, n_estimators=10, random_state=np.random.randint(2 ** 10)))
     # classifiers.append(AdaBoostClassifier(random_state=np.random.randint(2 ** 10)))
 
-    step = N_IND/len(classifiers)
+    step = N_IND // len(classifiers)
     for ind_index, classifier in enumerate(classifiers):
         classifier.fit(Xs, Ys)
         Yt_pseu = classifier.predict(Xt)
@@ -332,7 +270,7 @@ def evolve(Xsource, Ysource, Xtarget, Ytarget, file, mutation_rate, full_init, d
         start = time.time()
         # selection
         offspring = toolbox.select(pop, len(pop))
-        offspring = map(toolbox.clone, offspring)
+        offspring = list(map(toolbox.clone, offspring))
 
         # applying crossover
         for c1, c2 in zip(offspring[::2], offspring[1::2]):
@@ -356,10 +294,9 @@ def evolve(Xsource, Ysource, Xtarget, Ytarget, file, mutation_rate, full_init, d
 
         # now select the best individual from offspring
         # pass it to the single step meda to refine the label
-        best_inds = tools.selBest(offspring, N_IND/10)
+        best_inds = tools.selBest(offspring, N_IND // 10)
 
-        for best_ind in best_inds:
-            Yt_pseu = label_evolve(best_ind)
+        for Yt_pseu in toolbox.map(label_evolve, best_inds):
             new_ind = toolbox.ind()
             for index, label in enumerate(Yt_pseu):
                 new_ind[index] = label
@@ -371,7 +308,7 @@ def evolve(Xsource, Ysource, Xtarget, Ytarget, file, mutation_rate, full_init, d
         exe_time = exe_time + time.time() - start
         pop[:] = tools.selBest(offspring + list(hof), len(pop))
         hof.update(pop)
-        file.write('Average distance: %f\n' %(Helpers.pop_distance(pop)))
+        file.write('Average distance: %f\n' %(Diversity.hamming(pop)))
         file.write('Best fitness: %f\n' %(hof[0].fitness.values[0]))
 
         best_ind = tools.selBest(pop, 1)[0]
@@ -389,6 +326,9 @@ def evolve(Xsource, Ysource, Xtarget, Ytarget, file, mutation_rate, full_init, d
         acc = np.mean(vote_label == Yt)
         file.write("Accuracy of the population: %f\n" % acc)
 
+    if pool is not None:
+        pool.close()
+
     file.write("*****Final result*****\n")
     best_ind = tools.selBest(pop, 1)[0]
     acc = np.mean(best_ind == Yt)
@@ -475,24 +415,7 @@ if __name__ == '__main__':
     dim = int(sys.argv[5])
     eta = float(sys.argv[6])/100.0
 
-    source = np.genfromtxt("Source", delimiter=",")
-    m = source.shape[1] - 1
-    Xs = source[:, 0:m]
-    Ys = np.ravel(source[:, m:m + 1])
-    Ys = np.array([int(label) for label in Ys])
-
-    target = np.genfromtxt("Target", delimiter=",")
-    Xt = target[:, 0:m]
-    Yt = np.ravel(target[:, m:m + 1])
-    Yt = np.array([int(label) for label in Yt])
-
-    if normalize:
-        Xs, Xt = Pre.normalize_data(Xs, Xt)
-
-    C = len(np.unique(Ys))
-    if C > np.max(Ys):
-        Ys = Ys + 1
-        Yt = Yt + 1
+    Xs, Ys, Xt, Yt, C = Dataset.load(normalize=normalize)
 
     file = open(str(run)+".txt", "w")
 
@@ -11,8 +11,37 @@ import bob.learn.linear
 import bob.math
 from sklearn.neighbors import KNeighborsClassifier
 import Helpers as Pre
+import Dataset
+import GFKCache
 import os
 
+# shared on-disk cache of the projections, see enable_cache
+cache = None
+
+
+def enable_cache(directory, max_bytes=2 * 1024 ** 3, mmap=True):
+    '''
+    Cache the outputs of GFK.fit on disk for every GFK instance
+    :param directory: directory of the cache
+    :param max_bytes: size of the cache before the least recently used entries are evicted
+    :param mmap: return memory-mapped (read-only) arrays
+    :return: the GFKCache.GFKCache in use
+    '''
+    global cache
+    cache = GFKCache.GFKCache(directory, max_bytes=max_bytes, mmap=mmap)
+    return cache
+
+
+def disable_cache():
+    global cache
+    cache = None
+
+
+# runs can turn the cache on without code changes, e.g. GFK_CACHE_DIR=~/.gfk_cache
+if os.environ.get('GFK_CACHE_DIR'):
+    enable_cache(os.path.expanduser(os.environ['GFK_CACHE_DIR']),
+                 max_bytes=int(os.environ.get('GFK_CACHE_MAX_BYTES', 2 * 1024 ** 3)))
+
 
 class GFK:
     def __init__(self, dim=20):
@@ -25,11 +54,23 @@ class GFK:
 
     def fit(self, Xs, Xt, norm_inputs=None):
         '''
-        Obtain the kernel G
+        Obtain the kernel G, from the on-disk cache when it is enabled
+        :param Xs: ns * n_feature, source feature
+        :param Xt: nt * n_feature, target feature
+        :param norm_inputs: normalize the inputs or not
+        :return: GFK kernel G, Xs_new, Xt_new
+        '''
+        if cache is not None:
+            return cache.fit(self, Xs, Xt, norm_inputs)
+        return self.compute(Xs, Xt, norm_inputs)
+
+    def compute(self, Xs, Xt, norm_inputs=None):
+        '''
+        Compute the kernel G, without the cache
         :param Xs: ns * n_feature, source feature
         :param Xt: nt * n_feature, target feature
         :param norm_inputs: normalize the inputs or not
-        :return: GFK kernel G
+        :return: GFK kernel G, Xs_new, Xt_new
         '''
         if norm_inputs:
             source, mu_source, std_source = self.znorm(Xs)
@@ -252,24 +293,7 @@ if __name__ == '__main__':
             print(dataset)
             dir = '/Volumes/Data/Work/Research/Current/Datasets/Transferlearning/UnPairs/' + dataset + '/'
 
-            source = np.genfromtxt(dir + 'Source', delimiter=',')
-            m = source.shape[1] - 1
-            Xs = source[:, 0:m]
-            Ys = np.ravel(source[:, m:m + 1])
-            Ys = np.array([int(label) for label in Ys])
-
-            target = np.genfromtxt(dir + 'Target', delimiter=',')
-            Xt = target[:, 0:m]
-            Yt = np.ravel(target[:, m:m + 1])
-            Yt = np.array([int(label) for label in Yt])
-
-            if normalize:
-                Xs, Xt = Pre.normalize_data(Xs, Xt)
-
-            C = len(np.unique(Ys))
-            if C > np.max(Ys):
-                Ys = Ys + 1
-                Yt = Yt + 1
+            Xs, Ys, Xt, Yt, C = Dataset.load(dir, normalize=normalize)
 
             gfk = GFK(dim=dim)
             acc, _, _ = gfk.fit_predict(Xs, Ys, Xt, Yt)
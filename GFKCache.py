@@ -0,0 +1,140 @@
+'''
+Persistent, content-addressed cache of GFK projections.
+
+GFK.fit runs two PCAs, a null space, a GSVD and a matrix square root, and the
+result only depends on the input data, the dimension and the normalization.
+Each entry is keyed by a hash of these inputs and stored as one directory of
+.npy files (G, Xs_new, Xt_new), which are loaded memory-mapped.
+When the cache grows beyond max_bytes, the least recently used entries are removed.
+'''
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+# bump when GFK.fit changes its outputs, so old entries are not reused
+VERSION = 1
+NAMES = ('G', 'Xs_new', 'Xt_new')
+
+
+def array_digest(h, X):
+    '''
+    Feed the shape, the dtype and the content of X to the hash h
+    '''
+    X = np.ascontiguousarray(X)
+    h.update(str((X.shape, X.dtype.str)).encode())
+    h.update(X.view(np.uint8).ravel().data if X.size else b'')
+
+
+class GFKCache:
+    def __init__(self, directory, max_bytes=2 * 1024 ** 3, mmap=True):
+        '''
+        :param directory: where the entries are stored, created if needed
+        :param max_bytes: total size of the cache before old entries are evicted
+        :param mmap: load the arrays memory-mapped (read-only) instead of in memory
+        '''
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.mmap = mmap
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def key(self, Xs, Xt, dim, norm_inputs):
+        h = hashlib.sha1()
+        h.update(str((VERSION, int(dim), bool(norm_inputs))).encode())
+        array_digest(h, Xs)
+        array_digest(h, Xt)
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def load(self, key):
+        '''
+        :return: (G, Xs_new, Xt_new) or None if the entry does not exist
+        '''
+        path = self.path(key)
+        if not os.path.isdir(path):
+            self.misses += 1
+            return None
+        try:
+            mode = 'r' if self.mmap else None
+            arrays = tuple(np.load(os.path.join(path, name + '.npy'), mmap_mode=mode) for name in NAMES)
+        except (IOError, OSError, ValueError):
+            # a broken entry is treated as missing and rebuilt
+            shutil.rmtree(path, ignore_errors=True)
+            self.misses += 1
+            return None
+        # the modification time records the last use, for the eviction
+        os.utime(path, None)
+        self.hits += 1
+        return arrays
+
+    def store(self, key, arrays):
+        '''
+        Write the entry atomically: it is written in a temporary directory
+        which is then renamed, so concurrent runs never read a partial entry.
+        '''
+        path = self.path(key)
+        if os.path.isdir(path):
+            return
+        tmp = tempfile.mkdtemp(dir=self.directory, prefix='.tmp-')
+        try:
+            for name, array in zip(NAMES, arrays):
+                np.save(os.path.join(tmp, name + '.npy'), np.asarray(array))
+            os.rename(tmp, path)
+        except OSError:
+            # another run stored the same entry first
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
+
+    def entries(self):
+        '''
+        :return: list of (last use, size in bytes, path) of the stored entries
+        '''
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith('.') or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+                entries.append((os.path.getmtime(path), size, path))
+            except OSError:
+                continue
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        '''
+        Remove the least recently used entries until the cache fits in max_bytes
+        '''
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            shutil.rmtree(path, ignore_errors=True)
+
+    def fit(self, gfk, Xs, Xt, norm_inputs=None):
+        '''
+        Return the cached output of gfk.fit(Xs, Xt, norm_inputs), computing it on a miss
+        :param gfk: GFK.GFK instance
+        '''
+        key = self.key(Xs, Xt, gfk.dim, norm_inputs)
+        arrays = self.load(key)
+        if arrays is None:
+            arrays = gfk.compute(Xs, Xt, norm_inputs)
+            self.store(key, arrays)
+        return arrays
@@ -1,7 +1,11 @@
 import numpy as np
+import scipy.sparse
 import scipy.stats as stat
 from sklearn import neighbors
 
+import Diversity
+import FitnessCache
+
 def normalize_data(Xs, Xt):
     Xs = Xs.T
     Xs /= np.sum(Xs, axis=0)
@@ -25,12 +29,7 @@ def distance(ind1, ind2):
     :param ind2:
     :return:
     '''
-    count_dif = 0
-    for index, value1 in enumerate(ind1):
-        value2 = ind2[index]
-        if value1 != value2:
-            count_dif += 1
-    return float(count_dif)/len(ind1)
+    return float(np.mean(np.asarray(ind1) != np.asarray(ind2)))
 
 def pop_distance(pop):
     '''
@@ -38,11 +37,7 @@ def pop_distance(pop):
     :param pop:
     :return:
     '''
-    sum_dis = 0.0
-    for i in range(len(pop)-1):
-        for j in range(i+1, len(pop)):
-            sum_dis = sum_dis+distance(pop[i], pop[j])
-    return sum_dis/(len(pop)*(len(pop)-1)/2.0)
+    return Diversity.hamming(pop)
 
 def check_contain(oneD, twoD):
     '''
@@ -53,7 +48,7 @@ def check_contain(oneD, twoD):
     '''
     if len(twoD) == 0:
         return False
-    return np.max([np.min(oneD == row) for row in twoD])
+    return bool(np.any(np.all(np.asarray(twoD) == np.asarray(oneD), axis=1)))
 
 
 def is_in(array, matrix):
@@ -67,87 +62,92 @@ def is_in(array, matrix):
     if len(matrix) == 0:
         return False
     else:
-        return np.any(np.sum(np.abs(matrix-array), axis=1) == 0)
+        return bool(np.any(np.all(np.asarray(matrix) == np.asarray(array), axis=1)))
 
 def index_duplicate(pop):
     '''
     :param pop: population
     :return: indices of the duplicated solutions
     '''
-    seen = []
-    idx_dup = []
-    for idx, ind in enumerate(pop):
-        if check_contain(ind, seen):
-            idx_dup.append(idx)
-        else:
-            seen.append(ind)
-    return idx_dup
-
-def laplacian_matrix(data, k):
+    return FitnessCache.duplicate_indices(pop)
+
+def similarity_matrix(data, k, sparse=False):
     """
+    Cosine similarity of the k nearest neighbors graph, symmetrized and with 1 on the diagonal
     :param data: containing data points,
     :param k: the number of neighbors considered (this distance metric is cosine,
     and the weights are measured by cosine)
+    :param sparse: return a scipy.sparse csr matrix instead of a dense array
     :return:
     """
-    # import matlab.engine as ME
-    # import matlab
-    # engine = ME.start_matlab()
-    # calling from matllab
-    # options = dict()
-    # options.update({'k' : 10})
-    # options.update({'NeighborMode' : 'KNN'})
-    #
-    # options.update({'Metric' : 'Cosine'})
-    # options.update({'WeightMode' : 'Cosine'})
-
-    # options.update({'Metric': 'Euclidean'})
-    # options.update({'WeightMode': 'HeatKernel'})
-    # options.update({'t' : 1.0})
-
-    # sim = np.array(engine.lapgraph(matlab.double(data.tolist()), options))
-    # S = [np.sum(row) for row in sim]
-    #
-    # for i in range(len(sim)):
-    #     sim[i] = [sim[i][j] / (S[i] * S[j]) ** 0.5 for j in range(len(sim))]
-    #
-    # L = np.identity(len(sim)) - sim
-    # return L
+    n = len(data)
     nn = neighbors.NearestNeighbors(n_neighbors=k, algorithm='brute', metric='cosine')
     nn.fit(data)
     dist, nn = nn.kneighbors(return_distance=True)
-    sim = np.zeros((len(data), len(data)))
-    for ins_index in range(len(sim)):
-        dist_row = dist[ins_index]
-        nn_row = nn[ins_index]
-        for dist_value, ind_index in zip(dist_row, nn_row):
-            sim[ins_index][ind_index] = 1.0 - dist_value
-            sim[ind_index][ins_index] = 1.0 - dist_value
-    for i in range(len(sim)):
-        sim[i][i] = 1.0
-
-    S = [np.sum(row) for row in sim]
-
-    for i in range(len(sim)):
-        sim[i] = [sim[i][j]/(S[i]*S[j])**0.5 for j in range(len(sim))]
-
-    L = np.identity(len(sim)) - sim
-    return L
-
-def voting(set_labels):
-    vote_label = []
-    ins_labels = []
-    for labels in set_labels:
-        tmp_labels = [labels[index] for index in range(len(labels))]
-        ins_labels.append(tmp_labels)
-    ins_labels = np.array(ins_labels)
-
-    for m_index in range(len(ins_labels[0])):
-        counts = np.bincount(ins_labels[:, m_index])
-        label = np.argmax(counts)
-        vote_label.append(label)
-
-    return vote_label
+
+    # an edge found from both of its ends is only kept once
+    rows = np.repeat(np.arange(n), k)
+    cols = nn.ravel()
+    _, first = np.unique(np.minimum(rows, cols) * n + np.maximum(rows, cols), return_index=True)
+    rows, cols, values = rows[first], cols[first], 1.0 - dist.ravel()[first]
+
+    diag = np.arange(n)
+    sim = scipy.sparse.csr_matrix((np.concatenate((values, values, np.ones(n))),
+                                   (np.concatenate((rows, cols, diag)), np.concatenate((cols, rows, diag)))),
+                                  shape=(n, n))
+    if sparse:
+        return sim
+    return sim.toarray()
+
+
+def laplacian_matrix(data, k, sparse=False):
+    """
+    Normalized graph Laplacian L = I - D^-1/2 * S * D^-1/2 of the cosine k nearest neighbors graph
+    :param data: containing data points,
+    :param k: the number of neighbors considered (this distance metric is cosine,
+    and the weights are measured by cosine)
+    :param sparse: return a scipy.sparse csr matrix instead of a dense array
+    :return:
+    """
+    sim = similarity_matrix(data, k, sparse=True)
+    d = 1.0 / np.sqrt(np.asarray(sim.sum(axis=1)).ravel())
+    D = scipy.sparse.diags(d)
+    L = (scipy.sparse.identity(len(d), format='csr') - D.dot(sim).dot(D)).tocsr()
+    if sparse:
+        return L
+    return L.toarray()
+
+
+def vote(set_labels, weights=None):
+    '''
+    Majority vote of a set of label vectors, with a single bincount over the
+    labels offset by their position
+    :param set_labels: P label vectors of length nt (non-negative integers)
+    :param weights: optional P weights of the votes, e.g. derived from the fitness
+    :return: nt voted labels (the smallest one on a tie),
+    nt confidences: share of the (weighted) votes given to the voted label
+    '''
+    labels = np.asarray(set_labels, dtype=int)
+    if labels.ndim == 1:
+        labels = labels[None, :]
+    P, nt = labels.shape
+    V = labels.max() + 1
+    offset = labels + V * np.arange(nt)
+    if weights is not None:
+        weights = np.repeat(np.asarray(weights, dtype=float), nt)
+    counts = np.bincount(offset.ravel(), weights=weights, minlength=V * nt).reshape(nt, V)
+    vote_label = np.argmax(counts, axis=1)
+    total = np.sum(counts, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        confidence = np.where(total > 0, counts[np.arange(nt), vote_label] / total, 0.0)
+    return vote_label, confidence
+
+
+def voting(set_labels, weights=None):
+    '''
+    :return: list of the voted labels, see vote
+    '''
+    return list(vote(set_labels, weights)[0])
 
 def opposite_init(pop, min_pos, max_pos):
     '''
@@ -8,34 +8,10 @@ import scipy.io
 import scipy.linalg
 import sklearn.metrics
 import sklearn.neighbors
+import Dataset
 import Helpers as Pre
-
-
-def kernel(ker, X, X2, gamma):
-    if not ker or ker == 'primal':
-        return X
-    elif ker == 'linear':
-        if not X2:
-            K = np.dot(X.T, X)
-        else:
-            K = np.dot(X.T, X2)
-    elif ker == 'rbf':
-        n1sq = np.sum(X ** 2, axis=0)
-        n1 = X.shape[1]
-        if not X2:
-            D = (np.ones((n1, 1)) * n1sq).T + np.ones((n1, 1)) * n1sq - 2 * np.dot(X.T, X)
-        else:
-            n2sq = np.sum(X2 ** 2, axis=0)
-            n2 = X2.shape[1]
-            D = (np.ones((n2, 1)) * n1sq).T + np.ones((n1, 1)) * n2sq - 2 * np.dot(X.T, X)
-        K = np.exp(-gamma * D)
-    elif ker == 'sam':
-        if not X2:
-            D = np.dot(X.T, X)
-        else:
-            D = np.dot(X.T, X2)
-        K = np.exp(-gamma * np.arccos(D) ** 2)
-    return K
+import Labels
+from Kernel import kernel
 
 
 class JDA:
@@ -77,16 +53,8 @@ class JDA:
         for t in range(self.T):
             N = 0
             if Y_tar_pseudo is not None and len(Y_tar_pseudo) == nt:
-                for c in range(1, C + 1):
-                    e = np.zeros((n, 1))
-                    tt = Ys == c
-                    e[np.where(tt == True)] = 1 / len(Ys[np.where(Ys == c)])
-                    yy = Y_tar_pseudo == c
-                    ind = np.where(yy == True)
-                    inds = [item + ns for item in ind]
-                    e[tuple(inds)] = -1 / len(Y_tar_pseudo[np.where(Y_tar_pseudo == c)])
-                    e[np.isinf(e)] = 0
-                    N = N + np.dot(e, e.T)
+                E = Labels.class_vectors(Ys, Y_tar_pseudo, C)
+                N = np.dot(E, E.T)
             M += N
             M = M / np.linalg.norm(M, 'fro')
             K = kernel(self.kernel_type, X, None, gamma=self.gamma)
@@ -140,24 +108,7 @@ if __name__ == '__main__':
             print(dataset)
             dir = '/home/nguyenhoai2/Grid/data/TransferLearning/UnPairs/' + dataset + '/'
 
-            source = np.genfromtxt(dir + 'Source', delimiter=',')
-            m = source.shape[1] - 1
-            Xs = source[:, 0:m]
-            Ys = np.ravel(source[:, m:m + 1])
-            Ys = np.array([int(label) for label in Ys])
-
-            target = np.genfromtxt(dir + 'Target', delimiter=',')
-            Xt = target[:, 0:m]
-            Yt = np.ravel(target[:, m:m + 1])
-            Yt = np.array([int(label) for label in Yt])
-
-            if normalize:
-                Xs, Xt = Pre.normalize_data(Xs, Xt)
-
-            C = len(np.unique(Ys))
-            if C > np.max(Ys):
-                Ys = Ys + 1
-                Yt = Yt + 1
+            Xs, Ys, Xt, Yt, C = Dataset.load(dir, normalize=normalize)
 
             jda = JDA(kernel_type='rbf', dim=dim, lamb=lamb, gamma=0.5, T=10)
             acc, _, _ = jda.fit_predict(Xs, Ys, Xt, Yt)
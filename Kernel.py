@@ -0,0 +1,144 @@
+'''
+Kernel matrices of the projected data, exact or low-rank.
+
+The data are d * n (one instance per column), as in MEDA. The exact kernel
+is n * n, which does not fit in memory for large domain pairs (50k instances
+take 20GB in float64). The low-rank modes return an n * r factor Z with
+
+    K ~= Z * Z'
+
+so the MEDA system can be solved in the r-dimensional space (see
+Solver.meda_beta_lowrank) and K is never materialized:
+
+    nystroem:        Z = K(X, landmarks) * W^(-1/2), W = K(landmarks, landmarks)
+    random_features: Z = sqrt(2/r) * cos(X' * Omega + b), for the rbf kernel
+
+The exact kernel is computed by blocks of rows, into a float64, float32 or
+memory-mapped output, so its peak memory is the output plus one block.
+'''
+import numpy as np
+
+APPROXIMATIONS = ('nystroem', 'random_features')
+# working memory of the block temporaries of kernel(), the output excluded
+BLOCK_BYTES = 64 * 1024 ** 2
+
+
+def output(shape, dtype, out):
+    '''
+    :param out: None for a new array, a file name for a new memory-mapped .npy file,
+    or a preallocated array
+    '''
+    if out is None:
+        return np.empty(shape, dtype=dtype)
+    if isinstance(out, str):
+        return np.lib.format.open_memmap(out, mode='w+', dtype=dtype, shape=shape)
+    if out.shape != shape:
+        raise ValueError('The output has shape %s, expected %s' % (out.shape, shape))
+    return out
+
+
+def kernel(ker, X, X2, gamma, dtype=np.float64, out=None, block_bytes=None):
+    '''
+    The kernel matrix is computed by blocks of rows, written directly in the
+    output: besides the output, only one block of float64 temporaries is
+    allocated, of at most block_bytes.
+    :param ker: 'primal' | 'linear' | 'rbf' | 'sam'
+    :param X: d * n1 data
+    :param X2: d * n2 data, or None for X itself
+    :param gamma: bandwidth of the rbf and sam kernels
+    :param dtype: dtype of the output, e.g. np.float32 to halve its size
+    :param out: None, a file name (memory-mapped output) or a preallocated n1 * n2 array
+    :param block_bytes: memory ceiling of the temporaries, BLOCK_BYTES by default
+    :return: n1 * n2 kernel matrix (X itself for 'primal')
+    '''
+    if not ker or ker == 'primal':
+        return X
+    if ker not in ('linear', 'rbf', 'sam'):
+        raise ValueError('Unknown kernel %s' % ker)
+    if X2 is None:
+        X2 = X
+    n1, n2 = X.shape[1], X2.shape[1]
+    K = output((n1, n2), dtype, out)
+    if block_bytes is None:
+        block_bytes = BLOCK_BYTES
+    rows = int(max(1, min(n1, block_bytes // (8 * max(n2, 1)))))
+
+    if ker == 'rbf':
+        n1sq = np.sum(X ** 2, axis=0)
+        n2sq = np.sum(X2 ** 2, axis=0)
+    for start in range(0, n1, rows):
+        stop = min(start + rows, n1)
+        block = np.dot(X[:, start:stop].T, X2)
+        if ker == 'rbf':
+            # squared distances, rounding may give tiny negative values
+            block *= -2
+            block += n1sq[start:stop, None]
+            block += n2sq
+            np.maximum(block, 0, out=block)
+            block *= -gamma
+            np.exp(block, out=block)
+        elif ker == 'sam':
+            np.clip(block, -1, 1, out=block)
+            np.arccos(block, out=block)
+            block **= 2
+            block *= -gamma
+            np.exp(block, out=block)
+        K[start:stop] = block
+    return K
+
+
+def nystroem(ker, X, gamma, rank, random_state=None):
+    '''
+    Nystroem factor of the kernel matrix, from rank landmarks drawn at random
+    :param X: d * n data
+    :param rank: number of landmarks
+    :return: n * r factor Z with K ~= Z * Z', r <= rank
+    '''
+    rng = np.random.RandomState(random_state)
+    n = X.shape[1]
+    landmarks = np.sort(rng.choice(n, min(rank, n), replace=False))
+    W = kernel(ker, X[:, landmarks], None, gamma)
+    KW = kernel(ker, X, X[:, landmarks], gamma)
+    # W^(-1/2) restricted to the numerically nonzero eigenvalues
+    values, vectors = np.linalg.eigh(W)
+    keep = values > max(values[-1], 0) * 1e-10
+    return np.dot(KW, vectors[:, keep] / np.sqrt(values[keep]))
+
+
+def random_features(ker, X, gamma, rank, random_state=None):
+    '''
+    Random Fourier features of the rbf kernel exp(-gamma * ||x - y||^2)
+    :param X: d * n data
+    :param rank: number of features
+    :return: n * rank factor Z with K ~= Z * Z'
+    '''
+    if ker != 'rbf':
+        raise ValueError('Random features are only available for the rbf kernel, not %s' % ker)
+    rng = np.random.RandomState(random_state)
+    Omega = rng.normal(scale=np.sqrt(2 * gamma), size=(X.shape[0], rank))
+    b = rng.uniform(0, 2 * np.pi, size=rank)
+    Z = np.dot(X.T, Omega)
+    Z += b
+    np.cos(Z, out=Z)
+    Z *= np.sqrt(2.0 / rank)
+    return Z
+
+
+def factor(ker, X, gamma, rank, approximation='nystroem', random_state=None):
+    '''
+    Low-rank factor Z of the kernel matrix, K ~= Z * Z'
+    :param X: d * n data
+    :param rank: rank of the approximation
+    :param approximation: 'nystroem' | 'random_features'
+    :return: n * r factor
+    '''
+    if ker == 'linear':
+        # exact, the rank is the dimension of the data
+        return np.ascontiguousarray(X.T)
+    if not ker or ker == 'primal':
+        raise ValueError('The primal kernel has no low-rank factor')
+    if approximation == 'nystroem':
+        return nystroem(ker, X, gamma, rank, random_state=random_state)
+    if approximation == 'random_features':
+        return random_features(ker, X, gamma, rank, random_state=random_state)
+    raise ValueError('Unknown approximation %s, expected one of %s' % (approximation, ', '.join(APPROXIMATIONS)))
@@ -0,0 +1,162 @@
+'''
+Fitness of target label vectors, without building the one-hot matrix F.
+
+With F the n*C one-hot coding of Y = [Ys, Yt]:
+
+    trace(F' * L * F) = sum of L[i, j] over the pairs with Y[i] == Y[j]
+
+which is computed from the nonzeros of the sparse Laplacian, and
+
+    trace(F' * M * F) = scale * sum_k w[k] * ||ek' * F||^2
+
+only depends on the class counts of Ys and Yt (see MMDMatrix), so it is
+computed in O(C) from the counts.
+
+When only a few labels change (e.g. after a mutation), both values are
+updated from the previous ones: the trace only needs the Laplacian rows
+of the changed positions, and the counts only need the changed labels.
+'''
+import numpy as np
+import scipy.sparse
+
+import Labels
+
+
+def changed_positions(Yt_old, Yt_new):
+    return np.flatnonzero(np.asarray(Yt_old) != np.asarray(Yt_new))
+
+
+class ManifoldTrace:
+    def __init__(self, L, Ys, max_changed=0.25):
+        '''
+        :param L: n*n Laplacian (sparse or dense), n = ns + nt
+        :param Ys: ns source labels
+        :param max_changed: above this fraction of changed target labels,
+        a full evaluation is cheaper than an update
+        '''
+        self.L = scipy.sparse.csr_matrix(L)
+        self.L.sort_indices()
+        self.Ys = np.asarray(Ys, dtype=int).ravel()
+        self.ns = len(self.Ys)
+        self.n = self.L.shape[0]
+        self.max_changed = max_changed
+        self.rows = np.repeat(np.arange(self.n), np.diff(self.L.indptr))
+
+    def labels(self, Yt):
+        return np.concatenate((self.Ys, np.asarray(Yt, dtype=int).ravel()))
+
+    def evaluate(self, Yt):
+        '''
+        trace(F' * L * F) in O(nnz(L))
+        :param Yt: nt target (pseudo) labels
+        '''
+        Y = self.labels(Yt)
+        return np.sum(self.L.data[Y[self.rows] == Y[self.L.indices]])
+
+    def evaluate_population(self, Yts):
+        '''
+        trace(F' * L * F) of many label vectors at once: the label agreement
+        of every nonzero of L is gathered for the whole population, then
+        weighted by L in a single matrix-vector product
+        :param Yts: P * nt target (pseudo) labels, one row per individual
+        :return: P values
+        '''
+        Yts = np.asarray(Yts, dtype=int)
+        if Yts.ndim == 1:
+            Yts = Yts[None, :]
+        Y = np.hstack((np.tile(self.Ys, (len(Yts), 1)), Yts))
+        same = Y[:, self.rows] == Y[:, self.L.indices]
+        return np.dot(same, self.L.data)
+
+    def local(self, positions, in_set, Y):
+        '''
+        Part of the trace coming from the pairs that contain at least one of the positions
+        '''
+        sub = self.L[positions]
+        rows = np.repeat(positions, np.diff(sub.indptr))
+        same = Y[rows] == Y[sub.indices]
+        # pairs with both ends in the set are seen once, the others twice
+        return 2 * np.sum(sub.data[same]) - np.sum(sub.data[same & in_set[sub.indices]])
+
+    def update(self, Yt_old, value_old, Yt_new):
+        '''
+        trace(F' * L * F) of Yt_new, given the value of Yt_old, in O(changed * degree)
+        '''
+        changed = changed_positions(Yt_old, Yt_new)
+        if len(changed) == 0:
+            return value_old
+        if len(changed) > self.max_changed * (self.n - self.ns):
+            return self.evaluate(Yt_new)
+        positions = changed + self.ns
+        in_set = np.zeros(self.n, dtype=bool)
+        in_set[positions] = True
+        return value_old - self.local(positions, in_set, self.labels(Yt_old)) \
+            + self.local(positions, in_set, self.labels(Yt_new))
+
+
+class Discrepancy:
+    def __init__(self, Ys, C, mu=0.5, normalize=True):
+        '''
+        trace(F' * M * F) for M = MMDMatrix.MMDOperator(Ys, Yt, C, mu, normalize)
+        :param Ys: ns source labels, from 1 to C, every class present
+        '''
+        self.Ys = np.asarray(Ys, dtype=int).ravel()
+        self.C = C
+        self.ns = len(self.Ys)
+        self.count_s = Labels.counts(self.Ys, C).astype(float)
+        self.mu = mu
+        self.normalize = normalize
+        self.w = np.full(C + 1, float(mu))
+        self.w[0] = (1 - mu) * C
+
+    def counts(self, Yt):
+        return Labels.counts(Yt, self.C)
+
+    def counts_population(self, Yts):
+        '''
+        P * C class counts of P label vectors, with a single bincount
+        '''
+        Yts = np.asarray(Yts, dtype=int)
+        P = len(Yts)
+        offset = (Yts - 1) + self.C * np.arange(P)[:, None]
+        return np.bincount(offset.ravel(), minlength=P * self.C).reshape(P, self.C)
+
+    def update_counts(self, counts, Yt_old, Yt_new):
+        '''
+        Class counts of Yt_new from the class counts of Yt_old, in O(changed)
+        '''
+        Yt_old, Yt_new = np.asarray(Yt_old, dtype=int), np.asarray(Yt_new, dtype=int)
+        changed = changed_positions(Yt_old, Yt_new)
+        counts = np.array(counts)
+        np.subtract.at(counts, Yt_old[changed] - 1, 1)
+        np.add.at(counts, Yt_new[changed] - 1, 1)
+        return counts
+
+    def evaluate(self, Yt=None, counts=None):
+        '''
+        trace(F' * M * F) from the target class counts, in O(C)
+        :param Yt: nt target (pseudo) labels, or
+        :param counts: their class counts, or a P * C array of counts
+        of P label vectors (then P values are returned)
+        '''
+        if counts is None:
+            counts = self.counts(Yt)
+        count_t = np.asarray(counts, dtype=float)
+        nt = np.sum(count_t, axis=-1)
+        present = count_t > 0
+        inv_t = np.where(present, 1.0 / np.maximum(count_t, 1), 0.0)
+
+        # E' * F: e0 gives the difference of the class proportions,
+        # ek cancels unless class k has no target instance
+        EF0 = np.sum((self.count_s / self.ns - count_t / nt[..., None]) ** 2, axis=-1)
+        value = self.w[0] * EF0 + np.dot(~present, self.w[1:])
+
+        if self.normalize:
+            # Gram matrix E' * E: e0 meets every ek, the ek are orthogonal
+            diag0 = 1.0 / self.ns + 1.0 / nt
+            diag = 1.0 / self.count_s + inv_t
+            off = 1.0 / self.ns + present / nt[..., None]
+            fro_sq = (self.w[0] * diag0) ** 2 + np.sum((self.w[1:] * diag) ** 2, axis=-1) \
+                + 2 * self.w[0] * np.sum(self.w[1:] * off ** 2, axis=-1)
+            value = value / np.sqrt(fro_sq)
+        return value
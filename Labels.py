@@ -0,0 +1,56 @@
+'''
+Encodings of class labels, from 1 to C, without per-class or per-instance loops.
+'''
+import numpy as np
+import scipy.sparse
+
+
+def counts(Y, C):
+    '''
+    :param Y: labels from 1 to C
+    :return: C class counts
+    '''
+    return np.bincount(np.asarray(Y, dtype=int).ravel(), minlength=C + 1)[1:C + 1]
+
+
+def one_hot(Y, C, n=None):
+    '''
+    :param Y: labels from 1 to C
+    :param n: number of rows, the rows after len(Y) are left at 0
+    (e.g. YY with n = ns + nt and the source labels)
+    :return: n * C one-hot coding
+    '''
+    Y = np.asarray(Y, dtype=int).ravel()
+    F = np.zeros((len(Y) if n is None else n, C))
+    F[np.arange(len(Y)), Y - 1] = 1
+    return F
+
+
+def indicator(Y, C):
+    '''
+    :param Y: labels from 1 to C
+    :return: sparse len(Y) * C one-hot coding
+    '''
+    Y = np.asarray(Y, dtype=int).ravel()
+    n = len(Y)
+    return scipy.sparse.csr_matrix((np.ones(n), Y - 1, np.arange(n + 1)), shape=(n, C))
+
+
+def class_vectors(Ys, Yt, C):
+    '''
+    The conditional MMD vectors of JDA/MEDA: column c - 1 is
+    1 / ns_c on the source instances of class c and -1 / nt_c on the target
+    instances of class c, a class without target instance has no target entry
+    :param Ys: ns source labels
+    :param Yt: nt target (pseudo) labels
+    :return: (ns + nt) * C matrix
+    '''
+    Ys = np.asarray(Ys, dtype=int).ravel()
+    Yt = np.asarray(Yt, dtype=int).ravel()
+    ns, nt = len(Ys), len(Yt)
+    count_s = np.bincount(Ys, minlength=C + 1).astype(float)
+    count_t = np.bincount(Yt, minlength=C + 1).astype(float)
+    E = np.zeros((ns + nt, C))
+    E[np.arange(ns), Ys - 1] = 1.0 / count_s[Ys]
+    E[ns + np.arange(nt), Yt - 1] = -1.0 / count_t[Yt]
+    return E
@@ -6,30 +6,20 @@
 
 import numpy as np
 import scipy.io
+import scipy.sparse
 from sklearn import metrics
 from sklearn import svm, neighbors
 from sklearn.neighbors import KNeighborsClassifier
 import os
 
-import GFK
+import Dataset
+import DomainContext
+import Helpers
+from Kernel import kernel
+import MMDMatrix
+import Solver
 
 
-def kernel(ker, X1, X2, gamma):
-    K = None
-    if not ker or ker == 'primal':
-        K = X1
-    elif ker == 'linear':
-        if X2 is not None:
-            K = metrics.pairwise.linear_kernel(np.asarray(X1).T, np.asarray(X2).T)
-        else:
-            K = metrics.pairwise.linear_kernel(np.asarray(X1).T)
-    elif ker == 'rbf':
-        if X2 is not None:
-            K = metrics.pairwise.rbf_kernel(np.asarray(X1).T, np.asarray(X2).T, gamma)
-        else:
-            K = metrics.pairwise.rbf_kernel(np.asarray(X1).T, None, gamma)
-    return K
-
 def proxy_a_distance(source_X, target_X):
     """
     Compute the Proxy-A-Distance of a source/target representation
@@ -47,7 +37,8 @@ def proxy_a_distance(source_X, target_X):
 
 
 class MEDA:
-    def __init__(self, kernel_type='primal', dim=30, lamb=1, rho=1.0, eta=0.1, p=10, gamma=1, T=10, out=None):
+    def __init__(self, kernel_type='primal', dim=30, lamb=1, rho=1.0, eta=0.1, p=10, gamma=1, T=10, out=None,
+                 rank=None, approximation='nystroem'):
         '''
         Init func
         :param kernel_type: kernel, values: 'primal' | 'linear' | 'rbf' | 'sam'
@@ -58,6 +49,9 @@ class MEDA:
         :param p: number of neighbors
         :param gamma: kernel bandwidth for rbf kernel
         :param T: iteration number
+        :param rank: if given, approximate the kernel with a rank-r factor and solve in that space,
+        which avoids the n*n matrices on large domain pairs
+        :param approximation: low-rank approximation, 'nystroem' | 'random_features'
         '''
         self.kernel_type = kernel_type
         self.dim = dim
@@ -68,6 +62,8 @@ class MEDA:
         self.p = p
         self.T = T
         self.out = out
+        self.rank = rank
+        self.approximation = approximation
 
     def estimate_mu(self, _X1, _Y1, _X2, _Y2):
         return 0.5
@@ -89,60 +85,44 @@ class MEDA:
             mu = 0
         return mu
 
-    def fit_predict(self, Xs, Ys, Xt, Yt):
+    def fit_predict(self, Xs, Ys, Xt, Yt, context=None):
         '''
         Transform and Predict
         :param Xs: ns * n_feature, source feature
         :param Ys: ns * 1, source label
         :param Xt: nt * n_feature, target feature
         :param Yt: nt * 1, target label
+        :param context: DomainContext.DomainPairContext of the pair, built here if not given
         :return: acc, y_pred, list_acc
         '''
-        gfk = GFK.GFK(dim=self.dim)
-        _, Xs_new, Xt_new = gfk.fit(Xs, Xt)
-        Xs_new, Xt_new = Xs_new.T, Xt_new.T
-        X = np.hstack((Xs_new, Xt_new))
-        ns, nt = Xs_new.shape[1], Xt_new.shape[1]
-        C = len(np.unique(Ys))
+        if context is None:
+            context = DomainContext.DomainPairContext(Xs, Ys, Xt, Yt, dim=self.dim)
+        _, Xs_new, Xt_new = context.gfk()
+        ns, nt = context.ns, context.nt
+        C = context.C
         list_acc = []
-        YY = np.zeros((ns, C))
-        for c in range(1, C + 1):
-            ind = np.where(Ys == c)
-            YY[ind, c - 1] = 1
-        YY = np.vstack((YY, np.zeros((nt, C))))
+        YY = context.YY
 
-        X /= np.linalg.norm(X, axis=0)
-        L = laplacian_matrix(X.T, self.p)
         knn_clf = KNeighborsClassifier(n_neighbors=1)
-        knn_clf.fit(X[:, :ns].T, Ys.ravel())
-        Cls = knn_clf.predict(X[:, ns:].T)
-
-        K = kernel(self.kernel_type, X, X2=None, gamma=self.gamma)
-        E = np.diagflat(np.vstack((np.ones((ns, 1)), np.zeros((nt, 1)))))
+        knn_clf.fit(context.Xs, Ys.ravel())
+        Cls = knn_clf.predict(context.Xt)
 
-        e = np.vstack((1.0 / ns * np.ones((ns, 1)), -1.0 / nt * np.ones((nt, 1))))
-        M0 = e * e.T * C
+        if self.rank:
+            Z = context.kernel_factor(self.kernel_type, self.gamma, self.rank, approximation=self.approximation)
+            Q = scipy.sparse.diags(context.a) + self.rho * context.laplacian(self.p, sparse=True)
+        else:
+            K = context.kernel(self.kernel_type, self.gamma)
+            Q = context.A + self.rho * context.laplacian(self.p, sparse=True)
+        AYY = context.a[:, None] * YY
 
         for t in range(1, self.T + 1):
             mu = self.estimate_mu(Xs_new.T, Ys, Xt_new.T, Cls)
             # mu = 0.5
-            N = 0
-            for c in range(1, C + 1):
-                e = np.zeros((ns + nt, 1))
-                tt = Ys == c
-                e[np.where(tt == True)] = 1.0 / len(Ys[np.where(Ys == c)])
-                yy = Cls == c
-                ind = np.where(yy == True)
-                inds = [item + ns for item in ind]
-                if len(Cls[np.where(Cls == c)]) == 0:
-                    e[tuple(inds)] = 0.0
-                else:
-                    e[tuple(inds)] = -1.0 / len(Cls[np.where(Cls == c)])
-                N += np.dot(e, e.T)
-            M = (1 - mu) * M0 + mu * N
-            M /= np.linalg.norm(M, 'fro')
-            left = np.dot(E + self.lamb * M + self.rho * L, K) + self.eta * np.eye(ns + nt, ns + nt)
-            Beta = np.dot(np.linalg.inv(left), np.dot(E, YY))
+            M = MMDMatrix.MMDOperator(Ys, Cls, C, mu=mu)
+            if self.rank:
+                Beta = Solver.meda_beta_lowrank(Q, Z, AYY, self.eta, mmd=M, lamb=self.lamb)
+            else:
+                Beta = Solver.meda_beta(Q, K, AYY, self.eta, mmd=M, lamb=self.lamb)
 
             # For testing
             # Ytest = np.copy(YY)
@@ -157,7 +137,10 @@ class MEDA:
             # fitness = SRM + MMD
             # print(fitness, SRM, MMD)
 
-            F = np.dot(K, Beta)
+            if self.rank:
+                F = np.dot(Z, np.dot(Z.T, Beta))
+            else:
+                F = np.dot(K, Beta)
             Cls = np.argmax(F, axis=1) + 1
             Cls = Cls[ns:]
             acc = np.mean(Cls == Yt.ravel())
@@ -169,35 +152,6 @@ class MEDA:
         return acc, Cls, list_acc
 
 
-def laplacian_matrix(data, k):
-    """
-    :param data: containing data points,
-    :param k: the number of neighbors considered (this distance metric is cosine,
-    and the weights are measured by cosine)
-    :return:
-    """
-    nn = neighbors.NearestNeighbors(n_neighbors=k, algorithm='brute', metric='cosine')
-    nn.fit(data)
-    dist, nn = nn.kneighbors(return_distance=True)
-    sim = np.zeros((len(data), len(data)))
-    for ins_index in range(len(sim)):
-        dist_row = dist[ins_index]
-        nn_row = nn[ins_index]
-        for dist_value, ind_index in zip(dist_row, nn_row):
-            sim[ins_index][ind_index] = 1.0 - dist_value
-            sim[ind_index][ins_index] = 1.0 - dist_value
-    for i in range(len(sim)):
-        sim[i][i] = 1.0
-
-    S = [np.sum(row) for row in sim]
-
-    for i in range(len(sim)):
-        sim[i] = [sim[i][j]/(S[i]*S[j])**0.5 for j in range(len(sim))]
-
-    L = np.identity(len(sim)) - sim
-    return L
-
-
 if __name__ == '__main__':
     datasets = np.array(['SURFd-w'])
     # datasets = np.array(['GasSensor1-4', 'GasSensor1-2', 'GasSensor1-3',
@@ -211,23 +165,7 @@ if __name__ == '__main__':
 
     for dim in dims:
         for dataset in datasets:
-            source = np.genfromtxt("/home/nguyenhoai2/Grid/data/TransferLearning/UnPairs/" + dataset + "/Source",
-                               delimiter=",")
-            m = source.shape[1] - 1
-            Xs = source[:, 0:m]
-            Ys = np.ravel(source[:, m:m + 1])
-            Ys = np.array([int(label) for label in Ys])
-
-            target = np.genfromtxt("/home/nguyenhoai2/Grid/data/TransferLearning/UnPairs/" + dataset + "/Target",
-                               delimiter=",")
-            Xt = target[:, 0:m]
-            Yt = np.ravel(target[:, m:m + 1])
-            Yt = np.array([int(label) for label in Yt])
-
-            C = len(np.unique(Ys))
-            if C > np.max(Ys):
-                Ys = Ys + 1
-                Yt = Yt + 1
+            Xs, Ys, Xt, Yt, C = Dataset.load("/home/nguyenhoai2/Grid/data/TransferLearning/UnPairs/" + dataset)
 
             clf = neighbors.KNeighborsClassifier(n_neighbors=1)
             clf.fit(Xs, Ys)
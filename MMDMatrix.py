@@ -0,0 +1,100 @@
+'''
+Factored representation of the MMD matrix used by MEDA
+
+    M = (1 - mu) * M0 + mu * N,   M0 = C * e0 * e0',   N = sum_c ec * ec'
+
+is kept as E * diag(w) * E', where E = [e0, e1, ..., eC] is n*(C+1),
+so M is never materialized as an n*n matrix.
+'''
+import numpy as np
+
+import Labels
+
+
+class MMDOperator:
+    def __init__(self, Ys, Yt, C, mu=0.5, normalize=True):
+        '''
+        Build the factors of M from the source labels and the (pseudo) target labels
+        :param Ys: ns source labels, from 1 to C
+        :param Yt: nt target (pseudo) labels, from 1 to C
+        :param C: number of classes
+        :param mu: balance between the marginal (M0) and conditional (N) terms
+        :param normalize: divide M by its Frobenius norm, as MEDA does
+        '''
+        Ys = np.asarray(Ys, dtype=int).ravel()
+        Yt = np.asarray(Yt, dtype=int).ravel()
+        ns, nt = len(Ys), len(Yt)
+        self.n = ns + nt
+        self.C = C
+
+        E = np.empty((ns + nt, C + 1))
+        E[:ns, 0] = 1.0 / ns
+        E[ns:, 0] = -1.0 / nt
+        # a class without target instances leaves its target entries at 0
+        E[:, 1:] = Labels.class_vectors(Ys, Yt, C)
+        self.E = E
+
+        self.w = np.full(C + 1, float(mu))
+        self.w[0] = (1 - mu) * C
+
+        self.gram = np.dot(E.T, E)
+        self.scale = 1.0
+        if normalize:
+            self.scale = 1.0 / self.fro_norm()
+
+    def fro_norm(self):
+        '''
+        Frobenius norm of M, from the (C+1)*(C+1) Gram matrix of E
+        '''
+        WG = self.scale * self.w[:, None] * self.gram
+        return np.sqrt(np.sum(WG * WG.T))
+
+    def trace(self):
+        '''
+        trace(M)
+        '''
+        return self.scale * np.dot(self.w, np.diagonal(self.gram))
+
+    def dot(self, X):
+        '''
+        M * X
+        :param X: n*k matrix or n vector
+        '''
+        EX = np.dot(self.E.T, X)
+        if EX.ndim == 1:
+            return self.scale * np.dot(self.E, self.w * EX)
+        return self.scale * np.dot(self.E, self.w[:, None] * EX)
+
+    def matvec(self, x):
+        return self.dot(x)
+
+    def kmk(self, K):
+        '''
+        K * M * K, for a symmetric K
+        '''
+        KE = np.dot(K, self.E)
+        return self.scale * np.dot(KE * self.w, KE.T)
+
+    def quad_trace(self, B):
+        '''
+        trace(B' * M * B), e.g. trace(Beta' * K * M * K * Beta) with B = K * Beta
+        :param B: n*k matrix
+        '''
+        EB = np.dot(self.E.T, B)
+        return self.scale * np.dot(self.w, np.sum(EB * EB, axis=1))
+
+    def quad_traces(self, Bs):
+        '''
+        quad_trace of each of stacked matrices, with one product by E'
+        :param Bs: p*n*k array
+        :return: p traces
+        '''
+        p, n, k = Bs.shape
+        EB = np.dot(self.E.T, np.transpose(Bs, (1, 0, 2)).reshape(n, p * k)).reshape(-1, p, k)
+        return self.scale * np.dot(self.w, np.sum(EB * EB, axis=2))
+
+    def toarray(self):
+        '''
+        Materialize M as a dense n*n matrix
+        '''
+        return self.scale * np.dot(self.E * self.w, self.E.T)
@@ -97,7 +97,8 @@ if __name__ == '__main__':
         offspring_population_size=Paras.N_IND,
         mutation=IntegerPolynomialMutation(probability=1.0 / problem.number_of_variables, distribution_index=20),
         crossover=IntegerSBXCrossover(probability=0.8, distribution_index=20),
-        termination_criterion=StoppingByEvaluations(max_evaluations=no_evaluations)
+        termination_criterion=StoppingByEvaluations(max_evaluations=no_evaluations),
+        population_evaluator=mt.PopulationEvaluator()
     )
     progress_bar = ProgressBarObserver(max=no_evaluations)
     algorithm.observable.register(progress_bar)
@@ -1,70 +1,64 @@
 from jmetal.core.problem import IntegerProblem
 from jmetal.core.solution import IntegerSolution
+from jmetal.util.evaluator import Evaluator
 import numpy as np
 from sklearn.neighbors import KNeighborsClassifier
 import Helpers
 import Helpers as Pre
-import GFK
+import Dataset
+import DomainContext
+import FitnessCache
+import Kernel
+import LabelFitness
+import MMDMatrix
+import Solver
 import Paras
 
 
 class MultiTransferProblem(IntegerProblem):
 
-    def __init__(self, normalize, gfk_dim):
+    def __init__(self, normalize, gfk_dim, context=None, data=None):
         """
         :param normalize: whether to normalize the data or not
         :param gfk_dim: what is the dimension of gfk
+        :param context: optional DomainContext.DomainPairContext built on the same data,
+        its projection and fixed matrices are reused instead of being recomputed
+        :param data: optional Dataset.DomainPair already loaded (and normalized),
+        by default Source and Target are loaded from the working directory
         """
         # eta can be tuned later through arguments
         self.eta = 0.1
 
-        # first load the data
-        source = np.genfromtxt("Source", delimiter=",")
-        self.no_features, self.no_src_instances = source.shape[1] - 1, source.shape[0]
-        self.Xs = source[:, 0:self.no_features]
-        self.Ys = np.ravel(source[:, self.no_features:self.no_features + 1])
-        self.Ys = np.array([int(label) for label in self.Ys])
-
-        target = np.genfromtxt("Target", delimiter=",")
-        self.no_tar_instances = target.shape[0]
-        self.Xt = target[:, 0: self.no_features]
-        self.Yt = np.ravel(target[:, self.no_features:self.no_features + 1])
-        self.Yt = np.array([int(label) for label in self.Yt])
-
-        if normalize:
-            self.Xs, self.Xt = Pre.normalize_data(self.Xs, self.Xt)
-
-        # make sure the class indices start from 1
-        self.no_class = len(np.unique(self.Ys))
-        if self.no_class > np.max(self.Ys):
-            self.Ys = self.Ys + 1
-            self.Yt = self.Yt + 1
+        # first load the data, the class indices start from 1
+        if data is None:
+            data = Dataset.load(normalize=normalize)
+        self.Xs, self.Ys, self.Xt, self.Yt, self.no_class = data
+        self.no_features = self.Xs.shape[1]
+        self.no_src_instances, self.no_tar_instances = self.Xs.shape[0], self.Xt.shape[0]
 
         # transform data using gfk
-        gfk = GFK.GFK(dim=gfk_dim)
-        _, Xs_new, Xt_new = gfk.fit(self.Xs, self.Xt)
-        Xs_new, Xt_new = Xs_new.T, Xt_new.T
-        X = np.hstack((Xs_new, Xt_new))
-        X /= np.linalg.norm(X, axis=0)
-        self.X = X.T
-        self.Xs = X[:, :self.no_src_instances].T
-        self.Xt = X[:, self.no_src_instances:].T
-
-        self.YY = np.zeros((self.no_src_instances, self.no_class))
-        for c in range(1, self.no_class + 1):
-            ind = np.where(self.Ys == c)
-            self.YY[ind, c - 1] = 1
-        self.YY = np.vstack((self.YY, np.zeros((self.no_tar_instances, self.no_class))))
+        if context is None:
+            context = DomainContext.DomainPairContext(self.Xs, self.Ys, self.Xt, self.Yt, dim=gfk_dim)
+        self.context = context
+        self.X = context.X.T
+        self.Xs = context.Xs
+        self.Xt = context.Xt
+
+        self.YY = context.YY
 
         # build some matrices that are not changed in the evaluation
-        self.K = self.kernel('rbf', self.X.T, X2=None, gamma=0.5)
-        self.A = np.diagflat(np.vstack((np.ones((self.no_src_instances, 1)),
-                                        np.zeros((self.no_tar_instances, 1)))))
-        e = np.vstack((1.0 / self.no_src_instances * np.ones((self.no_src_instances, 1)),
-                       -1.0 / self.no_tar_instances * np.ones((self.no_tar_instances, 1))))
-        self.M0 = e * e.T * self.no_class
+        self.K = context.kernel('rbf', 0.5)
+        self.a = context.a
+        self.A = context.A
 
-        self.L = Pre.laplacian_matrix(self.X, k=10)
+        self.L = context.laplacian(10, sparse=True)
+
+        # label based objectives, see evaluate
+        self.manifold = LabelFitness.ManifoldTrace(context.laplacian(10, sparse=True), self.Ys)
+        self.discrepancy = LabelFitness.Discrepancy(self.Ys, self.no_class, mu=0.5)
+        # objectives and local search results of the label vectors already seen
+        self.cache = FitnessCache.FitnessCache()
+        self.step_cache = FitnessCache.FitnessCache(max_size=1000)
 
         super(MultiTransferProblem, self).__init__()
 
@@ -110,10 +104,7 @@ class MultiTransferProblem(IntegerProblem):
             label_vector[0][label_index] = Yt_pseu[label_index]
 
         # the second vector is initialised by the manifold
-        left = np.dot(self.A + self.L, self.K) \
-               + self.eta * np.eye(self.no_src_instances + self.no_tar_instances,
-                                   self.no_src_instances + self.no_tar_instances)
-        beta = np.dot(np.linalg.inv(left), np.dot(self.A, self.YY))
+        beta = Solver.meda_beta(self.A + self.L, self.K, self.a[:, None] * self.YY, self.eta)
 
         F = np.dot(self.K, beta)
         Y_pseu = np.argmax(F, axis=1) + 1
@@ -165,17 +156,28 @@ class MultiTransferProblem(IntegerProblem):
         :return:
         """
         Yt_pseu = np.array(solution.variables)
-        Y = np.concatenate((self.Ys, Yt_pseu))
-        F = np.zeros((self.no_src_instances + self.no_tar_instances, self.no_class))
-        for index, l in enumerate(Y):
-            F[index][l - 1] = 1.0
 
-        # calculate the manifold objective
-        manifold = np.linalg.multi_dot([F.T, self.L, F]).trace()
+        cached = self.cache.get(Yt_pseu)
+        parent = solution.attributes.get('labels')
+        if cached is not None:
+            discrepancy, manifold, counts = cached
+        else:
+            # the operators copy the attributes of the parent, so an offspring
+            # is evaluated from the labels that differ from its parent only
+            if parent is not None and len(parent) == len(Yt_pseu):
+                manifold = self.manifold.update(parent, solution.attributes['manifold'], Yt_pseu)
+                counts = self.discrepancy.update_counts(solution.attributes['counts'], parent, Yt_pseu)
+            else:
+                manifold = self.manifold.evaluate(Yt_pseu)
+                counts = self.discrepancy.counts(Yt_pseu)
+
+            # calculate the discrepancy objective
+            discrepancy = self.discrepancy.evaluate(counts=counts)
+            self.cache.put(Yt_pseu, (discrepancy, manifold, counts))
 
-        # calculate the discrepancy objective
-        M = self.mmd_matrix(Yt_pseu)
-        discrepancy = np.linalg.multi_dot([F.T, M, F]).trace()
+        solution.attributes['labels'] = Yt_pseu
+        solution.attributes['manifold'] = manifold
+        solution.attributes['counts'] = counts
 
         # calculate the cross domain error
         # error = self.cross_domain_error(Yt_pseu)
@@ -186,30 +188,42 @@ class MultiTransferProblem(IntegerProblem):
 
         return solution
 
+    def evaluate_population(self, solutions):
+        '''
+        Evaluate a list of solutions: the ones already seen are read from the cache,
+        the ones that know their parent are updated from their changed labels,
+        the others are evaluated together in one batch
+        :param solutions: list of IntegerSolution
+        :return: solutions
+        '''
+        batch = []
+        for sol in solutions:
+            if sol.attributes.get('labels') is not None or sol.variables in self.cache:
+                self.evaluate(sol)
+            else:
+                batch.append(sol)
+        if batch:
+            Yts = np.array([sol.variables for sol in batch])
+            manifolds = self.manifold.evaluate_population(Yts)
+            counts = self.discrepancy.counts_population(Yts)
+            discrepancies = self.discrepancy.evaluate(counts=counts)
+            for index, sol in enumerate(batch):
+                sol.attributes['labels'] = Yts[index]
+                sol.attributes['manifold'] = manifolds[index]
+                sol.attributes['counts'] = counts[index]
+                sol.objectives[0] = discrepancies[index]
+                sol.objectives[1] = manifolds[index]
+                self.cache.put(Yts[index], (discrepancies[index], manifolds[index], counts[index]))
+        return solutions
+
     def mmd_matrix(self, target_label):
         '''
         Calaculate the MMD matrix based on the label of the target instances
         :param target_label:
-        :return: MMD matrix
+        :return: MMD matrix, in factored form (MMDMatrix.MMDOperator)
         '''
         mu = 0.5
-        N = 0
-        for c in range(1, self.no_class + 1):
-            e = np.zeros((self.no_src_instances + self.no_tar_instances, 1))
-            tt = self.Ys == c
-            e[np.where(tt == True)] = 1.0 / len(self.Ys[np.where(self.Ys == c)])
-            yy = target_label == c
-            ind = np.where(yy == True)
-            inds = [item + self.no_src_instances for item in ind]
-            if len(target_label[np.where(target_label == c)]) == 0:
-                e[tuple(inds)] = 0.0
-            else:
-                e[tuple(inds)] = -1.0 / len(target_label[np.where(target_label == c)])
-            e[np.isinf(e)] = 0
-            N += np.dot(e, e.T)
-        M = (1 - mu) * self.M0 + mu * N
-        M /= np.linalg.norm(M, 'fro')
-        return M
+        return MMDMatrix.MMDOperator(self.Ys, target_label, self.no_class, mu=mu)
 
     def step_discrepancy(self, solutions):
         '''
@@ -220,16 +234,7 @@ class MultiTransferProblem(IntegerProblem):
         '''
         grad_solutions = []
         for sol in solutions:
-            Yt_pseu = np.array(sol.variables)
-            M = self.mmd_matrix(Yt_pseu)
-            left = np.dot(self.A + M, self.K) \
-                   + self.eta * np.eye(self.no_src_instances + self.no_tar_instances,
-                                       self.no_src_instances + self.no_tar_instances)
-            beta = np.dot(np.linalg.inv(left), np.dot(self.A, self.YY))
-
-            F = np.dot(self.K, beta)
-            Y_pseu = np.argmax(F, axis=1) + 1
-            Yt_pseu = Y_pseu[self.no_src_instances:].tolist()
+            Yt_pseu = self.step_cache.evaluate(self.step_labels, sol.variables)
 
             new_solution = IntegerSolution(
                 self.lower_bound,
@@ -245,31 +250,27 @@ class MultiTransferProblem(IntegerProblem):
 
         return grad_solutions
 
+    def step_labels(self, labels):
+        '''
+        Pseudo labels given by a single MEDA step from the labels
+        '''
+        M = self.mmd_matrix(np.array(labels))
+        beta = Solver.meda_beta(self.A, self.K, self.a[:, None] * self.YY, self.eta, mmd=M)
+
+        F = np.dot(self.K, beta)
+        Y_pseu = np.argmax(F, axis=1) + 1
+        return Y_pseu[self.no_src_instances:].tolist()
+
     def kernel(self, ker, X, X2, gamma):
-        if not ker or ker == 'primal':
-            return X
-        elif ker == 'linear':
-            if not X2:
-                K = np.dot(X.T, X)
-            else:
-                K = np.dot(X.T, X2)
-        elif ker == 'rbf':
-            n1sq = np.sum(X ** 2, axis=0)
-            n1 = X.shape[1]
-            if not X2:
-                D = (np.ones((n1, 1)) * n1sq).T + np.ones((n1, 1)) * n1sq - 2 * np.dot(X.T, X)
-            else:
-                n2sq = np.sum(X2 ** 2, axis=0)
-                n2 = X2.shape[1]
-                D = (np.ones((n2, 1)) * n1sq).T + np.ones((n1, 1)) * n2sq - 2 * np.dot(X.T, X)
-            K = np.exp(-gamma * D)
-        elif ker == 'sam':
-            if not X2:
-                D = np.dot(X.T, X)
-            else:
-                D = np.dot(X.T, X2)
-            K = np.exp(-gamma * np.arccos(D) ** 2)
-        return K
+        return Kernel.kernel(ker, X, X2, gamma)
 
     def get_name(self) -> str:
         return "Multi-objective Transfer learning"
+
+
+class PopulationEvaluator(Evaluator):
+    '''
+    jMetal evaluator that hands the whole population to MultiTransferProblem.evaluate_population
+    '''
+    def evaluate(self, solution_list, problem):
+        return problem.evaluate_population(solution_list)
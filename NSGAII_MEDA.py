@@ -1,5 +1,6 @@
 import time
 from typing import TypeVar, List, Generator
+import Checkpoint
 import MultiTransfer
 
 try:
@@ -47,7 +48,9 @@ class NSGAII_MEDA(GeneticAlgorithm[S, R]):
                  termination_criterion: TerminationCriterion = store.default_termination_criteria,
                  population_generator: Generator = store.default_generator,
                  population_evaluator: Evaluator = store.default_evaluator,
-                 dominance_comparator: Comparator = store.default_comparator):
+                 dominance_comparator: Comparator = store.default_comparator,
+                 checkpoint: str = None,
+                 checkpoint_every: int = 1):
         """
         NSGA-II implementation as described in
 
@@ -66,6 +69,8 @@ class NSGAII_MEDA(GeneticAlgorithm[S, R]):
         :param mutation: Mutation operator (see :py:mod:`jmetal.operator.mutation`).
         :param crossover: Crossover operator (see :py:mod:`jmetal.operator.crossover`).
         :param selection: Selection operator (see :py:mod:`jmetal.operator.selection`).
+        :param checkpoint: File name of the checkpoint, the run resumes from it if it exists.
+        :param checkpoint_every: Number of generations between two checkpoints.
         """
         super(NSGAII_MEDA, self).__init__(
             problem=problem,
@@ -79,6 +84,9 @@ class NSGAII_MEDA(GeneticAlgorithm[S, R]):
             population_generator=population_generator
         )
         self.dominance_comparator = dominance_comparator
+        self.checkpoint = checkpoint
+        self.checkpoint_every = checkpoint_every
+        self.generations = 0
 
     def replacement(self, population: List[S], offspring_population: List[S]) -> List[List[S]]:
         """ This method joins the current and offspring populations to produce the population of the next generation
@@ -102,6 +110,35 @@ class NSGAII_MEDA(GeneticAlgorithm[S, R]):
 
         return solutions
 
+    def run(self):
+        """ Run the algorithm, or resume it from its checkpoint when there is one. """
+        state = Checkpoint.resume(self.checkpoint)
+        if state is None:
+            super(NSGAII_MEDA, self).run()
+            return
+
+        self.start_computing_time = time.time() - state['computing_time']
+        self.solutions = state['solutions']
+        self.evaluations = state['evaluations']
+        self.generations = state['generations']
+        # the termination criterion is an observer, it has to see the restored evaluations
+        # (the method was renamed observable_data in later jMetalPy versions)
+        observable_data = self.observable_data if hasattr(self, 'observable_data') else self.get_observable_data
+        self.observable.notify_all(**observable_data())
+
+        while not self.stopping_condition_is_met():
+            self.step()
+            self.update_progress()
+
+        self.total_computing_time = time.time() - self.start_computing_time
+
+    def update_progress(self) -> None:
+        super(NSGAII_MEDA, self).update_progress()
+        self.generations += 1
+        if self.checkpoint is not None and Checkpoint.due(self.generations, self.checkpoint_every):
+            Checkpoint.save(self.checkpoint, solutions=self.solutions, evaluations=self.evaluations,
+                            generations=self.generations, computing_time=time.time() - self.start_computing_time)
+
     def evaluate(self, population: List[S]):
         new_population = self.population_evaluator.evaluate(population, self.problem)
         return new_population
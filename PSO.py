@@ -12,18 +12,21 @@
 #    You should have received a copy of the GNU Lesser General Public
 #    License along with DEAP. If not, see <http://www.gnu.org/licenses/>.
 
+import sys
+
 import numpy as np
 
-from deap import base
-from deap import creator
-from deap import tools
 import FitnessFunction
+import Checkpoint
 import Core
+import RunLogger
 
 # Setting from Problem
 NBIT = (len(Core.Xs) + len(Core.Xt)) * Core.C
 NGEN = 1000
 NPART = 100  # NBIT if NBIT < 100 else 100
+# generations between two checkpoints, when a checkpoint file is given
+CHECKPOINT_EVERY = 10
 
 # PSO parameters
 w = 0.7298
@@ -34,135 +37,137 @@ pos_min = -10.0
 s_max = (pos_max - pos_min) / 30
 s_min = -s_max
 
-creator.create("FitnessMin", base.Fitness, weights=(-1.0,))
-creator.create("Particle", np.ndarray, fitness=creator.FitnessMin,
-               speed=list, smin=None, smax=None, best=None,
-               target_predict=list)
-
-
-def generate(size, pmin, pmax, smin, smax):
-    # create position
-    position = np.random.uniform(pmin, pmax, size)
 
-    # refine the position
-    beta = np.copy(position)
-    beta = np.reshape(beta, (len(Core.Xs) + len(Core.Xt), Core.C))
+def refine(position):
+    '''
+    :return: the position with its Beta refined by one MEDA solve
+    '''
+    beta = np.reshape(position, (len(Core.Xs) + len(Core.Xt), Core.C))
     beta = FitnessFunction.refine(beta)
-    position = np.reshape(beta, ((len(Core.Xs) + len(Core.Xt)) * Core.C), )
-
-    part = creator.Particle(position)
-    # create speed
-    part.speed = np.zeros(size)
-    part.smin = smin
-    part.smax = smax
-    return part
-
-
-def updateParticle(part, best):
-    # calculate speed
-    u1 = np.random.uniform(0, 1, len(part))
-    u2 = np.random.uniform(0, 1, len(part))
-    v_u1 = c1 * u1 * (part.best - part)
-    v_u2 = c2 * u2 * (best - part)
-    part.speed = w * part.speed + v_u1 + v_u2
-    for i, speed in enumerate(part.speed):
-        if speed < part.smin:
-            part.speed[i] = part.smin
-        elif speed > part.smax:
-            part.speed[i] = part.smax
+    return np.reshape(beta, ((len(Core.Xs) + len(Core.Xt)) * Core.C), )
+
+
+def generate(n, size, pmin, pmax):
+    '''
+    :return: n * size array of the initial positions, drawn uniformly in [pmin, pmax] and refined
+    '''
+    positions = np.random.uniform(pmin, pmax, (n, size))
+    for position in positions:
+        position[:] = refine(position)
+    return positions
+
+
+def update_swarm(positions, speeds, pbest, gbest):
+    '''
+    Move all the particles at once, positions and speeds are updated in place
+    :param positions: NPART * NBIT array of the positions
+    :param speeds: NPART * NBIT array of the speeds
+    :param pbest: NPART * NBIT array of the personal best positions
+    :param gbest: global best position
+    '''
+    # one draw for the swarm, in the order of the former per-particle draws (u1 then u2 of each particle)
+    u = np.random.uniform(0, 1, (len(positions), 2, positions.shape[1]))
+    speeds *= w
+    speeds += c1 * u[:, 0] * (pbest - positions)
+    speeds += c2 * u[:, 1] * (gbest - positions)
+    np.clip(speeds, s_min, s_max, out=speeds)
 
     # calculate new positions
-    part += part.speed
-    for i, entry in enumerate(part):
-        if entry < pos_min:
-            part[i] = pos_min
-        elif entry > pos_max:
-            part[i] = pos_max
+    positions += speeds
+    np.clip(positions, pos_min, pos_max, out=positions)
 
 
-def evaluate(particle):
-    beta = np.copy(particle)
-    beta = np.reshape(beta, (len(Core.Xs) + len(Core.Xt), Core.C))
-    fitness = FitnessFunction.fitness_function(beta)
-    return fitness,
+def evaluate(position):
+    beta = np.reshape(position, (len(Core.Xs) + len(Core.Xt), Core.C))
+    return FitnessFunction.fitness_function(beta)
 
 
-toolbox = base.Toolbox()
-toolbox.register("particle", generate, size=NBIT, pmin=pos_min, pmax=pos_max, smin=s_min, smax=s_max)
-toolbox.register("population", tools.initRepeat, list, toolbox.particle)
-toolbox.register("update", updateParticle)
-toolbox.register("evaluate", evaluate)
+def evaluate_swarm(positions):
+    '''
+    :return: array of the fitness of each position
+    '''
+    betas = np.reshape(positions, (len(positions), len(Core.Xs) + len(Core.Xt), Core.C))
+    return FitnessFunction.swarm_fitness(betas)
 
 
 def main(args):
+    '''
+    :param args: run index, and optionally the file name of the per-generation records (JSON lines)
+    and the file name of the checkpoint, the run resumes from it if it exists
+    '''
     run_index = int(args[0])
     np.random.seed(1617 ** 2 * run_index)
-
-    pop = toolbox.population(n=NPART)
-    stats = tools.Statistics(lambda ind: ind.fitness.values)
-    stats.register("avg", np.mean)
-    stats.register("std", np.std)
-    stats.register("min", np.min)
-    stats.register("max", np.max)
-
-    logbook = tools.Logbook()
-    logbook.header = ["gen", "evals"] + stats.fields
-    best = None
-    glive = 0
-    gbest_try = False
-
-    for g in range(NGEN):
-        print('==============Gen %d===============' % g)
-
-        gbest_update = False
-        for part in pop:
-            part.fitness.values = toolbox.evaluate(part)
-            if part.best is None or part.best.fitness < part.fitness:
-                part.best = creator.Particle(part)
-                part.best.fitness.values = part.fitness.values
-                part.best.target_predict = part.target_predict
-            if best is None or best.fitness < part.fitness:
-                best = creator.Particle(part)
-                best.fitness.values = part.fitness.values
-                best.target_predict = part.target_predict
-                gbest_update = True
-
+    checkpoint = args[2] if len(args) > 2 else None
+    state = Checkpoint.resume(checkpoint)
+    log = RunLogger.RunLogger(sys.stdout, records=args[1] if len(args) > 1 else None,
+                              mode='w' if state is None else 'a')
+
+    if state is None:
+        positions = generate(NPART, NBIT, pos_min, pos_max)
+        speeds = np.zeros((NPART, NBIT))
+        # personal and global bests, fitness is minimized
+        pbest = np.copy(positions)
+        pbest_fitness = np.full(NPART, np.inf)
+        gbest = None
+        gbest_fitness = np.inf
+        glive = 0
+        gbest_try = False
+        first_gen = 0
+    else:
+        log.rewind(state['log'])
+        positions, speeds = state['positions'], state['speeds']
+        pbest, pbest_fitness = state['pbest'], state['pbest_fitness']
+        gbest, gbest_fitness = state['gbest'], state['gbest_fitness']
+        glive, gbest_try = state['glive'], state['gbest_try']
+        Core.Yt_pseu = state['Yt_pseu']
+        first_gen = state['gen']
+
+    for g in range(first_gen, NGEN):
+        log.write('==============Gen %d===============\n' % g)
+
+        fitness = evaluate_swarm(positions)
+        improved = fitness < pbest_fitness
+        pbest[improved] = positions[improved]
+        pbest_fitness[improved] = fitness[improved]
+
+        # the first of the best particles, as when the particles were compared one by one
+        best_index = np.argmin(fitness)
+        gbest_update = fitness[best_index] < gbest_fitness
         if gbest_update:
+            gbest = np.copy(positions[best_index])
+            gbest_fitness = fitness[best_index]
             glive = 1
             gbest_try = False
         else:
             glive = glive + 1
 
-        for part in pop:
-            toolbox.update(part, best)
+        update_swarm(positions, speeds, pbest, gbest)
 
-        # Gather all the fitnesses in one list and print the stats
-        logbook.record(gen=g, evals=len(pop), **stats.compile(pop))
-        print(logbook.stream)
+        # print the stats of the fitnesses
+        record = {'avg': np.mean(fitness), 'std': np.std(fitness), 'min': np.min(fitness), 'max': np.max(fitness)}
+        log.write('gen %d, evals %d, avg %f, std %f, min %f, max %f\n'
+                  % (g, NPART, record['avg'], record['std'], record['min'], record['max']))
 
         if glive > 10:
-            print('Start reparing gbest')
+            log.write('Start reparing gbest\n')
 
             if gbest_try:
-                beta = np.random.uniform(pos_min, pos_max, NBIT)
+                position = np.random.uniform(pos_min, pos_max, NBIT)
             else:
-                beta = np.copy(best)
+                position = gbest
                 gbest_try = True
 
-            beta = np.reshape(beta, (len(Core.Xs) + len(Core.Xt), Core.C))
-            beta = FitnessFunction.refine(beta)
-            position = np.reshape(beta, ((len(Core.Xs) + len(Core.Xt)) * Core.C), )
-            tmp = creator.Particle(position)
-            tmp.fitness.values = toolbox.evaluate(tmp)
-            if best.fitness < tmp.fitness:
-                print("Update gbest")
-                best = tmp
+            position = refine(position)
+            position_fitness = evaluate(position)
+            if position_fitness < gbest_fitness:
+                log.write("Update gbest\n")
+                gbest = position
+                gbest_fitness = position_fitness
                 glive = 1
                 gbest_try = False
 
         # update the target pseudo
-        beta = np.copy(best)
-        beta = np.reshape(beta, (len(Core.Xs) + len(Core.Xt), Core.C))
+        beta = np.reshape(gbest, (len(Core.Xs) + len(Core.Xt), Core.C))
         F = np.dot(Core.K, beta)
         Cls = np.argmax(F, axis=1) + 1
 
@@ -173,11 +178,18 @@ def main(args):
         label_source = Cls[:Core.ns]
         acc_source = np.mean(label_source == Core.Ys)
 
-        print("Source acc: %f Target acc: %f" % (acc_source, acc_target))
-        print(best.fitness)
+        log.write("Source acc: %f Target acc: %f\n" % (acc_source, acc_target))
+        log.write("(%r,)\n" % float(gbest_fitness))
+        log.record(event='generation', gen=g, evals=NPART, fitness=gbest_fitness,
+                   src_acc=acc_source, tar_acc=acc_target, **record)
+        if checkpoint is not None and Checkpoint.due(g + 1, CHECKPOINT_EVERY):
+            Checkpoint.save(checkpoint, gen=g + 1, positions=positions, speeds=speeds,
+                            pbest=pbest, pbest_fitness=pbest_fitness, gbest=gbest, gbest_fitness=gbest_fitness,
+                            glive=glive, gbest_try=gbest_try, Yt_pseu=Core.Yt_pseu, log=log.mark())
+    log.close()
+    # the run is complete, running it again starts a new one
+    Checkpoint.remove(checkpoint)
 
 
 if __name__ == "__main__":
-    import sys
-
     main(sys.argv[1:])
@@ -0,0 +1,126 @@
+'''
+Process pool for evaluating individuals in parallel.
+
+The fitness functions of the GA modules read module globals (K, L, A, YY, ...).
+The pool copies these globals to every worker once, when the worker starts:
+numpy arrays (and the arrays of sparse matrices) are placed in shared memory,
+so the workers map them without a copy, and the other values are pickled.
+Only the individuals and the results are sent with each task. The pool needs
+Python 3.8 (multiprocessing.shared_memory), imported only when a pool is made,
+so a serial run (processes <= 1) does not need it.
+
+    pool = Parallel.SharedPool(sys.modules[__name__], ['K', 'L', 'YY'], processes=8)
+    pool.register(toolbox)
+    ...
+    pool.close()
+'''
+import importlib
+import multiprocessing
+import sys
+
+import numpy as np
+import scipy.sparse
+
+# shared memory blocks attached by a worker, kept open while the worker lives
+attached = []
+
+
+def attach(spec):
+    from multiprocessing import shared_memory
+
+    shm_name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=shm_name)
+    attached.append(shm)
+    return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def init_worker(module_name, arrays, sparse, values):
+    '''
+    Set the globals of the module in a new worker
+    '''
+    module = sys.modules.get(module_name)
+    if module is None:
+        module = importlib.import_module(module_name)
+    for name, spec in arrays.items():
+        setattr(module, name, attach(spec))
+    for name, (fmt, shape, specs) in sparse.items():
+        data, indices, indptr = [attach(spec) for spec in specs]
+        setattr(module, name, scipy.sparse.csr_matrix((data, indices, indptr), shape=shape))
+    for name, value in values.items():
+        setattr(module, name, value)
+
+
+class SharedPool:
+    def __init__(self, module, names, processes=None):
+        '''
+        :param module: module whose globals are read by the evaluated functions
+        :param names: names of the globals to copy to the workers
+        :param processes: number of workers, all the cores by default
+        '''
+        self.blocks = []
+        self.toolbox = None
+        arrays, sparse, values = {}, {}, {}
+        for name in names:
+            value = getattr(module, name)
+            if isinstance(value, np.ndarray) and value.size > 0:
+                arrays[name] = self.share(value)
+            elif scipy.sparse.issparse(value):
+                value = scipy.sparse.csr_matrix(value)
+                sparse[name] = ('csr', value.shape,
+                                [self.share(part) for part in (value.data, value.indices, value.indptr)])
+            else:
+                values[name] = value
+        self.pool = multiprocessing.Pool(processes, initializer=init_worker,
+                                         initargs=(module.__name__, arrays, sparse, values))
+
+    def share(self, array):
+        '''
+        Copy the array to a new shared memory block
+        :return: spec to attach it in a worker
+        '''
+        from multiprocessing import shared_memory
+
+        array = np.ascontiguousarray(array)
+        shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+        self.blocks.append(shm)
+        return shm.name, array.shape, array.dtype.str
+
+    def map(self, func, iterable, chunksize=None):
+        return self.pool.map(func, list(iterable), chunksize)
+
+    def register(self, toolbox):
+        '''
+        Use the pool as the map of a DEAP toolbox, until close
+        '''
+        self.toolbox = toolbox
+        toolbox.register("map", self.map)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+        self.blocks = []
+        if self.toolbox is not None:
+            self.toolbox.register("map", map)
+            self.toolbox = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def register(toolbox, module, names, processes):
+    '''
+    Register a SharedPool map on the toolbox when more than one process is asked
+    :return: the pool, to be closed at the end of the run, or None
+    '''
+    if processes is None or processes <= 1:
+        return None
+    pool = SharedPool(module, names, processes=processes)
+    pool.register(toolbox)
+    return pool
@@ -1,7 +1,8 @@
 import pandas as pd
 import numpy as np
 from collections import OrderedDict
-import shutil
+
+import ResultStore
 
 
 # import sys, os
@@ -78,145 +79,69 @@ list_datasets = [
     # ['VOC2007-ImageNet', 'ImageNet-VOC2007']
 ]
 
-for datasets in list_datasets:
-    acc = OrderedDict([('Datasets', []), ('1NN', [])])
-    # ('Best',[]),
-    # ('10p',[]), ('Pop',[]), ('Archive',[])]
-
-    # traditionals = [ 'TCA', 'JDA', 'TJM', 'JGSA', 'GFK']
-    traditionals = [ "RF", "LSVM", "SVM"]
-    for method in traditionals:
-        acc.update({method : []})
-
-    time =OrderedDict([('Datasets', []), ('MEDA', [])])
-    acc.update({'MEDA':[]})
-
-    dir = '/home/nguyenhoai2/Grid/results/MEDA-Extend/'
-    heu_methods = ['P-MEDA','GA-MEDA-Final']
-    for method in heu_methods:
-        acc.update({method: []})
-        time.update({method: []})
+dir = '/home/nguyenhoai2/Grid/results/MEDA-Extend/'
+runs = 30
+traditionals = ["RF", "LSVM", "SVM"]
+# traditionals = [ 'TCA', 'JDA', 'TJM', 'JGSA', 'GFK']
+heu_methods = ['P-MEDA', 'GA-MEDA-Final']
 
 
+def load(store, datasets):
+    '''
+    Add to the store the runs that are not in it yet, so the logs are only parsed once
+    '''
     for dataset in datasets:
-        time['Datasets'].append(dataset)
-        acc['Datasets'].append(dataset)
-
-        list_acc = OrderedDict()
-
         for method in traditionals:
-            f = open(dir+dataset+'/'+method+".txt",'r')
-            fl = f.readlines()
-            for l in fl:
-                tra_acc = float(l)
-                list_acc.update({method : [tra_acc]*30})
-                acc[method].append(tra_acc*100)
-                break
-
-        for index, method in enumerate(heu_methods):
-            list_acc.update({method: []})
-            list_acc.update({'MEDA': []})
-
-            if 'GA-MEDA' in method:
-                dir_data = dir+dataset+'/'+method+'/'
-                runs = 30
-                nn_acc = 0
-                meda_acc = 0
-                best_acc = []
-                evolve_acc = []
-                tenp_acc = []
-                pop_acc = []
-                arc_acc = []
-                meda_time = []
-                gmeda_time = []
-                for run in range(1, runs+1):
-                    dir_data_run = dir_data + str(run) + '.txt'
-                    f = open(dir_data_run, 'r')
-                    fl = f.readlines()
-                    for l in fl:
-                        if '1NN accuracy' in l:
-                            nn_acc = float(l.split(': ')[1])
-                        elif 'MEDA accuracy' in l:
-                            meda_acc = float(l.split(': ')[1])
-                        elif 'MEDA time' in l and not('GA-MEDA' in l):
-                            meda_time.append(float(l.split(': ')[1]))
-                        elif 'Accuracy of the best individual' in l:
-                            best_acc.append(float(l.split(': ')[1]))
-                        elif 'Accuracy of the evovled best individual' in l:
-                            evolve_acc.append(float(l.split(': ')[1]))
-                        elif 'Accuracy of the 10% population' in l:
-                            tenp_acc.append(float(l.split(': ')[1]))
-                        elif 'Accuracy of the population' in l:
-                            pop_acc.append(float(l.split(': ')[1]))
-                        elif 'Accuracy of the archive' in l:
-                            arc_acc.append(float(l.split(': ')[1]))
-                        elif 'GA-MEDA time' in l:
-                            gmeda_time.append(float(l.split(': ')[1]))
-
-                list_acc['MEDA'] = [meda_acc]*runs
-                list_acc[method] = evolve_acc
-
-                if index == len(heu_methods)-1:
-                    acc['1NN'].append(np.mean(nn_acc)*100)
-                    acc['MEDA'].append(np.mean(meda_acc)*100)
-                    time['MEDA'].append(np.mean(meda_time))
-                # acc['Best'].append(np.mean(best_acc)*100)
-                acc[method].append(np.mean(evolve_acc)*100)
-                time[method].append(np.mean(gmeda_time))
-                #
-                # acc['Best'].append(np.mean(best_acc)*100)
-                # acc['10p'].append(np.mean(tenp_acc)*100)
-                # acc['Pop'].append(np.mean(pop_acc)*100)
-                # acc['Arc'].append(np.mean(arc_acc)*100)
-
-                # acc['10p'].append(np.mean(tenp_acc)*100)
-                # acc['Pop'].append(np.mean(pop_acc)*100)
-                # acc['Archive'].append(np.mean(archive_acc)*100)
-            elif method == 'P-MEDA':
-                dir_data = dir+dataset+'/'+method+'/'
-                runs = 30
-                p_acc = []
-                p_time = []
+            # a deterministic method, its single accuracy counts for every run
+            if not store.has_run(dataset, method, 1):
+                with open(dir+dataset+'/'+method+".txt", 'r') as f:
+                    tra_acc = float(f.readline())
                 for run in range(1, runs+1):
-                    dir_data_run = dir_data + str(run) + '.txt'
-                    f = open(dir_data_run, 'r')
-                    fl = f.readlines()
-                    for line in fl:
-                        if 'Accuracy archive:' in line:
-                            p_acc.append(float(line.split(':')[1]))
-                        elif 'Execution time' in line:
-                            p_time.append(float(line.split(':')[1]))
-
-                list_acc[method] = p_acc
-
-                acc[method].append(np.mean(p_acc)*100)
-                time[method].append(np.mean(p_time))
-
-        keys = list_acc.keys()
-        f_out = open('SigTest/'+dataset, 'w')
-        for index, key in enumerate(keys):
-            if index < len(keys)-1:
-                f_out.write(key+', ')
-            else:
-                f_out.write(key+'\n')
-
-        for run in range(0, 30):
-            for index, key in enumerate(keys):
-                if index < len(keys) - 1:
-                    f_out.write(str(list_acc[key][run]) + ', ')
+                    store.add_run(dataset, method, run, acc=tra_acc)
+        for method in heu_methods:
+            for run in range(1, runs+1):
+                if store.has_run(dataset, method, run):
+                    continue
+                path = dir+dataset+'/'+method+'/'+str(run)+'.txt'
+                if 'GA-MEDA' in method:
+                    values, generations = ResultStore.parse_log(path)
+                    store.add_run(dataset, method, run, acc=values.get('evolved_acc'), time=values.get('time'),
+                                  metrics=values, generations=generations)
+                    # the 1NN and MEDA results are written in the GA-MEDA logs
+                    store.add_run(dataset, '1NN', run, acc=values.get('nn_acc'))
+                    store.add_run(dataset, 'MEDA', run, acc=values.get('meda_acc'), time=values.get('meda_time'))
                 else:
-                    f_out.write(str(list_acc[key][run]) + '\n')
-        f_out.close()
-
-    acc['Datasets'].append('Ave')
-    for key in acc.keys():
-        if key != 'Datasets':
-            acc[key].append(np.mean(acc[key]))
-
-    df_acc = pd.DataFrame(acc, columns=acc.keys())
-    df_acc = df_acc.round(2)
-    df_time = pd.DataFrame(time, columns=time.keys())
-    df_time = df_time.round(2)
-
-    print(df_acc.to_latex(index=False))
-    print(df_time.to_latex(index=False))
+                    store.import_log(dataset, method, run, path, acc='archive_acc')
+
+
+if __name__ == '__main__':
+    store = ResultStore.ResultStore(dir + 'results.sqlite')
+    for datasets in list_datasets:
+        load(store, datasets)
+
+        acc = OrderedDict(store.table(datasets, ['1NN'] + traditionals + ['MEDA'] + heu_methods, 'acc', scale=100))
+        time = OrderedDict(store.table(datasets, ['MEDA'] + heu_methods, 'time'))
+
+        for dataset in datasets:
+            # same columns as the significance test files written before the store
+            keys = traditionals + heu_methods[:1] + ['MEDA'] + heu_methods[1:]
+            list_acc = store.run_values(dataset, keys, 'acc')
+            f_out = open('SigTest/'+dataset, 'w')
+            f_out.write(', '.join(keys)+'\n')
+            for run in range(0, runs):
+                f_out.write(', '.join(str(list_acc[key][run]) for key in keys)+'\n')
+            f_out.close()
+
+        acc['Datasets'].append('Ave')
+        for key in acc.keys():
+            if key != 'Datasets':
+                acc[key].append(np.mean(acc[key]))
+
+        df_acc = pd.DataFrame(acc, columns=acc.keys())
+        df_acc = df_acc.round(2)
+        df_time = pd.DataFrame(time, columns=time.keys())
+        df_time = df_time.round(2)
+
+        print(df_acc.to_latex(index=False))
+        print(df_time.to_latex(index=False))
+    store.close()
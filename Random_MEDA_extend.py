@@ -12,42 +12,23 @@ from sklearn.neighbors import KNeighborsClassifier
 from sklearn.svm import SVC
 from sklearn.tree import DecisionTreeClassifier
 
+import Dataset
 import GFK
+import Helpers
+import MMDMatrix
+import Parallel
+import Solver
+import sys
 import MEDA
-import scipy.stats as stat
 import Directory as Dir
+import FitnessCache
+import Labels
+from Kernel import kernel
 
 
 # from scoop import futures
 # toolbox.register("map", futures.map)
 # for parallel
-def kernel(ker, X, X2, gamma):
-    if not ker or ker == 'primal':
-        return X
-    elif ker == 'linear':
-        if not X2:
-            K = np.dot(X.T, X)
-        else:
-            K = np.dot(X.T, X2)
-    elif ker == 'rbf':
-        n1sq = np.sum(X ** 2, axis=0)
-        n1 = X.shape[1]
-        if not X2:
-            D = (np.ones((n1, 1)) * n1sq).T + np.ones((n1, 1)) * n1sq - 2 * np.dot(X.T, X)
-        else:
-            n2sq = np.sum(X2 ** 2, axis=0)
-            n2 = X2.shape[1]
-            D = (np.ones((n2, 1)) * n1sq).T + np.ones((n1, 1)) * n2sq - 2 * np.dot(X.T, X)
-        K = np.exp(-gamma * D)
-    elif ker == 'sam':
-        if not X2:
-            D = np.dot(X.T, X)
-        else:
-            D = np.dot(X.T, X2)
-        K = np.exp(-gamma * np.arccos(D) ** 2)
-    return K
-
-
 def proxy_a_distance(source_X, target_X):
     """
     Compute the Proxy-A-Distance of a source/target representation
@@ -90,6 +71,9 @@ M0 = 0
 K = 0
 A = 0
 e = 0
+solver = None
+# results of fit_predict_label for the label vectors already seen in the run
+label_cache = None
 
 toolbox = base.Toolbox()
 archive = []
@@ -117,41 +101,33 @@ def estimate_mu(_X1, _Y1, _X2, _Y2):
     return mu
 
 
+def update_solver():
+    '''
+    The Solver.WoodburySolver of the run, built on first use in a worker that did not inherit it
+    '''
+    global solver
+    if solver is None:
+        solver = Solver.WoodburySolver(rate * A + rho * L, K, np.dot(A, YY), rate * eta, lamb=lamb)
+    return solver
+
+
 def fit_predict_beta(Beta):
     F = np.dot(K, Beta)
     Y_pseudo = np.argmax(F, axis=1) + 1
     Yt_pseu = Y_pseudo[ns:]
 
     mu = 0.5
-    N = 0
-    for c in range(1, C + 1):
-        e = np.zeros((ns + nt, 1))
-        tt = Ys == c
-        e[np.where(tt == True)] = 1.0 / len(Ys[np.where(Ys == c)])
-        yy = Yt_pseu == c
-        ind = np.where(yy == True)
-        inds = [item + ns for item in ind]
-        if len(Yt_pseu[np.where(Yt_pseu == c)]) == 0:
-            e[tuple(inds)] = 0.0
-        else:
-            e[tuple(inds)] = -1.0 / len(Yt_pseu[np.where(Yt_pseu == c)])
-        e[np.isinf(e)] = 0
-        N += np.dot(e, e.T)
-    M = (1 - mu) * M0 + mu * N
-    M /= np.linalg.norm(M, 'fro')
-    left = np.dot(rate*A + lamb * M + rho * L, K) \
-           + rate * eta * np.eye(ns + nt, ns + nt)
-    Beta = np.dot(np.linalg.inv(left), np.dot(A, YY))
+    M = MMDMatrix.MMDOperator(Ys, Yt_pseu, C, mu=mu)
+    Beta = update_solver().solve(M)
 
     # Now given the new beta, calculate the fitness
-    SRM = np.linalg.norm(np.dot(YY.T - np.dot(Beta.T, K), A)) \
-          + eta * np.linalg.multi_dot([Beta.T, K, Beta]).trace()
-    MMD = np.linalg.multi_dot(
-        [Beta.T, np.linalg.multi_dot([K, lamb * M + rho * L, K]), Beta]).trace()
+    F = np.dot(K, Beta)
+    SRM = np.linalg.norm(np.dot(YY.T - F.T, A)) \
+          + eta * np.sum(Beta * F)
+    MMD = lamb * M.quad_trace(F) + rho * np.linalg.multi_dot([F.T, L, F]).trace()
     fitness = rate * SRM + MMD
 
     # Calcuate the accuracy
-    F = np.dot(K, Beta)
     Y_pseudo = np.argmax(F, axis=1) + 1
     Ys_pseu = Y_pseudo[:ns]
     acc_s = np.mean(Ys_pseu == Ys)
@@ -164,35 +140,17 @@ def fit_predict_label(Yt_pseu):
     Yt_pseu = [Yt_pseu[index] for index in range(len(Yt_pseu))]
     Yt_pseu = np.array(Yt_pseu)
     mu = 0.5
-    N = 0
-    for c in range(1, C + 1):
-        e = np.zeros((ns + nt, 1))
-        tt = Ys == c
-        e[np.where(tt == True)] = 1.0 / len(Ys[np.where(Ys == c)])
-        yy = Yt_pseu == c
-        ind = np.where(yy == True)
-        inds = [item + ns for item in ind]
-        if len(Yt_pseu[np.where(Yt_pseu == c)]) == 0:
-            e[tuple(inds)] = 0.0
-        else:
-            e[tuple(inds)] = -1.0 / len(Yt_pseu[np.where(Yt_pseu == c)])
-        e[np.isinf(e)] = 0
-        N += np.dot(e, e.T)
-    M = (1 - mu) * M0 + mu * N
-    M /= np.linalg.norm(M, 'fro')
-    left = np.dot(rate*A + lamb * M + rho * L, K) \
-           + rate*eta * np.eye(ns + nt, ns + nt)
-    Beta = np.dot(np.linalg.inv(left), np.dot(A, YY))
+    M = MMDMatrix.MMDOperator(Ys, Yt_pseu, C, mu=mu)
+    Beta = update_solver().solve(M)
 
     # Now given the new beta, calculate the fitness
-    SRM = np.linalg.norm(np.dot(YY.T - np.dot(Beta.T, K), A)) \
-          + eta * np.linalg.multi_dot([Beta.T, K, Beta]).trace()
-    MMD = np.linalg.multi_dot(
-        [Beta.T, np.linalg.multi_dot([K, lamb * M + rho * L, K]), Beta]).trace()
+    F = np.dot(K, Beta)
+    SRM = np.linalg.norm(np.dot(YY.T - F.T, A)) \
+          + eta * np.sum(Beta * F)
+    MMD = lamb * M.quad_trace(F) + rho * np.linalg.multi_dot([F.T, L, F]).trace()
     fitness = rate*SRM + MMD
 
     # Calcuate the accuracy
-    F = np.dot(K, Beta)
     Y_pseudo = np.argmax(F, axis=1) + 1
     Ys_pseu = Y_pseudo[:ns]
     acc_s = np.mean(Ys_pseu == Ys)
@@ -201,12 +159,12 @@ def fit_predict_label(Yt_pseu):
 
     return Beta, fitness, MMD, SRM, acc_s, acc_t, Yt_pseu
 
-def evolve(Xsource, Ysource, Xtarget, Ytarget):
+def evolve(Xsource, Ysource, Xtarget, Ytarget, processes=1):
     """
     Running GA algorithms, where each individual is a set of target pseudo labels.
     :return: the best solution of GAs.
     """
-    global ns, nt, C, Xs, Ys, Xt, Yt, YY, K, A, e, M0, L, archive
+    global ns, nt, C, Xs, Ys, Xt, Yt, YY, K, A, e, M0, L, archive, solver, label_cache
     archive_label = []
     archive_beta = []
     Xs = Xsource
@@ -231,15 +189,15 @@ def evolve(Xsource, Ysource, Xtarget, Ytarget):
     # build some matrices that are not changed
     K = kernel(kernel_type, X, X2=None, gamma=gamma)
     A = np.diagflat(np.vstack((np.ones((ns, 1)), np.zeros((nt, 1)))))
-    e = np.vstack((1.0 / ns * np.ones((ns, 1)), -1.0 / nt * np.ones((nt, 1))))
-    M0 = e * e.T * C
-    L = laplacian_matrix(X.T, p)
+    L = Helpers.laplacian_matrix(X.T, p)
 
-    YY = np.zeros((ns, C))
-    for c in range(1, C + 1):
-        ind = np.where(Ys == c)
-        YY[ind, c - 1] = 1
-    YY = np.vstack((YY, np.zeros((nt, C))))
+    YY = Labels.one_hot(Ys, C, n=ns + nt)
+    # only M changes between the solves, the fixed part is factorized once,
+    # before the pool is created so that forked workers share it
+    solver = None
+    update_solver()
+    # each entry holds a beta, so only the recent ones are kept
+    label_cache = FitnessCache.FitnessCache(max_size=200)
 
     # parameters for GA
     N_BIT = nt
@@ -265,8 +223,9 @@ def evolve(Xsource, Ysource, Xtarget, Ytarget):
     toolbox.register("crossover", tools.cxUniform, indpb=0.5)
     toolbox.register("mutate", tools.mutUniformInt, low=pos_min, up=pos_max,
                      indpb=MUTATION_RATE)
-    # pool = multiprocessing.Pool(4)
-    # toolbox.register("map", pool.map)
+    # evaluate in a process pool, the globals read by the workers go through shared memory
+    pool = Parallel.register(toolbox, sys.modules[__name__],
+                             ['ns', 'C', 'Ys', 'Yt', 'A', 'K', 'L', 'YY'], processes)
 
     # initialize some individuals by predefined classifiers
     pop = toolbox.pop(n=N_IND)
@@ -283,7 +242,7 @@ def evolve(Xsource, Ysource, Xtarget, Ytarget):
     classifiers.append(RandomForestClassifier(max_depth=5, n_estimators=10, random_state=np.random.randint(2 ** 10)))
     classifiers.append(AdaBoostClassifier(random_state=np.random.randint(2 ** 10)))
 
-    step = N_IND / len(classifiers)
+    step = N_IND // len(classifiers)
     for ind_index, classifier in enumerate(classifiers):
         classifier.fit(Xs, Ys)
         Yt_pseu = classifier.predict(Xt)
@@ -295,8 +254,8 @@ def evolve(Xsource, Ysource, Xtarget, Ytarget):
 
     # now initialize the beta
     # Beta, fitness, MMD, SRM, acc_s, acc_t, Yt_pseu
-    for ind in pop:
-        beta, fitness, _, _, _, _, Yt_pseu  = fit_predict_label(ind)
+    for ind, result in zip(pop, label_cache.map(fit_predict_label, pop, toolbox.map)):
+        beta, fitness, _, _, _, _, Yt_pseu = result
         ind.beta = beta
         ind.fitness.values = fitness,
         for idx in range(len(ind)):
@@ -309,7 +268,7 @@ def evolve(Xsource, Ysource, Xtarget, Ytarget):
         # print("=========== Iteration %d ===========" % g)
         # selection
         offspring_label = toolbox.select(pop, len(pop))
-        offspring_label = map(toolbox.clone, offspring_label)
+        offspring_label = list(map(toolbox.clone, offspring_label))
 
         # applying crossover
         for c1, c2 in zip(offspring_label[::2], offspring_label[1::2]):
@@ -326,17 +285,17 @@ def evolve(Xsource, Ysource, Xtarget, Ytarget):
                 del mutant.fitness.values
 
         inv_inds = [ind for ind in offspring_label if not ind.fitness.valid]
-        for inv_ind in inv_inds:
-            beta, fitness, _, _, _, _, Yt_pseu = fit_predict_label(inv_ind)
+        for inv_ind, result in zip(inv_inds, label_cache.map(fit_predict_label, inv_inds, toolbox.map)):
+            beta, fitness, _, _, _, _, Yt_pseu = result
             inv_ind.beta = beta
             inv_ind.fitness.values = fitness,
             for idx in range(len(inv_ind)):
                 inv_ind[idx] = Yt_pseu[idx]
 
         # Now using beta phase to evolve the current pop
-        offspring_beta = map(toolbox.clone, pop)
-        for ind in offspring_beta:
-            beta, fitness, _, _, _, _, Yt_pseu = fit_predict_beta(ind.beta)
+        offspring_beta = list(map(toolbox.clone, pop))
+        for ind, result in zip(offspring_beta, toolbox.map(fit_predict_beta, [ind.beta for ind in offspring_beta])):
+            beta, fitness, _, _, _, _, Yt_pseu = result
             ind.beta = beta
             ind.fitness.values = fitness,
             for idx in range(len(inv_ind)):
@@ -350,7 +309,7 @@ def evolve(Xsource, Ysource, Xtarget, Ytarget):
                 # if both approaches do not improve the fitness, indicate a local optima
                 # create a new one
                 new_label = re_initialize()
-                new_beta, new_fitness, _, _, _, _, new_label = fit_predict_label(new_label)
+                new_beta, new_fitness, _, _, _, _, new_label = label_cache.evaluate(fit_predict_label, new_label)
                 # store the current one to archive
                 archive_beta.append(ind.beta)
                 pseudo_labels = [ind[ins_idx] for ins_idx in range(len(ind))]
@@ -370,14 +329,17 @@ def evolve(Xsource, Ysource, Xtarget, Ytarget):
         best_ind = tools.selBest(pop, 1)[0]
         # print("Best fitness %f " % best_ind.fitness.values)
 
+    if pool is not None:
+        pool.close()
+
     # print("=========== Final result============")
     best_ind = tools.selBest(pop, 1)[0]
-    _, _, _, _, acc_s, acc_t, Yt_pseu = fit_predict_label(best_ind)
+    _, _, _, _, acc_s, acc_t, Yt_pseu = label_cache.evaluate(fit_predict_label, best_ind)
     print("Accuracy of the best individual: source - %f target - %f " %(acc_s, acc_t))
 
     labels = []
     for ind in pop:
-        _, _, _, _, _, _, Yt_pseu = fit_predict_label(ind)
+        _, _, _, _, _, _, Yt_pseu = label_cache.evaluate(fit_predict_label, ind)
         labels.append(Yt_pseu)
     labels = np.array(labels)
     vote_label = voting(labels)
@@ -397,7 +359,7 @@ def evolve(Xsource, Ysource, Xtarget, Ytarget):
     # Use the archive of label
     labels = []
     for label in archive_label:
-        _, _, _, _, _, _, Yt_pseu = fit_predict_label(label)
+        _, _, _, _, _, _, Yt_pseu = label_cache.evaluate(fit_predict_label, label)
         labels.append(Yt_pseu)
     labels = np.array(labels)
     vote_label = voting(labels)
@@ -406,19 +368,7 @@ def evolve(Xsource, Ysource, Xtarget, Ytarget):
 
 
 def voting(set_labels):
-    vote_label = []
-    ins_labels = []
-    for labels in set_labels:
-        tmp_labels = [labels[index] for index in range(len(labels))]
-        ins_labels.append(tmp_labels)
-    ins_labels = np.array(ins_labels)
-
-    for m_index in range(len(ins_labels[0])):
-        counts = np.bincount(ins_labels[:, m_index])
-        label = np.argmax(counts)
-        vote_label.append(label)
-
-    return vote_label
+    return Helpers.voting(set_labels)
 
 
 def index_duplicate(pop):
@@ -426,14 +376,7 @@ def index_duplicate(pop):
     :param pop: population
     :return: indices of the duplicated solutions
     '''
-    seen = []
-    idx_dup = []
-    for idx, ind in enumerate(pop):
-        if check_contain(ind, seen):
-            idx_dup.append(idx)
-        else:
-            seen.append(ind)
-    return idx_dup
+    return FitnessCache.duplicate_indices(pop)
 
 
 def check_contain(oneD, twoD):
@@ -445,7 +388,7 @@ def check_contain(oneD, twoD):
     '''
     if len(twoD) == 0:
         return False
-    return np.max([np.min(oneD == row) for row in twoD])
+    return bool(np.any(np.all(np.asarray(twoD) == np.asarray(oneD), axis=1)))
 
 
 def re_initialize():
@@ -474,36 +417,7 @@ def is_in(array, matrix):
     if len(matrix) == 0:
         return False
     else:
-        return np.any(np.sum(np.abs(matrix - array), axis=1) == 0)
-
-
-def laplacian_matrix(data, k):
-    """
-    :param data: containing data points,
-    :param k: the number of neighbors considered (this distance metric is cosine,
-    and the weights are measured by cosine)
-    :return:
-    """
-    nn = neighbors.NearestNeighbors(n_neighbors=k, algorithm='brute', metric='cosine')
-    nn.fit(data)
-    dist, nn = nn.kneighbors(return_distance=True)
-    sim = np.zeros((len(data), len(data)))
-    for ins_index in range(len(sim)):
-        dist_row = dist[ins_index]
-        nn_row = nn[ins_index]
-        for dist_value, ind_index in zip(dist_row, nn_row):
-            sim[ins_index][ind_index] = 1.0 - dist_value
-            sim[ind_index][ins_index] = 1.0 - dist_value
-    for i in range(len(sim)):
-        sim[i][i] = 1.0
-
-    S = [np.sum(row) for row in sim]
-
-    for i in range(len(sim)):
-        sim[i] = [sim[i][j] / (S[i] * S[j]) ** 0.5 for j in range(len(sim))]
-
-    L = np.identity(len(sim)) - sim
-    return L
+        return bool(np.any(np.all(np.asarray(matrix) == np.asarray(array), axis=1)))
 
 
 if __name__ == '__main__':
@@ -525,31 +439,7 @@ if __name__ == '__main__':
     for dataset in datasets:
         print('-------------------> %s <--------------------' % dataset)
         dir = Dir.dir + dataset
-        source = np.genfromtxt(dir + "/Source", delimiter=",")
-        m = source.shape[1] - 1
-        Xs = source[:, 0:m]
-        Ys = np.ravel(source[:, m:m + 1])
-        Ys = np.array([int(label) for label in Ys])
-
-        target = np.genfromtxt(dir + "/Target", delimiter=",")
-        Xt = target[:, 0:m]
-        Yt = np.ravel(target[:, m:m + 1])
-        Yt = np.array([int(label) for label in Yt])
-
-        C = len(np.unique(Ys))
-        if C > np.max(Ys):
-            Ys = Ys + 1
-            Yt = Yt + 1
-
-        Xs = Xs.T
-        Xs /= np.sum(Xs, axis=0)
-        Xs = Xs.T
-        Xs = stat.zscore(Xs)
-
-        Xt = Xt.T
-        Xt /= np.sum(Xt, axis=0)
-        Xt = Xt.T
-        Xt = stat.zscore(Xt)
+        Xs, Ys, Xt, Yt, C = Dataset.load(dir, normalize=True)
 
         #
         # Xt = Xt.T
@@ -16,37 +16,17 @@ from sklearn.tree import DecisionTreeClassifier
 from sklearn.ensemble import RandomForestClassifier, AdaBoostClassifier
 from sklearn.naive_bayes import GaussianNB
 from sklearn.discriminant_analysis import QuadraticDiscriminantAnalysis
+import Archive
+import Dataset
 import GFK
+import Helpers
+import MMDMatrix
+import Solver
 import time
 import os
 import copy
-
-
-def kernel(ker, X, X2, gamma):
-    if not ker or ker == 'primal':
-        return X
-    elif ker == 'linear':
-        if not X2:
-            K = np.dot(X.T, X)
-        else:
-            K = np.dot(X.T, X2)
-    elif ker == 'rbf':
-        n1sq = np.sum(X ** 2, axis=0)
-        n1 = X.shape[1]
-        if not X2:
-            D = (np.ones((n1, 1)) * n1sq).T + np.ones((n1, 1)) * n1sq - 2 * np.dot(X.T, X)
-        else:
-            n2sq = np.sum(X2 ** 2, axis=0)
-            n2 = X2.shape[1]
-            D = (np.ones((n2, 1)) * n1sq).T + np.ones((n1, 1)) * n2sq - 2 * np.dot(X.T, X)
-        K = np.exp(-gamma * D)
-    elif ker == 'sam':
-        if not X2:
-            D = np.dot(X.T, X)
-        else:
-            D = np.dot(X.T, X2)
-        K = np.exp(-gamma * np.arccos(D) ** 2)
-    return K
+import Labels
+from Kernel import kernel
 
 
 def proxy_a_distance(source_X, target_X):
@@ -97,7 +77,6 @@ class Random_MEDA:
         self.nt = 0
         self.C = 0
 
-        self.M0 = None
         self.A = None
         self.K = None
         self.YY = None  # 1 hot coding
@@ -139,14 +118,8 @@ class Random_MEDA:
         # build some matrices that are not changed
         self.K = kernel(self.kernel_type, X, X2=None, gamma=self.gamma)
         self.A = np.diagflat(np.vstack((np.ones((self.ns, 1)), np.zeros((self.nt, 1)))))
-        e = np.vstack((1.0 / self.ns * np.ones((self.ns, 1)), -1.0 / self.nt * np.ones((self.nt, 1))))
-        self.M0 = e * e.T * self.C
 
-        self.YY = np.zeros((self.ns, self.C))
-        for c in range(1, self.C + 1):
-            ind = np.where(self.Ys == c)
-            self.YY[ind, c - 1] = 1
-        self.YY = np.vstack((self.YY, np.zeros((self.nt, self.C))))
+        self.YY = Labels.one_hot(self.Ys, self.C, n=self.ns + self.nt)
 
         N = 10
         GEN = 100
@@ -273,12 +246,7 @@ class Random_MEDA:
                     Yt_pseu = Y_pseudo[self.ns:].tolist()
                     all_labels.append(Yt_pseu)
                 all_labels = np.array(all_labels)
-                vote_label = []
-                for ins_idx in range(all_labels.shape[1]):
-                    ins_labels = all_labels[:, ins_idx]
-                    counts = np.bincount(ins_labels)
-                    label = np.argmax(counts)
-                    vote_label.append(label)
+                vote_label, _ = Helpers.vote(all_labels)
                 acc = np.mean(vote_label == Yt)
                 toPrint += ("Accuracy temp archive:" + str(acc) + "\n")
 
@@ -307,12 +275,7 @@ class Random_MEDA:
             Yt_pseu = Y_pseudo[self.ns:].tolist()
             all_labels.append(Yt_pseu)
         all_labels = np.array(all_labels)
-        vote_label = []
-        for ins_idx in range(all_labels.shape[1]):
-            ins_labels = all_labels[:, ins_idx]
-            counts = np.bincount(ins_labels)
-            label = np.argmax(counts)
-            vote_label.append(label)
+        vote_label, _ = Helpers.vote(all_labels)
         acc = np.mean(vote_label == Yt)
         toPrint += ("Accuracy archive:" + str(acc) + "\n")
 
@@ -330,12 +293,7 @@ class Random_MEDA:
             Yt_pseu = Y_pseudo[self.ns:].tolist()
             all_labels.append(Yt_pseu)
         all_labels = np.array(all_labels)
-        vote_label = []
-        for ins_idx in range(all_labels.shape[1]):
-            ins_labels = all_labels[:, ins_idx]
-            counts = np.bincount(ins_labels)
-            label = np.argmax(counts)
-            vote_label.append(label)
+        vote_label, _ = Helpers.vote(all_labels)
         acc = np.mean(vote_label == Yt)
         toPrint += ("Accuracy non-dominated:" + str(acc) + "\n")
 
@@ -353,25 +311,9 @@ class Random_MEDA:
     def initialize_with_label(self, label):
         Yt_pseu = label
         mu = 0.5
-        N = 0
-        for c in range(1, self.C + 1):
-            e = np.zeros((self.ns + self.nt, 1))
-            tt = self.Ys == c
-            e[np.where(tt == True)] = 1.0 / len(self.Ys[np.where(self.Ys == c)])
-            yy = Yt_pseu == c
-            ind = np.where(yy == True)
-            inds = [item + self.ns for item in ind]
-            if len(Yt_pseu[np.where(Yt_pseu == c)]) == 0:
-                e[tuple(inds)] = 0.0
-            else:
-                e[tuple(inds)] = -1.0 / len(Yt_pseu[np.where(Yt_pseu == c)])
-            e[np.isinf(e)] = 0
-            N += np.dot(e, e.T)
-        M = (1 - mu) * self.M0 + mu * N
-        M /= np.linalg.norm(M, 'fro')
-        left = np.dot(self.A + self.lamb * M + self.rho * self.L, self.K) \
-               + self.eta * np.eye(self.ns + self.nt, self.ns + self.nt)
-        Beta = np.dot(np.linalg.inv(left), np.dot(self.A, self.YY))
+        M = MMDMatrix.MMDOperator(self.Ys, Yt_pseu, self.C, mu=mu)
+        Beta = Solver.meda_beta(self.A + self.rho * self.L, self.K, np.dot(self.A, self.YY), self.eta,
+                                mmd=M, lamb=self.lamb)
         return Beta
 
     def initialize_with_classifier(self, classifier):
@@ -380,27 +322,7 @@ class Random_MEDA:
         return self.initialize_with_label(Yt_pseu)
 
     def get_non_dominated(self, archive, archive_smr, archive_mmd):
-        indices = []
-        for index in range(len(archive)):
-            if len(indices) == 0:
-                indices.append(index)
-            else:
-                # go through each item to check
-                be_dominated = False
-                cur_smr = archive_smr[index]
-                cur_mmd = archive_mmd[index]
-                to_remove = []
-                for store_index in indices:
-                    if archive_smr[store_index] <= cur_smr and archive_mmd[store_index] <= cur_mmd:
-                        be_dominated = True
-                        break
-                    elif archive_smr[store_index] > cur_smr and archive_mmd[store_index] > cur_mmd:
-                        to_remove.append(store_index)
-
-                if not be_dominated:
-                    indices.append(index)
-                    indices = [index for index in indices if index not in to_remove]
-        return indices
+        return Archive.non_dominated(archive_smr, archive_mmd)
 
     def re_initialize(self, pop, best, pos_min, pos_max, archive_label, strategy=0):
         NBIT = best.shape[0] * best.shape[1]
@@ -448,34 +370,18 @@ class Random_MEDA:
         Yt_pseu = Y_pseudo[self.ns:]
 
         mu = 0.5
-        N = 0
-        for c in range(1, self.C + 1):
-            e = np.zeros((self.ns + self.nt, 1))
-            tt = self.Ys == c
-            e[np.where(tt == True)] = 1.0 / len(self.Ys[np.where(self.Ys == c)])
-            yy = Yt_pseu == c
-            ind = np.where(yy == True)
-            inds = [item + self.ns for item in ind]
-            if len(Yt_pseu[np.where(Yt_pseu == c)]) == 0:
-                e[tuple(inds)] = 0.0
-            else:
-                e[tuple(inds)] = -1.0 / len(Yt_pseu[np.where(Yt_pseu == c)])
-            e[np.isinf(e)] = 0
-            N += np.dot(e, e.T)
-        M = (1 - mu) * self.M0 + mu * N
-        M /= np.linalg.norm(M, 'fro')
-        left = np.dot(self.A + self.lamb * M + self.rho * self.L, self.K) \
-               + self.eta * np.eye(self.ns + self.nt, self.ns + self.nt)
-        Beta = np.dot(np.linalg.inv(left), np.dot(self.A, self.YY))
+        M = MMDMatrix.MMDOperator(self.Ys, Yt_pseu, self.C, mu=mu)
+        Beta = Solver.meda_beta(self.A + self.rho * self.L, self.K, np.dot(self.A, self.YY), self.eta,
+                                mmd=M, lamb=self.lamb)
 
         # Now given the new beta, calculate the fitness
-        SRM = np.linalg.norm(np.dot(self.YY.T - np.dot(Beta.T, self.K), self.A)) \
-              + self.eta * np.linalg.multi_dot([Beta.T, self.K, Beta]).trace()
-        MMD = self.lamb * np.linalg.multi_dot([Beta.T, np.linalg.multi_dot([self.K, M, self.K]), Beta]).trace()
+        F = np.dot(self.K, Beta)
+        SRM = np.linalg.norm(np.dot(self.YY.T - F.T, self.A)) \
+              + self.eta * np.sum(Beta * F)
+        MMD = self.lamb * M.quad_trace(F)
         fitness = SRM + MMD
 
         # Calcuate the accuracy
-        F = np.dot(self.K, Beta)
         Y_pseudo = np.argmax(F, axis=1) + 1
         Ys_pseu = Y_pseudo[:self.ns]
         acc_s = np.mean(Ys_pseu == self.Ys)
@@ -492,16 +398,7 @@ if __name__ == '__main__':
     archive_size = 10  # size of archive to be ok for using in creating new (using with label/mix label and random)
     random_rate = 0.5  # arg[4] can be 1,2,3,.., 10 -> 0.1, 0.2, 0.3,...,1.0
 
-    source = np.genfromtxt("Source", delimiter=",")
-    m = source.shape[1] - 1
-    Xs = source[:, 0:m]
-    Ys = np.ravel(source[:, m:m + 1])
-    Ys = np.array([int(label) for label in Ys])
-
-    target = np.genfromtxt("Target", delimiter=",")
-    Xt = target[:, 0:m]
-    Yt = np.ravel(target[:, m:m + 1])
-    Yt = np.array([int(label) for label in Yt])
+    Xs, Ys, Xt, Yt, C = Dataset.load()
 
     r_meda = Random_MEDA(kernel_type='rbf', dim=20, lamb=10, rho=1.0, eta=0.1, p=10, gamma=0.5, T=10,
                          init_op=init_op, re_init_op=re_init_op,
@@ -0,0 +1,254 @@
+'''
+SQLite store of the results of the runs, and the aggregations of the result
+tables, instead of scanning the text logs of every run for every table.
+
+    runs(id, dataset, method, run, acc, time, params)  one row per run
+    metrics(run_id, name, value)                       other values of a run (nn_acc, meda_acc, ...)
+    generations(run_id, gen, fitness, srm, mmd,        one row per generation
+                diversity, best_acc, top10_acc, pop_acc, src_acc, tar_acc, time)
+
+The runs are added from the records written by RunLogger, from the result
+files of Experiment, or, for the runs logged before them, parsed once from
+their text logs. A table is then one grouped query over all the runs:
+
+    store = ResultStore.ResultStore('results.sqlite')
+    store.import_log('SURFa-c', 'GA-MEDA', 1, 'SURFa-c/GA-MEDA/1.txt', acc='evolved_acc')
+    acc = store.table(['SURFa-c'], ['GA-MEDA'], 'acc', scale=100)
+'''
+import json
+import sqlite3
+
+import numpy as np
+
+import RunLogger
+
+GENERATION_COLUMNS = ('fitness', 'srm', 'mmd', 'diversity', 'best_acc', 'top10_acc', 'pop_acc',
+                      'src_acc', 'tar_acc', 'time')
+RUN_COLUMNS = ('acc', 'time')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    dataset TEXT NOT NULL,
+    method TEXT NOT NULL,
+    run INTEGER NOT NULL,
+    acc REAL,
+    time REAL,
+    params TEXT,
+    UNIQUE (dataset, method, run)
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (run_id, name)
+);
+CREATE TABLE IF NOT EXISTS generations (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    gen INTEGER NOT NULL,
+    %s,
+    PRIMARY KEY (run_id, gen)
+);
+''' % ',\n    '.join('%s REAL' % column for column in GENERATION_COLUMNS)
+
+# lines of the text logs of GA-MEDA and R-MEDA, and the value they hold
+LOG_LINES = [('1NN accuracy', 'nn_acc'),
+             ('GA-MEDA time', 'time'),
+             ('MEDA accuracy', 'meda_acc'),
+             ('MEDA time', 'meda_time'),
+             ('Average distance', 'diversity'),
+             ('Best fitness', 'fitness'),
+             ('Accuracy of the evovled best individual', 'evolved_acc'),
+             ('Accuracy of the best individual', 'best_acc'),
+             ('Accuracy of the 10% population', 'top10_acc'),
+             ('Accuracy of the population', 'pop_acc'),
+             ('Accuracy of the archive', 'archive_acc'),
+             ('Accuracy archive', 'archive_acc'),
+             ('Accuracy non-dominated', 'front_acc'),
+             ('Accuracy best', 'best_acc'),
+             ('Execution time', 'time')]
+
+
+def parse_log(path):
+    '''
+    Values of a text log of GA-MEDA or R-MEDA. The values of the GA-MEDA
+    iterations are generation values, the ones after '*****Final result*****'
+    (or outside any iteration) are values of the run.
+    :return: dict of the run values, list of dicts of the generation values
+    '''
+    values = {}
+    generations = []
+    current = values
+    with open(path) as f:
+        for line in f:
+            if line.startswith('*****Iteration'):
+                current = {'gen': int(line.strip('*\n').split()[1])}
+                generations.append(current)
+                continue
+            if line.startswith('*****Final result'):
+                current = values
+                continue
+            for prefix, name in LOG_LINES:
+                if line.startswith(prefix):
+                    current[name] = float(line.split(':')[1])
+                    break
+    return values, generations
+
+
+class ResultStore:
+    def __init__(self, path):
+        '''
+        :param path: file of the database, created if it does not exist (':memory:' for a temporary one)
+        '''
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def has_run(self, dataset, method, run):
+        cursor = self.connection.execute('SELECT 1 FROM runs WHERE dataset = ? AND method = ? AND run = ?',
+                                         (dataset, method, run))
+        return cursor.fetchone() is not None
+
+    def add_run(self, dataset, method, run, acc=None, time=None, params=None, metrics=None, generations=None):
+        '''
+        Add a run, replacing the stored one with the same dataset, method and run index
+        :param params: dict of the parameters of the run
+        :param metrics: dict of other values of the run
+        :param generations: list of dicts of generation values, with their 'gen'
+        :return: id of the run
+        '''
+        with self.connection:
+            self.connection.execute('DELETE FROM runs WHERE dataset = ? AND method = ? AND run = ?',
+                                    (dataset, method, run))
+            cursor = self.connection.execute(
+                'INSERT INTO runs (dataset, method, run, acc, time, params) VALUES (?, ?, ?, ?, ?, ?)',
+                (dataset, method, run, acc, time, json.dumps(params, default=float) if params else None))
+            run_id = cursor.lastrowid
+            if metrics:
+                self.connection.executemany('INSERT INTO metrics (run_id, name, value) VALUES (?, ?, ?)',
+                                            [(run_id, name, float(value)) for name, value in metrics.items()])
+            if generations:
+                self.connection.executemany(
+                    'INSERT OR REPLACE INTO generations (run_id, gen, %s) VALUES (?, ?%s)'
+                    % (', '.join(GENERATION_COLUMNS), ', ?' * len(GENERATION_COLUMNS)),
+                    [(run_id, int(record['gen'])) + tuple(record.get(column) for column in GENERATION_COLUMNS)
+                     for record in generations])
+        return run_id
+
+    def import_log(self, dataset, method, run, path, acc='archive_acc'):
+        '''
+        Add a run from its text log, see parse_log
+        :param acc: value used as the accuracy of the run, e.g. 'evolved_acc' for GA-MEDA
+        '''
+        values, generations = parse_log(path)
+        return self.add_run(dataset, method, run, acc=values.get(acc), time=values.get('time'),
+                            metrics=values, generations=generations)
+
+    def import_records(self, dataset, method, run, path, acc='archive_acc'):
+        '''
+        Add a run from the records file written by RunLogger
+        :param acc: value of the final record used as the accuracy of the run
+        '''
+        values = {}
+        generations = []
+        for record in RunLogger.read_records(path):
+            event = record.pop('event', None)
+            if event == 'generation':
+                generations.append(record)
+            elif event == 'final':
+                values.update(record)
+        values = dict((name, value) for name, value in values.items() if isinstance(value, (int, float)))
+        return self.add_run(dataset, method, run, acc=values.get(acc), time=values.get('time'),
+                            metrics=values, generations=generations)
+
+    def import_results(self, results):
+        '''
+        Add the results of Experiment (see Experiment.collect)
+        :return: number of runs added
+        '''
+        for result in results:
+            params = dict((key, value) for key, value in result.items()
+                          if key not in ('dataset', 'method', 'run', 'acc', 'time', 'list_acc'))
+            metrics = dict((key, value) for key, value in params.items()
+                           if isinstance(value, (int, float)) and not isinstance(value, bool))
+            self.add_run(result['dataset'], result['method'], result['run'], acc=result.get('acc'),
+                         time=result.get('time'), params=params, metrics=metrics)
+        return len(results)
+
+    def value_query(self, column, datasets, methods, select):
+        '''
+        :param column: 'acc', 'time' or the name of a metric
+        :return: sql query of select over the runs of the datasets and methods, and its parameters
+        '''
+        where = 'runs.dataset IN (%s) AND runs.method IN (%s)' % (
+            ', '.join('?' * len(datasets)), ', '.join('?' * len(methods)))
+        parameters = list(datasets) + list(methods)
+        if column in RUN_COLUMNS:
+            return 'SELECT %s FROM runs WHERE %s' % (select % ('runs.' + column), where), parameters
+        return ('SELECT %s FROM runs JOIN metrics ON metrics.run_id = runs.id WHERE metrics.name = ? AND %s'
+                % (select % 'metrics.value', where), [column] + parameters)
+
+    def table(self, datasets, methods, column='acc', scale=1.0):
+        '''
+        Mean of a value over the runs of each dataset and method, e.g. the accuracy or time table
+        :return: dict {'Datasets': datasets, method: means in the order of datasets}
+        (nan where there is no run)
+        '''
+        query, parameters = self.value_query(column, datasets, methods,
+                                             'runs.dataset, runs.method, AVG(%s)')
+        means = dict(((dataset, method), value) for dataset, method, value in
+                     self.connection.execute(query + ' GROUP BY runs.dataset, runs.method', parameters))
+        table = {'Datasets': list(datasets)}
+        for method in methods:
+            table[method] = [scale * means[dataset, method] if means.get((dataset, method)) is not None
+                             else np.nan for dataset in datasets]
+        return table
+
+    def run_values(self, dataset, methods, column='acc'):
+        '''
+        Values of each run, e.g. the inputs of a significance test
+        :return: dict {method: array of the values, ordered by run index}
+        '''
+        query, parameters = self.value_query(column, [dataset], methods, 'runs.method, %s')
+        values = dict((method, []) for method in methods)
+        for method, value in self.connection.execute(query + ' ORDER BY runs.run', parameters):
+            values[method].append(value)
+        return dict((method, np.array(value, dtype=float)) for method, value in values.items())
+
+    def convergence(self, datasets, method, column='diversity', runs=None):
+        '''
+        Mean of a generation value over the runs, at each generation
+        :param runs: run indices to average, all the stored runs if None
+        :return: dict {dataset: (generations, means)}
+        '''
+        if column not in GENERATION_COLUMNS:
+            raise ValueError('Unknown generation value %s, expected one of %s'
+                             % (column, ', '.join(GENERATION_COLUMNS)))
+        query = ('SELECT runs.dataset, generations.gen, AVG(generations.%s) FROM generations '
+                 'JOIN runs ON generations.run_id = runs.id '
+                 'WHERE runs.method = ? AND runs.dataset IN (%s)'
+                 % (column, ', '.join('?' * len(datasets))))
+        parameters = [method] + list(datasets)
+        if runs is not None:
+            runs = list(runs)
+            query += ' AND runs.run IN (%s)' % ', '.join('?' * len(runs))
+            parameters += runs
+        query += ' GROUP BY runs.dataset, generations.gen ORDER BY runs.dataset, generations.gen'
+        rows = {}
+        for dataset, gen, value in self.connection.execute(query, parameters):
+            rows.setdefault(dataset, []).append((gen, value))
+        curves = {}
+        for dataset in datasets:
+            gens, values = zip(*rows[dataset]) if dataset in rows else ((), ())
+            curves[dataset] = (np.array(gens, dtype=int), np.array(values, dtype=float))
+        return curves
@@ -0,0 +1,137 @@
+'''
+Streaming log of a run: the text lines and per-generation records are
+written as they are produced instead of being accumulated in one string
+written at the end, so a long run keeps no log in memory and an
+interrupted one keeps everything up to its last flush.
+
+    log = RunLogger.RunLogger('1.txt', records='1.jsonl')
+    log.write('Best: %f\n' % best_fitness)
+    log.record(gen=g, fitness=best_fitness, tar_acc=acc, time=elapsed)
+    log.close()
+
+The records file has one JSON object per line, e.g. read back with
+RunLogger.read_records('1.jsonl').
+'''
+import json
+import time
+
+import numpy as np
+
+
+def to_json(value):
+    '''
+    json.dump default: numpy scalars and arrays as Python numbers and lists
+    '''
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError('%r is not JSON serializable' % (value,))
+
+
+def read_records(path):
+    '''
+    :return: list of the records of a records file, a truncated last line is ignored
+    '''
+    records = []
+    with open(path) as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+    return records
+
+
+class RunLogger:
+    def __init__(self, out=None, records=None, flush_interval=5.0, mode='w'):
+        '''
+        :param out: file name or open file (e.g. sys.stdout) of the text log, None for no text log
+        :param records: file name or open file of the JSON lines records, None for no records
+        :param flush_interval: seconds between two flushes, 0 to flush every write
+        :param mode: 'w' to start new files, 'a' to append to them (e.g. a resumed run)
+        '''
+        self.out, self.own_out = self.open(out, mode)
+        self.records, self.own_records = self.open(records, mode)
+        self.flush_interval = flush_interval
+        self.last_flush = time.time()
+        self.count = 0
+
+    @staticmethod
+    def open(target, mode):
+        if target is None or not isinstance(target, str):
+            return target, False
+        return open(target, mode), True
+
+    def write(self, text):
+        if self.out is not None:
+            self.out.write(text)
+            self.tick()
+
+    def record(self, **values):
+        '''
+        Append one record, numpy values are converted
+        '''
+        if self.records is not None:
+            self.records.write(json.dumps(values, default=to_json) + '\n')
+            self.count += 1
+            self.tick()
+
+    def tick(self):
+        if time.time() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        for f in (self.out, self.records):
+            if f is not None:
+                f.flush()
+        self.last_flush = time.time()
+
+    def mark(self):
+        '''
+        Flush, and return the positions in the files, to rewind them when a run
+        resumes from a checkpoint taken now (None for a stream without position)
+        '''
+        self.flush()
+        return tuple(self.position(f) for f in (self.out, self.records))
+
+    @staticmethod
+    def position(f):
+        try:
+            return None if f is None else f.tell()
+        except (AttributeError, OSError, ValueError):
+            return None
+
+    def rewind(self, mark):
+        '''
+        Drop what was written after mark, i.e. the lines of the generations a
+        resumed run does again. A file shorter than its mark (e.g. a new one)
+        is left as it is.
+        '''
+        for f, position in zip((self.out, self.records), mark):
+            if f is None or position is None:
+                continue
+            try:
+                f.seek(0, 2)
+                if position <= f.tell():
+                    f.seek(position)
+                    f.truncate()
+            except (AttributeError, OSError, ValueError):
+                pass
+
+    def close(self):
+        '''
+        Flush, and close the files opened by the logger (not the ones it was given)
+        '''
+        self.flush()
+        if self.own_out:
+            self.out.close()
+        if self.own_records:
+            self.records.close()
+        self.out = self.records = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
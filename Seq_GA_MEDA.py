@@ -5,7 +5,13 @@ from deap import base, creator, tools
 from sklearn import svm, metrics, neighbors
 from scipy.spatial.distance import pdist,squareform
 
-import GFK
+import Dataset
+import DomainContext
+import Helpers
+import MMDMatrix
+import Parallel
+import Solver
+import sys
 
 from sklearn.svm import SVC
 from sklearn.gaussian_process import GaussianProcessClassifier
@@ -16,38 +22,13 @@ from sklearn.naive_bayes import GaussianNB
 from sklearn import svm
 from sklearn.neighbors import KNeighborsClassifier
 import Directory as Dir
+import Labels
+from Kernel import kernel
 
 
 # from scoop import futures
 # toolbox.register("map", futures.map)
 # for parallel
-def kernel(ker, X, X2, gamma):
-    if not ker or ker == 'primal':
-        return X
-    elif ker == 'linear':
-        if not X2:
-            K = np.dot(X.T, X)
-        else:
-            K = np.dot(X.T, X2)
-    elif ker == 'rbf':
-        n1sq = np.sum(X ** 2, axis=0)
-        n1 = X.shape[1]
-        if not X2:
-            D = (np.ones((n1, 1)) * n1sq).T + np.ones((n1, 1)) * n1sq - 2 * np.dot(X.T, X)
-        else:
-            n2sq = np.sum(X2 ** 2, axis=0)
-            n2 = X2.shape[1]
-            D = (np.ones((n2, 1)) * n1sq).T + np.ones((n1, 1)) * n2sq - 2 * np.dot(X.T, X)
-        K = np.exp(-gamma * D)
-    elif ker == 'sam':
-        if not X2:
-            D = np.dot(X.T, X)
-        else:
-            D = np.dot(X.T, X2)
-        K = np.exp(-gamma * np.arccos(D) ** 2)
-    return K
-
-
 def proxy_a_distance(source_X, target_X):
     """
     Compute the Proxy-A-Distance of a source/target representation
@@ -102,13 +83,8 @@ random_rate = 0.5
 def manifold(Yt_input):
     Yt_pseu = np.array(np.copy(Yt_input))
     Y_pseu = np.append(Ys, Yt_pseu)
-    one_hot = np.zeros((len(Y_pseu), C))
-    for c in range(1, C+1):
-        tt = Y_pseu == c
-        for index in np.where(tt == True)[0]:
-            one_hot[index][c-1] = 1
-    return np.sum([sim[i][j]*np.linalg.norm(Y_pseu[i]-Y_pseu[j])
-                   for i in range(len(sim)) for j in range(len(sim))])
+    # sum of sim[i][j] * |Y_pseu[i] - Y_pseu[j]| over all the pairs
+    return np.sum(sim * np.abs(Y_pseu[:, None] - Y_pseu[None, :]))
 
 
 def reverse_clsasification(Yt_input):
@@ -164,32 +140,10 @@ def meda(Yt_init, T):
     Yt_pseu = np.array(np.copy(Yt_init))
     for t in range(1, T+1):
         mu = estimate_mu(Xs, Ys, Xt, Yt_pseu)
-        N = 0
-        for c in range(1, C + 1):
-            e = np.zeros((ns + nt, 1))
-            tt = Ys == c
-            e[np.where(tt == True)] = 1.0 / len(Ys[np.where(Ys == c)])
-            yy = Yt_pseu == c
-            ind = np.where(yy == True)
-            inds = [item + ns for item in ind]
-            if len(Yt_pseu[np.where(Yt_pseu == c)]) == 0:
-                e[tuple(inds)] = 0.0
-            else:
-                e[tuple(inds)] = -1.0 / len(Yt_pseu[np.where(Yt_pseu == c)])
-            e[np.isinf(e)] = 0
-            N += np.dot(e, e.T)
-        M = (1 - mu) * M0 + mu * N
-        M /= np.linalg.norm(M, 'fro')
-        left = np.dot(A + lamb * M + rho * L, K) \
-            + eta * np.eye(ns + nt, ns + nt)
-        Beta = np.dot(np.linalg.inv(left), np.dot(A, YY))
-
-        Ytest = np.copy(YY)
-        for c in range(1, C+1):
-            yy = Yt_pseu == c
-            inds = np.where(yy == True)
-            inds = [item + ns for item in inds]
-            Ytest[inds, c-1] = 1
+        M = MMDMatrix.MMDOperator(Ys, Yt_pseu, C, mu=mu)
+        Beta = Solver.meda_beta(A + rho * L, K, A.dot(YY), eta, mmd=M, lamb=lamb)
+
+        Ytest = Labels.one_hot(np.concatenate((Ys, Yt_pseu)), C)
 
         # Now given the new beta, calculate the fitness
         # For testing only
@@ -204,7 +158,7 @@ def meda(Yt_init, T):
     return Yt_pseu
 
 
-def evolve(Xsource, Ysource, Xtarget, Ytarget):
+def evolve(Xsource, Ysource, Xtarget, Ytarget, context=None, processes=1):
     """
     Running GA algorithms, where each individual is a set of target pseudo labels.
     :return: the best solution of GAs.
@@ -217,28 +171,19 @@ def evolve(Xsource, Ysource, Xtarget, Ytarget):
     ns, nt = Xs.shape[0], Xt.shape[0]
     C = len(np.unique(Ys))
 
-    # Transform data using gfk
-    gfk = GFK.GFK(dim=dim)
-    _, Xs_new, Xt_new = gfk.fit(Xs, Xt)
-    Xs_new, Xt_new = Xs_new.T, Xt_new.T
-    X = np.hstack((Xs_new, Xt_new))
-    X /= np.linalg.norm(X, axis=0)
-    Xs = X[:, :ns].T
-    Xt = X[:, ns:].T
+    # Transform data using gfk, shared through the context
+    if context is None:
+        context = DomainContext.DomainPairContext(Xs, Ys, Xt, Yt, dim=dim)
+    Xs = context.Xs
+    Xt = context.Xt
 
     # build some matrices that are not changed
-    K = kernel(kernel_type, X, X2=None, gamma=gamma)
-    A = np.diagflat(np.vstack((np.ones((ns, 1)), np.zeros((nt, 1)))))
-    e = np.vstack((1.0 / ns * np.ones((ns, 1)), -1.0 / nt * np.ones((nt, 1))))
-    M0 = e * e.T * C
-    L = laplacian_matrix(X.T, p)
-    sim = simliarity_matrix(X.T, p)
-
-    YY = np.zeros((ns, C))
-    for c in range(1, C + 1):
-        ind = np.where(Ys == c)
-        YY[ind, c - 1] = 1
-    YY = np.vstack((YY, np.zeros((nt, C))))
+    K = context.kernel(kernel_type, gamma)
+    A = context.A
+    L = context.laplacian(p, sparse=True)
+    sim = Helpers.similarity_matrix(context.X.T, p)
+
+    YY = context.YY
 
     # for testing
     knn = KNeighborsClassifier(1)
@@ -277,8 +222,9 @@ def evolve(Xsource, Ysource, Xtarget, Ytarget):
     toolbox.register("crossover", tools.cxUniform, indpb=0.5 )
     toolbox.register("mutate", tools.mutUniformInt, low=pos_min, up=pos_max,
                      indpb=MUTATION_RATE)
-    # pool = multiprocessing.Pool(4)
-    # toolbox.register("map", pool.map)
+    # evaluate in a process pool, the globals read by the workers go through shared memory
+    pool = Parallel.register(toolbox, sys.modules[__name__],
+                             ['Xs', 'Ys', 'Xt'], processes)
 
     # initialize some individuals by predefined classifiers
     pop = toolbox.pop(n=N_IND)
@@ -311,7 +257,7 @@ def evolve(Xsource, Ysource, Xtarget, Ytarget):
     acc = np.mean(Yt_pseu == Yt)
     print("En-MEDA accuracy: %f" %acc)
 
-    step = N_IND/len(classifiers)
+    step = N_IND // len(classifiers)
     for ind_index in range(len(classifiers)):
         if ind_index * step < len(pop):
             Yt_pseu = class_labels[ind_index]
@@ -324,6 +270,7 @@ def evolve(Xsource, Ysource, Xtarget, Ytarget):
     #     pop[len(pop)-1][index] = Yt[index]
 
     # evaluate the initialized populations
+    # not memoized: the fitness trains classifiers with random seeds, so it is a noisy sample
     start_fitness = toolbox.map(toolbox.evaluate, pop)
     for ind, fit in zip(pop, start_fitness):
         ind.fitness.values = fit,
@@ -336,7 +283,7 @@ def evolve(Xsource, Ysource, Xtarget, Ytarget):
 
         # selection
         offspring = toolbox.select(pop, len(pop))
-        offspring = map(toolbox.clone, offspring)
+        offspring = list(map(toolbox.clone, offspring))
 
         # applying crossover
         for c1, c2 in zip(offspring[::2], offspring[1::2]):
@@ -362,12 +309,8 @@ def evolve(Xsource, Ysource, Xtarget, Ytarget):
         best_ind = tools.selBest(pop, 1)[0]
         # print("Best fitness %f " % best_ind.fitness.values)
 
-        # Find the distance between ind
-        dist = 0
-        for i1 in range(len(pop)):
-            for i2 in range(len(pop)):
-                dist += np.linalg.norm(np.array(pop[i1])-np.array(pop[i2]))
-        # print("Distance %f" %(dist/len(pop)**2))
+    if pool is not None:
+        pool.close()
 
     # print("=========== Final result============")
 
@@ -428,53 +371,7 @@ def is_in(array, matrix):
 
 
 def voting(set_labels):
-    vote_label = []
-    ins_labels = []
-    for labels in set_labels:
-        tmp_labels = [labels[index] for index in range(len(labels))]
-        ins_labels.append(tmp_labels)
-    ins_labels = np.array(ins_labels)
-
-    for m_index in range(len(ins_labels[0])):
-        counts = np.bincount(ins_labels[:, m_index])
-        label = np.argmax(counts)
-        vote_label.append(label)
-
-    return vote_label
-
-def simliarity_matrix(data, k):
-    nn = neighbors.NearestNeighbors(n_neighbors=k, algorithm='brute', metric='cosine')
-    nn.fit(data)
-    dist, nn = nn.kneighbors(return_distance=True)
-    sim = np.zeros((len(data), len(data)))
-    for ins_index in range(len(sim)):
-        dist_row = dist[ins_index]
-        nn_row = nn[ins_index]
-        for dist_value, ind_index in zip(dist_row, nn_row):
-            sim[ins_index][ind_index] = 1.0 - dist_value
-            sim[ind_index][ins_index] = 1.0 - dist_value
-    for i in range(len(sim)):
-        sim[i][i] = 1.0
-    return sim
-
-
-def laplacian_matrix(data, k):
-    """
-    :param data: containing data points,
-    :param k: the number of neighbors considered (this distance metric is cosine,
-    and the weights are measured by cosine)
-    :return:
-    """
-    sim = simliarity_matrix(data, k)
-
-    S = [np.sum(row) for row in sim]
-
-    for i in range(len(sim)):
-        sim[i] = [sim[i][j]/(S[i]*S[j])**0.5 for j in range(len(sim))]
-
-    L = np.identity(len(sim)) - sim
-    return L
-
+    return Helpers.voting(set_labels)
 
 if __name__ == '__main__':
     import sys
@@ -498,21 +395,7 @@ if __name__ == '__main__':
     for dataset in datasets:
         print("==========%s=========" %dataset)
         dir = Dir.dir + dataset
-        source = np.genfromtxt(dir + "/Source", delimiter=",")
-        m = source.shape[1] - 1
-        Xs = source[:, 0:m]
-        Ys = np.ravel(source[:, m:m + 1])
-        Ys = np.array([int(label) for label in Ys])
-
-        target = np.genfromtxt(dir + "/Target", delimiter=",")
-        Xt = target[:, 0:m]
-        Yt = np.ravel(target[:, m:m + 1])
-        Yt = np.array([int(label) for label in Yt])
-
-        # require all the labels start from 1
-        if np.min(np.unique(Ys)) == 0:
-            Ys = Ys+1
-            Yt = Yt+1
+        Xs, Ys, Xt, Yt, C = Dataset.load(dir)
 
         np.random.seed(random_seed)
         random.seed(random_seed)
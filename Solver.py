@@ -0,0 +1,255 @@
+'''
+Linear solvers for the MEDA system
+
+    ((A + lamb * M + rho * L) * K + eta * I) * Beta = A * YY
+
+The left-hand side is (ns+nt)*(ns+nt) but the right-hand side only has C
+columns, so the system is factorized once and solved for those C columns
+instead of explicitly inverting the left-hand side. When the kernel is
+given as a low-rank factor K = Z * Z' (see Kernel), the system is solved in
+the rank-r space instead.
+
+Algorithms that solve the system many times with different pseudo labels
+(R-MEDA, the GA-MEDA local search) only change M. WoodburySolver factorizes
+the fixed part (A + rho * L) * K + eta * I once and, since lamb * M * K has
+rank C+1, applies the label-dependent part as a rank-(C+1) correction with
+the Woodbury identity: each solve is exact and costs O(n^2 * C). GMRESSolver
+uses the same factorization to precondition GMRES, which converges in about
+C+2 iterations of O(n^2 * C) each; it can be started from a known Beta (x0),
+and keeps no state between solves, so the same M and x0 give the same Beta.
+'''
+import time
+
+import numpy as np
+import scipy.linalg
+import scipy.sparse.linalg
+
+
+def factorize(left, overwrite=False):
+    '''
+    LU-factorize the left-hand side of the MEDA system
+    :param left: n*n matrix
+    :param overwrite: allow the factorization to reuse the memory of left
+    :return: the factorization, to be used in solve_factorized
+    '''
+    return scipy.linalg.lu_factor(left, overwrite_a=overwrite, check_finite=False)
+
+
+def solve_factorized(lu, right):
+    '''
+    Solve the system given its factorization
+    :param lu: factorization returned by factorize
+    :param right: n*C right-hand side
+    :return: n*C solution
+    '''
+    return scipy.linalg.lu_solve(lu, right, check_finite=False)
+
+
+def solve(left, right, overwrite=False):
+    '''
+    Solve left * X = right for X without forming inv(left)
+    :param left: n*n matrix
+    :param right: n*C right-hand side
+    :param overwrite: allow the solver to reuse the memory of left
+    :return: n*C solution
+    '''
+    return solve_factorized(factorize(left, overwrite=overwrite), right)
+
+
+def meda_left(Q, K, eta, mmd=None, lamb=1.0):
+    '''
+    Build the left-hand side (Q + lamb * M) * K + eta * I of the MEDA system
+    :param Q: A + rho * L (or A + lamb * M + rho * L when mmd is None)
+    :param mmd: optional MMDMatrix.MMDOperator for M, applied in factored form
+    :return: n*n matrix
+    '''
+    # Q may be sparse, e.g. a diagonal A plus a sparse Laplacian
+    left = np.asarray(Q.dot(K))
+    if mmd is not None:
+        left += lamb * mmd.dot(K)
+    left.flat[::left.shape[0] + 1] += eta
+    return left
+
+
+def meda_beta(Q, K, AYY, eta, mmd=None, lamb=1.0):
+    '''
+    Solve the MEDA system for Beta
+    :param Q: A + rho * L (or A + lamb * M + rho * L when mmd is None), n*n
+    :param K: kernel matrix, n*n
+    :param AYY: A * YY, n*C
+    :param eta: regularization parameter
+    :param mmd: optional MMDMatrix.MMDOperator for M
+    :param lamb: weight of M when mmd is given
+    :return: Beta, n*C
+    '''
+    # left is a fresh temporary, so LAPACK may factorize it in place
+    return solve(meda_left(Q, K, eta, mmd=mmd, lamb=lamb), AYY, overwrite=True)
+
+
+def meda_beta_lowrank(Q, Z, AYY, eta, mmd=None, lamb=1.0):
+    '''
+    Solve the MEDA system for Beta when K = Z * Z' is given by a low-rank factor.
+    With U = (Q + lamb * M) * Z, the Woodbury identity gives
+
+        (U * Z' + eta * I)^-1 = (I - U * (eta * I + Z' * U)^-1 * Z') / eta
+
+    so only an r*r system is solved and no n*n matrix is built.
+    :param Q: A + rho * L (or A + lamb * M + rho * L when mmd is None), n*n, preferably sparse
+    :param Z: n*r kernel factor, see Kernel.factor
+    :param AYY: A * YY, n*C
+    :param eta: regularization parameter
+    :param mmd: optional MMDMatrix.MMDOperator for M
+    :param lamb: weight of M when mmd is given
+    :return: Beta, n*C
+    '''
+    U = np.asarray(Q.dot(Z))
+    if mmd is not None:
+        U += lamb * mmd.dot(Z)
+    small = np.dot(Z.T, U)
+    small.flat[::small.shape[0] + 1] += eta
+    return (AYY - np.dot(U, scipy.linalg.solve(small, np.dot(Z.T, AYY), check_finite=False))) / eta
+
+
+class GMRESSolver:
+    def __init__(self, Q, K, AYY, eta, lamb=1.0, rtol=1e-8, maxiter=None):
+        '''
+        Repeated solves of the MEDA system for different M, by preconditioned GMRES
+        :param Q: A + rho * L, n*n, fixed
+        :param K: kernel matrix, n*n, fixed
+        :param AYY: A * YY, n*C, fixed
+        :param eta: regularization parameter
+        :param lamb: weight of M
+        :param rtol: relative residual at which GMRES stops
+        :param maxiter: GMRES iterations before falling back to a direct solve, 2*(C+2) by default
+        '''
+        self.Q = Q
+        self.K = K
+        self.AYY = AYY
+        self.eta = eta
+        self.lamb = lamb
+        self.rtol = rtol
+        n, C = AYY.shape
+        self.maxiter = maxiter if maxiter is not None else 2 * (C + 2)
+        self.fixed = meda_left(Q, K, eta)
+        self.lu = factorize(self.fixed)
+        # the C columns are solved together as one n*C vector, so every product is a matrix product;
+        # the rank of lamb * M * K is unchanged, GMRES still needs at most C+2 iterations
+        self.preconditioner = scipy.sparse.linalg.LinearOperator(
+            (n * C, n * C), matvec=lambda x: solve_factorized(self.lu, x.reshape(n, C)).ravel(),
+            dtype=self.fixed.dtype)
+        # statistics: number of solves, of GMRES iterations and of direct fallbacks
+        self.solves = 0
+        self.iterations = 0
+        self.fallbacks = 0
+
+    def solve(self, mmd, x0=None):
+        '''
+        :param mmd: MMDMatrix.MMDOperator of the current pseudo labels
+        :param x0: n*C starting Beta, e.g. the Beta of the individual; zero by default
+        :return: Beta, n*C
+        '''
+        n, C = self.AYY.shape
+
+        def matvec(x):
+            X = x.reshape(n, C)
+            return (np.dot(self.fixed, X) + self.lamb * mmd.dot(np.dot(self.K, X))).ravel()
+        operator = scipy.sparse.linalg.LinearOperator((n * C, n * C), matvec=matvec, dtype=self.fixed.dtype)
+        counter = [0]
+
+        def count(_):
+            counter[0] += 1
+        start = None if x0 is None else np.ravel(x0)
+        try:
+            x, info = scipy.sparse.linalg.gmres(operator, self.AYY.ravel(), x0=start, M=self.preconditioner,
+                                                rtol=self.rtol, atol=0.0, restart=self.maxiter, maxiter=1,
+                                                callback=count, callback_type='pr_norm')
+        except TypeError:
+            # scipy < 1.12 names the relative tolerance tol
+            x, info = scipy.sparse.linalg.gmres(operator, self.AYY.ravel(), x0=start, M=self.preconditioner,
+                                                tol=self.rtol, atol=0.0, restart=self.maxiter, maxiter=1,
+                                                callback=count, callback_type='pr_norm')
+        if info == 0:
+            Beta = x.reshape(n, C)
+        else:
+            # not converged, only expected on badly conditioned systems
+            self.fallbacks += 1
+            Beta = meda_beta(self.Q, self.K, self.AYY, self.eta, mmd=mmd, lamb=self.lamb)
+        self.solves += 1
+        self.iterations += counter[0]
+        return Beta
+
+
+class WoodburySolver:
+    def __init__(self, Q, K, AYY, eta, lamb=1.0):
+        '''
+        Repeated solves of the MEDA system for different M, in O(n^2 * C) each.
+        M = scale * E * diag(w) * E' (MMDMatrix.MMDOperator) holds both M0 and N,
+        and the Frobenius normalization only changes scale, so the whole
+        label-dependent part is a rank-(C+1) term U * V' with
+        U = lamb * scale * E * diag(w) and V = K * E, and
+
+            Beta = F0^-1 * b - F0^-1 * U * (I + V' * F0^-1 * U)^-1 * V' * F0^-1 * b
+
+        where F0 = Q * K + eta * I is factorized once and F0^-1 * b is fixed.
+        :param Q: A + rho * L, n*n, fixed
+        :param K: kernel matrix, n*n, fixed
+        :param AYY: A * YY, n*C, fixed
+        :param eta: regularization parameter
+        :param lamb: weight of M
+        '''
+        self.K = K
+        self.lamb = lamb
+        self.lu = factorize(meda_left(Q, K, eta), overwrite=True)
+        self.base = solve_factorized(self.lu, AYY)
+
+    def solve(self, mmd):
+        '''
+        :param mmd: MMDMatrix.MMDOperator of the current pseudo labels
+        :return: Beta, n*C
+        '''
+        U = (self.lamb * mmd.scale) * mmd.E * mmd.w
+        F0U = solve_factorized(self.lu, U)
+        V = np.dot(self.K, mmd.E)
+        small = np.dot(V.T, F0U)
+        small.flat[::small.shape[0] + 1] += 1
+        return self.base - np.dot(F0U, scipy.linalg.solve(small, np.dot(V.T, self.base), check_finite=False))
+
+
+def benchmark(sizes=(500, 1000, 2000, 4000), C=10, repeat=3):
+    '''
+    Compare the explicit inverse with the factorized solve on random
+    MEDA-like systems of increasing size
+    :return: list of (n, inverse time, solve time, max abs difference)
+    '''
+    rows = []
+    for n in sizes:
+        X = np.random.rand(20, n)
+        X /= np.linalg.norm(X, axis=0)
+        sq = np.sum(X ** 2, axis=0)
+        K = np.exp(-0.5 * (sq[:, None] + sq[None, :] - 2 * np.dot(X.T, X)))
+        ns = n // 2
+        a = np.hstack((np.ones(ns), np.zeros(n - ns)))
+        Q = np.diag(a) + 0.01 * np.random.rand(n, n)
+        YY = np.zeros((n, C))
+        YY[np.arange(ns), np.random.randint(0, C, ns)] = 1
+        AYY = a[:, None] * YY
+
+        t_inv, t_solve = [], []
+        for _ in range(repeat):
+            start = time.time()
+            left = np.dot(Q, K) + 0.1 * np.eye(n, n)
+            beta_inv = np.dot(np.linalg.inv(left), AYY)
+            t_inv.append(time.time() - start)
+
+            start = time.time()
+            beta_solve = meda_beta(Q, K, AYY, 0.1)
+            t_solve.append(time.time() - start)
+        rows.append((n, min(t_inv), min(t_solve), np.max(np.abs(beta_inv - beta_solve))))
+    return rows
+
+
+if __name__ == '__main__':
+    np.random.seed(1617)
+    print('%8s %12s %12s %8s %12s' % ('n', 'inv (s)', 'solve (s)', 'speedup', 'max diff'))
+    for n, t_inv, t_solve, diff in benchmark():
+        print('%8d %12.4f %12.4f %8.2f %12.3e' % (n, t_inv, t_solve, t_inv / t_solve, diff))
@@ -8,6 +8,7 @@ import scipy.io
 import scipy.linalg
 import sklearn.metrics
 from sklearn.neighbors import KNeighborsClassifier
+import Dataset
 import Helpers as Pre
 
 
@@ -117,24 +118,7 @@ if __name__ == '__main__':
             print(dataset)
             dir = '/home/nguyenhoai2/Grid/data/TransferLearning/UnPairs/' + dataset + '/'
 
-            source = np.genfromtxt(dir + 'Source', delimiter=',')
-            m = source.shape[1] - 1
-            Xs = source[:, 0:m]
-            Ys = np.ravel(source[:, m:m + 1])
-            Ys = np.array([int(label) for label in Ys])
-
-            target = np.genfromtxt(dir + 'Target', delimiter=',')
-            Xt = target[:, 0:m]
-            Yt = np.ravel(target[:, m:m + 1])
-            Yt = np.array([int(label) for label in Yt])
-
-            if normalize:
-                Xs, Xt = Pre.normalize_data(Xs, Xt)
-
-            C = len(np.unique(Ys))
-            if C > np.max(Ys):
-                Ys = Ys + 1
-                Yt = Yt + 1
+            Xs, Ys, Xt, Yt, C = Dataset.load(dir, normalize=normalize)
 
             tca = TCA(kernel_type='rbf', dim=dim, lamb=lamb, gamma=0.5)
             acc, _ = tca.fit_predict(Xs, Ys, Xt, Yt)
@@ -6,6 +6,7 @@ Created on 24/09/2018
 import numpy as np
 from collections import Counter
 from sklearn.metrics.pairwise import euclidean_distances as ecd
+from Kernel import kernel
 
 
 def normalize_src_tar(src_fea, tar_fea):
@@ -120,33 +121,6 @@ def balanced_sample_maker(X, y, sample_size, random_seed=1617):
     return data_train, labels_train
 
 
-def kernel(ker, X, X2, gamma):
-    if not ker or ker == 'primal':
-        return X
-    elif ker == 'linear':
-        if not X2:
-            K = np.dot(X.T, X)
-        else:
-            K = np.dot(X.T, X2)
-    elif ker == 'rbf':
-        n1sq = np.sum(X ** 2, axis=0)
-        n1 = X.shape[1]
-        if not X2:
-            D = (np.ones((n1, 1)) * n1sq).T + np.ones((n1, 1)) * n1sq - 2 * np.dot(X.T, X)
-        else:
-            n2sq = np.sum(X2 ** 2, axis=0)
-            n2 = X2.shape[1]
-            D = (np.ones((n2, 1)) * n1sq).T + np.ones((n1, 1)) * n2sq - 2 * np.dot(X.T, X)
-        K = np.exp(-gamma * D)
-    elif ker == 'sam':
-        if not X2:
-            D = np.dot(X.T, X)
-        else:
-            D = np.dot(X.T, X2)
-        K = np.exp(-gamma * np.arccos(D) ** 2)
-    return K
-
-
 # get median distance from a dataset
 def medianDistance(dataset):
     pwDistance = ecd(dataset)
@@ -14,6 +14,7 @@ from matplotlib.patches import Rectangle
 from mpl_toolkits.mplot3d import Axes3D
 import seaborn as sns
 import numpy as np
+import Dataset
 import GFK, CORAL
 import MEDA, GA_MEDA, Random_MEDA
 
@@ -46,28 +47,10 @@ for index, datasets in enumerate(list_datasets):
     dim = list_dims[index]
     eta = 0.1
     for dataset in datasets:
-        source = np.genfromtxt("/home/nguyenhoai2/Grid/data/TransferLearning/UnPairs/" + dataset + "/Source",
-                               delimiter=",")
-        m = source.shape[1] - 1
-        Xs = source[:, 0:m]
-        Ys = source[:, m:m + 1]
-        Ys = np.ravel(Ys)
-        Ys = np.array([int(label) for label in Ys])
-        c = np.unique(Ys).shape[0]
-
-        target = np.genfromtxt("/home/nguyenhoai2/Grid/data/TransferLearning/UnPairs/" + dataset + "/Target",
-                               delimiter=",")
-        Xt = target[:, 0:m]
-        Yt = target[:, m:m + 1]
-        Yt = np.ravel(Yt)
-        Yt = np.array([int(label) for label in Yt])
+        Xs, Ys, Xt, Yt, C = Dataset.load("/home/nguyenhoai2/Grid/data/TransferLearning/UnPairs/" + dataset)
+        c = C
         ns, nt = Xs.shape[0], Xt.shape[0]
 
-        C = len(np.unique(Ys))
-        if C > np.max(Ys):
-            Ys = Ys + 1
-            Yt = Yt + 1
-
         run = 1
         random_seed = 1617 * run
         np.random.seed(random_seed)